@@ -0,0 +1,306 @@
+import argparse
+import logging
+import time
+from typing import Callable, Dict, Iterable, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candles import CANDLE_DTYPE, INTERVAL_MS
+from indicators import atr, ema, macd_diff, rsi
+
+logger = logging.getLogger(__name__)
+
+FEE = 0.001
+SLIPPAGE = 0.0005
+INITIAL_EQUITY = 10_000.0
+
+TRADE_DTYPE = np.dtype([
+    ('entry_time', '<i8'),
+    ('exit_time', '<i8'),
+    ('entry_price', '<f8'),
+    ('exit_price', '<f8'),
+    ('return', '<f8'),
+    ('pnl', '<f8'),
+])
+
+
+class Strategy(NamedTuple):
+    """Parameters of the trading rules; the defaults are the live bot's."""
+    rsi_buy: float = 30
+    rsi_sell: float = 70
+    ema_window: int = 14
+    rsi_window: int = 14
+    atr_window: int = 14
+    macd_slow: int = 26
+    macd_fast: int = 12
+    macd_sign: int = 9
+    rules: str = 'trader'
+
+
+class BacktestResult(NamedTuple):
+    stats: Dict[str, float]
+    equity: np.ndarray
+    trades: np.ndarray
+
+
+def load_klines(paths: Iterable[str]) -> np.ndarray:
+    """Klines of one interval from Binance kline dumps (CSV, zipped or not) or ``.npy`` files of ``CANDLE_DTYPE``.
+
+    Returns them sorted by open time, without duplicates.
+    """
+    names = list(CANDLE_DTYPE.names[:6])
+    parts = []
+    for path in paths:
+        if path.endswith('.npy'):
+            parts.append(np.load(path))
+            continue
+        first = pd.read_csv(path, header=None, nrows=1, usecols=range(6))
+        header = None if str(first.iat[0, 0]).strip().isdigit() else 0
+        frame = pd.read_csv(path, header=header, usecols=range(6), float_precision='round_trip')
+        klines = np.zeros(len(frame), CANDLE_DTYPE)
+        for column, name in zip(frame.columns, names):
+            klines[name] = frame[column].to_numpy()
+        klines['closed'] = True
+        parts.append(klines)
+    klines = np.concatenate(parts) if parts else np.zeros(0, CANDLE_DTYPE)
+    # Spot dumps from 2025 on have microsecond times.
+    klines['time'] = np.where(klines['time'] >= 10 ** 14, klines['time'] // 1000, klines['time'])
+    _, first_rows = np.unique(klines['time'], return_index=True)
+    return klines[first_rows]
+
+
+def resample(klines: np.ndarray, interval: str) -> np.ndarray:
+    """Aggregate klines into a longer interval, e.g. 1m klines into 15m ones."""
+    interval_ms = INTERVAL_MS[interval]
+    group = klines['time'] // interval_ms
+    starts = np.flatnonzero(np.concatenate(([True], group[1:] != group[:-1])))
+    ends = np.concatenate((starts[1:], [len(klines)])) - 1
+    resampled = np.zeros(len(starts), CANDLE_DTYPE)
+    resampled['time'] = group[starts] * interval_ms
+    resampled['open'] = klines['open'][starts]
+    resampled['high'] = np.maximum.reduceat(klines['high'], starts)
+    resampled['low'] = np.minimum.reduceat(klines['low'], starts)
+    resampled['close'] = klines['close'][ends]
+    resampled['volume'] = np.add.reduceat(klines['volume'], starts)
+    resampled['closed'] = True
+    return resampled
+
+
+# How to compute each column the rules read, from one interval's klines and its windows.
+INDICATORS: Dict[str, Callable[..., np.ndarray]] = {
+    'atr': lambda klines, window: atr(klines['high'], klines['low'], klines['close'], window),
+    'macd': lambda klines, slow, fast, sign: macd_diff(klines['close'], slow, fast, sign),
+    'ema': lambda klines, window: ema(klines['close'], window),
+    'rsi': lambda klines, window: rsi(klines['close'], window),
+    'close': lambda klines: np.ascontiguousarray(klines['close']),
+}
+
+
+def indicator_windows(strategy: Strategy) -> Dict[str, Tuple[int, ...]]:
+    """The windows of each of ``INDICATORS`` the strategy's rules read."""
+    windows = {
+        'atr': (strategy.atr_window,),
+        'macd': (strategy.macd_slow, strategy.macd_fast, strategy.macd_sign),
+        'ema': (strategy.ema_window,),
+        'rsi': (strategy.rsi_window,),
+        'close': (),
+    }
+    return {name: windows[name] for name in RULE_COLUMNS[strategy.rules]}
+
+
+def trader_rules(columns: Dict[str, np.ndarray], strategy: Strategy) -> Tuple[np.ndarray, np.ndarray]:
+    """``trader.should_buy``/``should_sell`` of one interval as boolean arrays."""
+    macd, ema_, close, rsi_ = columns['macd'], columns['ema'], columns['close'], columns['rsi']
+    buy = ~((macd <= 0) | (ema_ <= close) | (rsi_ >= strategy.rsi_buy))
+    sell = ~((macd >= 0) | (ema_ >= close) | (rsi_ <= strategy.rsi_sell))
+    return buy, sell
+
+
+def modular_rules(columns: Dict[str, np.ndarray], strategy: Strategy) -> Tuple[np.ndarray, np.ndarray]:
+    """``Algobot_Modular.trading_logic.check_buy_conditions``/``check_sell_conditions`` as boolean arrays."""
+    macd, ema_, close, rsi_ = columns['macd'], columns['ema'], columns['close'], columns['rsi']
+    buy = (macd <= 0) & (ema_ <= close) & (rsi_ <= strategy.rsi_buy)
+    sell = (macd >= 0) & (ema_ >= close) & (rsi_ >= strategy.rsi_sell)
+    return buy, sell
+
+
+RULES: Dict[str, Callable[[Dict[str, np.ndarray], Strategy], Tuple[np.ndarray, np.ndarray]]] = {
+    'trader': trader_rules,
+    'modular': modular_rules,
+}
+
+# The columns each set of rules reads; only these are computed, so an unused
+# indicator neither costs time nor masks signals during its warm-up.
+RULE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    'trader': ('macd', 'ema', 'close', 'rsi'),
+    'modular': ('macd', 'ema', 'close', 'rsi'),
+}
+
+
+def align(base: np.ndarray, base_interval: str, klines: np.ndarray, interval: str) -> np.ndarray:
+    """For each base kline, the index of the last ``klines`` candle closed when it closes, or -1."""
+    decided = base['time'] + INTERVAL_MS[base_interval]
+    return np.searchsorted(klines['time'] + INTERVAL_MS[interval], decided, side='right') - 1
+
+
+def aligned_indicator(data: Dict[str, np.ndarray], interval: str, name: str, windows: Tuple[int, ...]) -> np.ndarray:
+    """An indicator of one interval, computed over all its klines at once, at every kline of the shortest interval.
+
+    Longer intervals contribute their last closed candle, so nothing is
+    read before it was known; NaN before their first one closes.
+    """
+    values = INDICATORS[name](data[interval], *windows)
+    base_interval = min(data, key=INTERVAL_MS.get)
+    if interval == base_interval:
+        return values
+    index = align(data[base_interval], base_interval, data[interval], interval)
+    aligned = values[np.maximum(index, 0)]
+    aligned[index < 0] = np.nan
+    return aligned
+
+
+def signals(data: Dict[str, np.ndarray], strategy: Strategy = Strategy(),
+            indicator: Callable[[Dict[str, np.ndarray], str, str, Tuple[int, ...]], np.ndarray] = aligned_indicator
+            ) -> Tuple[np.ndarray, np.ndarray]:
+    """Buy and sell signals at the close of every kline of the shortest interval.
+
+    As in the live loop, a signal needs the rules to hold on every interval.
+    Bars where any indicator the rules read is still warming up have no signal.
+    ``indicator`` may be swapped for one that reuses earlier results.
+    """
+    base = data[min(data, key=INTERVAL_MS.get)]
+    buy = np.ones(len(base), dtype=bool)
+    sell = np.ones(len(base), dtype=bool)
+    for interval in data:
+        columns = {name: indicator(data, interval, name, windows)
+                   for name, windows in indicator_windows(strategy).items()}
+        interval_buy, interval_sell = RULES[strategy.rules](columns, strategy)
+        buy &= interval_buy
+        sell &= interval_sell
+        for values in columns.values():
+            known = np.isfinite(values)
+            buy &= known
+            sell &= known
+    return buy, sell
+
+
+def simulate(klines: np.ndarray, buy: np.ndarray, sell: np.ndarray, fee: float = FEE, slippage: float = SLIPPAGE,
+             initial_equity: float = INITIAL_EQUITY) -> BacktestResult:
+    """Trade all in and out on signals, long only, filling at the next open.
+
+    A buy signal opens a position when flat and a sell signal closes it;
+    a bar with both counts as a buy, as in the live loop. Fills pay
+    ``slippage`` on the price and ``fee`` on the amount traded. A position
+    still open at the end is closed at the last close.
+    """
+    count = len(klines)
+    bars = np.arange(count)
+    opens, closes = klines['open'], klines['close']
+    decision = np.where(buy, 1, np.where(sell, 0, -1))
+    last = np.maximum.accumulate(np.where(decision >= 0, bars, -1))
+    position = np.where(last >= 0, decision[np.maximum(last, 0)], 0)
+    held = np.concatenate(([0], position[:-1]))
+    change = np.diff(np.concatenate(([0], held)))
+    entries = np.flatnonzero(change == 1)
+    exits = np.flatnonzero(change == -1)
+
+    exit_bars, exit_prices = exits, opens[exits]
+    if len(exits) < len(entries):
+        exit_bars, exit_prices = np.append(exits, count), np.append(exit_prices, closes[-1])
+    entry_prices = opens[entries] * (1 + slippage)
+    exit_prices = exit_prices * (1 - slippage)
+    multipliers = (1 - fee) ** 2 * exit_prices / entry_prices
+    equity_after = initial_equity * np.cumprod(multipliers)
+    equity_before = np.concatenate(([initial_equity], equity_after[:-1]))
+
+    trade = np.searchsorted(entries, bars, side='right') - 1
+    current = np.maximum(trade, 0)
+    equity = np.full(count, initial_equity)
+    if len(entries):
+        in_trade = (trade >= 0) & (bars < exit_bars[current])
+        marked = equity_before[current] * (1 - fee) * closes / entry_prices[current]
+        equity = np.where(in_trade, marked, np.where(trade >= 0, equity_after[current], initial_equity))
+
+    trades = np.zeros(len(entries), TRADE_DTYPE)
+    trades['entry_time'] = klines['time'][entries]
+    trades['exit_time'] = klines['time'][np.minimum(exit_bars, count - 1)]
+    trades['entry_price'] = entry_prices
+    trades['exit_price'] = exit_prices
+    trades['return'] = multipliers - 1
+    trades['pnl'] = equity_after - equity_before
+    final_equity = float(equity_after[-1]) if len(entries) else initial_equity
+    return BacktestResult(statistics(equity, trades, held, initial_equity, final_equity), equity, trades)
+
+
+def statistics(equity: np.ndarray, trades: np.ndarray, held: np.ndarray, initial_equity: float,
+               final_equity: float) -> Dict[str, float]:
+    wins, losses = trades['pnl'][trades['pnl'] > 0], trades['pnl'][trades['pnl'] <= 0]
+    drawdown = equity / np.maximum.accumulate(equity) - 1 if len(equity) else np.zeros(1)
+    return {
+        'initial_equity': initial_equity,
+        'final_equity': final_equity,
+        'pnl': final_equity - initial_equity,
+        'return': final_equity / initial_equity - 1,
+        'max_drawdown': float(0.0 - drawdown.min()),
+        'trades': len(trades),
+        'win_rate': len(wins) / len(trades) if len(trades) else float('nan'),
+        'average_trade_return': float(trades['return'].mean()) if len(trades) else float('nan'),
+        'best_trade_return': float(trades['return'].max()) if len(trades) else float('nan'),
+        'worst_trade_return': float(trades['return'].min()) if len(trades) else float('nan'),
+        'profit_factor': float(wins.sum() / -losses.sum()) if losses.sum() < 0 else float('inf') if len(wins) else float('nan'),
+        'exposure': float(held.mean()) if len(held) else 0.0,
+    }
+
+
+def backtest(data: Dict[str, np.ndarray], strategy: Strategy = Strategy(), fee: float = FEE,
+             slippage: float = SLIPPAGE, initial_equity: float = INITIAL_EQUITY) -> BacktestResult:
+    """Backtest the rules over klines per interval, trading on the shortest interval's bars."""
+    buy, sell = signals(data, strategy)
+    base = data[min(data, key=INTERVAL_MS.get)]
+    return simulate(base, buy, sell, fee, slippage, initial_equity)
+
+
+def add_data_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--data', nargs='+', action='append', required=True, metavar='INTERVAL FILE',
+                        help="an interval followed by its kline files (Binance CSV dumps or .npy); repeatable")
+    parser.add_argument('--resample', nargs='*', default=[], metavar='INTERVAL',
+                        help="intervals to build from the shortest loaded one instead of loading them")
+    parser.add_argument('--rules', choices=sorted(RULES), default='trader')
+    parser.add_argument('--fee', type=float, default=FEE)
+    parser.add_argument('--slippage', type=float, default=SLIPPAGE)
+    parser.add_argument('--equity', type=float, default=INITIAL_EQUITY)
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backtest the Algobot rules on historical klines.")
+    add_data_arguments(parser)
+    parser.add_argument('--rsi-buy', type=float, default=Strategy._field_defaults['rsi_buy'])
+    parser.add_argument('--rsi-sell', type=float, default=Strategy._field_defaults['rsi_sell'])
+    return parser.parse_args(args)
+
+
+def load_data(data_args, resample_intervals) -> Dict[str, np.ndarray]:
+    data = {interval: load_klines(paths) for interval, *paths in data_args}
+    base = data[min(data, key=INTERVAL_MS.get)]
+    for interval in resample_intervals:
+        data[interval] = resample(base, interval)
+    return data
+
+
+def main(args=None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    options = parse_args(args)
+    started = time.perf_counter()
+    data = load_data(options.data, options.resample)
+    loaded = time.perf_counter()
+    strategy = Strategy(rsi_buy=options.rsi_buy, rsi_sell=options.rsi_sell, rules=options.rules)
+    result = backtest(data, strategy, options.fee, options.slippage, options.equity)
+    logger.info(f"Loaded {', '.join(f'{len(k)} {i}' for i, k in data.items())} klines in {loaded - started:.2f}s, "
+                f"backtested in {time.perf_counter() - loaded:.2f}s")
+    for name, value in result.stats.items():
+        print(f"{name:>22}: {value:.6g}")
+
+
+if __name__ == "__main__":
+    main()
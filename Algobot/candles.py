@@ -0,0 +1,81 @@
+from typing import Iterable, Sequence
+
+import numpy as np
+
+CANDLE_FIELDS = [
+    ('time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+    ('closed', '?'),
+]
+CANDLE_DTYPE = np.dtype(CANDLE_FIELDS)
+
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '8h': 28_800_000,
+    '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000, '1w': 604_800_000,
+}
+
+
+def candle_dtype(extra: Iterable[str] = ()) -> np.dtype:
+    """The candle dtype plus a float64 column per name in ``extra``, e.g. for indicator values."""
+    return np.dtype(CANDLE_FIELDS + [(name, '<f8') for name in extra])
+
+
+class CandleRing:
+    """The last ``capacity`` candles of one series in a preallocated structured array.
+
+    Every row is written twice, at ``i`` and ``i + capacity``, so the buffered
+    candles are always one contiguous slice: ``view`` never copies and its
+    columns are plain strided arrays. Extra columns start as NaN and are
+    kept when the candle fields of a row are overwritten.
+    """
+
+    def __init__(self, capacity: int, dtype: np.dtype = CANDLE_DTYPE):
+        self.capacity = capacity
+        self.data = np.zeros(2 * capacity, dtype=dtype)
+        self.extra = [name for name in dtype.names if name not in CANDLE_DTYPE.names]
+        for name in self.extra:
+            self.data[name] = np.nan
+        self._candles = self.data[list(CANDLE_DTYPE.names)]
+        self._padding = (np.nan,) * len(self.extra)
+        self.head = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _position(self, index: int) -> int:
+        if not -self.count <= index < self.count:
+            raise IndexError(index)
+        return (self.head + index % self.count) % self.capacity
+
+    def append(self, candle: Sequence) -> None:
+        """Add a candle, given in ``CANDLE_FIELDS`` order, dropping the oldest when full."""
+        if self.count < self.capacity:
+            position = (self.head + self.count) % self.capacity
+            self.count += 1
+        else:
+            position = self.head
+            self.head = (self.head + 1) % self.capacity
+        self.data[position] = self.data[position + self.capacity] = tuple(candle) + self._padding
+
+    def replace(self, index: int, candle: Sequence) -> None:
+        """Overwrite the candle fields of a row in place, keeping its extra columns."""
+        position = self._position(index)
+        self._candles[position] = self._candles[position + self.capacity] = tuple(candle)
+
+    def assign(self, index: int, name: str, value: float) -> None:
+        """Set one column of a row in place."""
+        position = self._position(index)
+        self.data[name][position] = self.data[name][position + self.capacity] = value
+
+    def view(self) -> np.ndarray:
+        """The buffered candles, oldest first, as a view into the ring."""
+        return self.data[self.head:self.head + self.count]
+
+    def last_time(self) -> int:
+        return int(self.data['time'][self._position(-1)])
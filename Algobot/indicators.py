@@ -0,0 +1,182 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+INDICATOR_NAMES = ('atr', 'macd', 'ema', 'rsi')
+
+
+class EWMA:
+    """Exponentially weighted mean, step for step as ``pandas.Series.ewm(com=com, adjust=False).mean()``.
+
+    ``update`` with ``closed=False`` returns the mean including a value
+    without keeping it, for a candle that is still open.
+    """
+
+    def __init__(self, com: float, min_periods: int):
+        self.alpha = 1.0 / (1.0 + com)
+        self.old_weight = 1.0 - self.alpha
+        self.min_periods = min_periods
+        self.mean = math.nan
+        self.count = 0
+
+    def _step(self, value: float) -> Tuple[float, int]:
+        if self.count == 0:
+            return value, 1
+        mean = self.mean
+        # Same operations, in the same order, as pandas' ewm kernel.
+        if mean != value:
+            mean = (self.old_weight * mean + self.alpha * value) / (self.old_weight + self.alpha)
+        return mean, self.count + 1
+
+    def update(self, value: float, closed: bool = True) -> float:
+        mean, count = self._step(value)
+        if closed:
+            self.mean, self.count = mean, count
+        return mean if count >= self.min_periods else math.nan
+
+
+class EMA(EWMA):
+    """``ta.trend.EMAIndicator(close, window).ema_indicator()``, one close at a time."""
+
+    def __init__(self, window: int = 14):
+        super().__init__(com=(window - 1) / 2.0, min_periods=window)
+
+
+class MACD:
+    """``ta.trend.MACD(close, window_slow, window_fast, window_sign).macd_diff()``, one close at a time."""
+
+    def __init__(self, window_slow: int = 26, window_fast: int = 12, window_sign: int = 9):
+        self.fast = EMA(window_fast)
+        self.slow = EMA(window_slow)
+        self.signal = EMA(window_sign)
+
+    def update(self, close: float, closed: bool = True) -> float:
+        macd = self.fast.update(close, closed) - self.slow.update(close, closed)
+        # The signal line only starts once both averages are defined, as
+        # pandas skips the leading NaNs of the MACD line.
+        if math.isnan(macd):
+            return math.nan
+        return macd - self.signal.update(macd, closed)
+
+
+class RSI:
+    """``ta.momentum.RSIIndicator(close, window).rsi()``, one close at a time."""
+
+    def __init__(self, window: int = 14):
+        alpha = 1 / window
+        self.up = EWMA(com=1.0 / alpha - 1.0, min_periods=window)
+        self.down = EWMA(com=1.0 / alpha - 1.0, min_periods=window)
+        self.prev_close: Optional[float] = None
+
+    def update(self, close: float, closed: bool = True) -> float:
+        # The first close has no change; ta counts it as a zero move.
+        diff = close - self.prev_close if self.prev_close is not None else 0.0
+        up = self.up.update(diff if diff > 0 else 0.0, closed)
+        down = self.down.update(-diff if diff < 0 else 0.0, closed)
+        if closed:
+            self.prev_close = close
+        if math.isnan(down):
+            return math.nan
+        if down == 0:
+            return 100.0
+        return 100 - (100 / (1 + up / down))
+
+
+class ATR:
+    """``ta.volatility.AverageTrueRange(high, low, close, window).average_true_range()``, one candle at a time.
+
+    Like ta, the first ``window - 1`` values are 0.0 and the first average
+    is a plain mean of the first ``window`` true ranges.
+    """
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.prev_close: Optional[float] = None
+        self.seed: List[float] = []
+        self.atr = 0.0
+        self.count = 0
+
+    def update(self, high: float, low: float, close: float, closed: bool = True) -> float:
+        if self.prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        count = self.count + 1
+        if count < self.window:
+            atr = 0.0
+        elif count == self.window:
+            # Averaged by pandas itself so the seed is bit-identical to ta's,
+            # whichever summation pandas uses. This runs once per series.
+            atr = float(pd.Series(self.seed + [true_range]).mean())
+        else:
+            atr = (self.atr * (self.window - 1) + true_range) / float(self.window)
+        if closed:
+            if count < self.window:
+                self.seed.append(true_range)
+            else:
+                self.seed = []
+            self.prev_close, self.atr, self.count = close, atr, count
+        return atr
+
+
+class IndicatorSet:
+    """ATR, MACD, EMA and RSI of one kline series, updated in O(1) per candle.
+
+    Values match ta's batch output over the same series from its first
+    candle. Closed candles advance the state; an open candle is evaluated
+    against it without being kept, so it can be updated again until it
+    closes. Callers keep the returned values themselves, e.g. in the
+    indicator columns of a CandleRing.
+    """
+
+    def __init__(self):
+        self.atr = ATR()
+        self.macd = MACD()
+        self.ema = EMA()
+        self.rsi = RSI()
+        self.last_time: Optional[int] = None
+
+    def update(self, time: int, high: float, low: float, close: float, closed: bool = True) -> Dict[str, float]:
+        """Feed one candle, in time order, and return the indicator values at it."""
+        values = (
+            self.atr.update(high, low, close, closed),
+            self.macd.update(close, closed),
+            self.ema.update(close, closed),
+            self.rsi.update(close, closed),
+        )
+        if closed:
+            self.last_time = time
+        return dict(zip(INDICATOR_NAMES, values))
+
+
+# Batch versions of the indicators above, one whole series at a time, for backtests.
+# They use the same pandas kernels as ta, so ATR aside they equal ta bit for bit.
+
+def ema(close: np.ndarray, window: int = 14) -> np.ndarray:
+    return pd.Series(close).ewm(span=window, min_periods=window, adjust=False).mean().to_numpy()
+
+
+def macd_diff(close: np.ndarray, window_slow: int = 26, window_fast: int = 12, window_sign: int = 9) -> np.ndarray:
+    macd = ema(close, window_fast) - ema(close, window_slow)
+    return macd - ema(macd, window_sign)
+
+
+def rsi(close: np.ndarray, window: int = 14) -> np.ndarray:
+    diff = pd.Series(close).diff(1)
+    up = diff.where(diff > 0, 0.0).ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    down = (-diff.where(diff < 0, 0.0)).ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(down == 0, 100.0, 100 - (100 / (1 + up / down)))
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """Like ta's ATR, but with the Wilder smoothing as an EWMA, so it may differ from ta in the last bit."""
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    values = np.zeros(len(close))
+    if len(close) >= window:
+        smoothed = np.concatenate(([pd.Series(true_range[:window]).mean()], true_range[window:]))
+        values[window - 1:] = pd.Series(smoothed).ewm(alpha=1 / window, adjust=False).mean().to_numpy()
+    return values
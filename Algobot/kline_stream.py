@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from candles import CANDLE_DTYPE, INTERVAL_MS, CandleRing
+
+logger = logging.getLogger(__name__)
+
+STREAM_URL = 'wss://stream.binance.com:9443/stream'
+REST_URL = 'https://api.binance.com'
+BUFFER_SIZE = 1000
+REST_LIMIT = 1000
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+
+
+class Kline(NamedTuple):
+    """One kline, in the field order of ``candles.CANDLE_FIELDS``."""
+    time: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    closed: bool
+
+
+def parse_stream_kline(k: Dict) -> Kline:
+    """Kline from the ``k`` object of a kline stream event."""
+    return Kline(int(k['t']), float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']), bool(k['x']))
+
+
+def parse_rest_kline(row: List, now_ms: int) -> Kline:
+    """Kline from a row of the REST klines endpoint; it is closed once its close time has passed."""
+    return Kline(int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5]),
+                 int(row[6]) < now_ms)
+
+
+class KlineBuffer:
+    """The most recent klines of one symbol and interval, oldest first, in a ``CandleRing``."""
+
+    def __init__(self, interval_ms: int, size: int = BUFFER_SIZE, dtype: np.dtype = CANDLE_DTYPE):
+        self.interval_ms = interval_ms
+        self.candles = CandleRing(size, dtype)
+
+    def apply(self, kline: Kline, allow_gap: bool = False) -> Optional[int]:
+        """Store a kline update.
+
+        Returns the open time of the first missing kline when the update
+        would leave a gap; the kline is not stored in that case unless
+        ``allow_gap`` is set, for gaps the exchange itself has.
+        """
+        candles = self.candles
+        if not len(candles):
+            candles.append(kline)
+            return None
+        last = candles.last_time()
+        if kline.time == last:
+            candles.replace(-1, kline)
+        elif kline.time == last + self.interval_ms:
+            candles.append(kline)
+        elif kline.time > last:
+            if not allow_gap:
+                return last + self.interval_ms
+            candles.append(kline)
+        return None
+
+
+class KlineStream:
+    """Live klines for every symbol and interval from one combined Binance WebSocket stream.
+
+    Each (symbol, interval) keeps a ring buffer of its last ``size`` klines,
+    updated in place as stream events arrive; ``dtype`` may add columns for
+    readers to fill in, e.g. indicator values. REST is only used to fill the
+    buffers after (re)connecting and when an event reveals a gap. The stream
+    runs on its own event loop thread; ``wait`` blocks until the next update
+    and ``lock`` must be held while reading or writing a ``view``.
+    """
+
+    def __init__(self, symbols: Iterable[str], intervals: Iterable[str], size: int = BUFFER_SIZE,
+                 stream_url: str = STREAM_URL, rest_url: str = REST_URL,
+                 on_kline: Optional[Callable[[str, str, Kline], None]] = None, dtype: np.dtype = CANDLE_DTYPE):
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.intervals = list(intervals)
+        self.size = size
+        self.stream_url = stream_url
+        self.rest_url = rest_url
+        self.on_kline = on_kline
+        self.buffers: Dict[Tuple[str, str], KlineBuffer] = {
+            (symbol, interval): KlineBuffer(INTERVAL_MS[interval], size, dtype)
+            for symbol in self.symbols for interval in self.intervals
+        }
+        self.connects = 0
+        self.backfills = 0
+        self.updated = threading.Event()
+        self.lock = threading.Lock()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def url(self) -> str:
+        streams = '/'.join(f"{symbol.lower()}@kline_{interval}" for symbol, interval in self.buffers)
+        return f"{self.stream_url}?streams={streams}"
+
+    def candles(self, symbol: str, interval: str) -> CandleRing:
+        """The ring buffer of a symbol and interval; hold ``lock`` while using it."""
+        return self.buffers[(symbol.upper(), interval)].candles
+
+    def klines(self, symbol: str, interval: str) -> List[Kline]:
+        """A copy of the buffered klines, oldest first; the last one may still be open."""
+        with self.lock:
+            rows = self.candles(symbol, interval).view()[list(Kline._fields)].tolist()
+        return [Kline._make(row) for row in rows]
+
+    def ready(self) -> bool:
+        """Whether every symbol and interval has klines."""
+        with self.lock:
+            return all(len(buffer.candles) for buffer in self.buffers.values())
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until a kline was updated since the last call; False on timeout."""
+        if self.updated.wait(timeout):
+            self.updated.clear()
+            return True
+        return False
+
+    def _store(self, symbol: str, interval: str, kline: Kline, allow_gap: bool = False) -> Optional[int]:
+        with self.lock:
+            missing = self.buffers[(symbol, interval)].apply(kline, allow_gap)
+        if missing is None:
+            if self.on_kline is not None:
+                self.on_kline(symbol, interval, kline)
+            self.updated.set()
+        return missing
+
+    async def backfill(self, symbol: str, interval: str, start: Optional[int] = None) -> int:
+        """Fetch klines from ``start`` (or the latest ``size``) over REST into the buffer; returns how many."""
+        params = {'symbol': symbol, 'interval': interval, 'limit': min(self.size, REST_LIMIT)}
+        if start is not None:
+            params['startTime'] = start
+            params['limit'] = REST_LIMIT
+        fetched = 0
+        while True:
+            async with self._session.get(f"{self.rest_url}/api/v3/klines", params=params) as response:
+                response.raise_for_status()
+                rows = await response.json()
+            now_ms = int(time.time() * 1000)
+            for row in rows:
+                # REST is authoritative: a gap left here is one the exchange has too.
+                self._store(symbol, interval, parse_rest_kline(row, now_ms), allow_gap=True)
+            fetched += len(rows)
+            self.backfills += 1
+            if start is None or len(rows) < params['limit']:
+                return fetched
+            params['startTime'] = int(rows[-1][0]) + 1
+
+    async def _backfill_all(self) -> None:
+        tasks = []
+        for (symbol, interval), buffer in self.buffers.items():
+            with self.lock:
+                last = buffer.candles.last_time() if len(buffer.candles) else None
+            if last is not None and last < time.time() * 1000 - self.size * buffer.interval_ms:
+                # Down longer than the buffer spans: only the latest klines are worth fetching.
+                last = None
+            # Re-fetch the last kline too: it may have changed or closed while disconnected.
+            tasks.append(self.backfill(symbol, interval, last))
+        await asyncio.gather(*tasks)
+
+    async def _handle(self, message: Dict) -> None:
+        event = message.get('data', message)
+        if event.get('e') != 'kline':
+            return
+        symbol, kline = event['s'], parse_stream_kline(event['k'])
+        interval = event['k']['i']
+        missing = self._store(symbol, interval, kline)
+        if missing is not None:
+            logger.warning(f"Gap in {symbol} {interval} klines, backfilling from {missing}")
+            await self.backfill(symbol, interval, missing)
+            self._store(symbol, interval, kline, allow_gap=True)
+
+    async def run(self) -> None:
+        """Consume the stream until cancelled, reconnecting with backoff."""
+        delay = RECONNECT_DELAY
+        async with aiohttp.ClientSession() as session:
+            self._session = session
+            while True:
+                try:
+                    async with session.ws_connect(self.url, heartbeat=30) as ws:
+                        self.connects += 1
+                        await self._backfill_all()
+                        delay = RECONNECT_DELAY
+                        async for message in ws:
+                            if message.type == aiohttp.WSMsgType.TEXT:
+                                await self._handle(message.json())
+                            elif message.type == aiohttp.WSMsgType.ERROR:
+                                break
+                    logger.warning("Kline stream closed, reconnecting")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Kline stream failed: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def start(self) -> None:
+        """Run the stream on a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        started = threading.Event()
+
+        def target():
+            self._loop = asyncio.new_event_loop()
+            self._task = self._loop.create_task(self.run())
+            started.set()
+            try:
+                self._loop.run_until_complete(self._task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._loop.close()
+
+        self._thread = threading.Thread(target=target, name='kline-stream', daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._task.cancel)
+        self._thread.join()
+        self._thread = None
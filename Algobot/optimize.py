@@ -0,0 +1,191 @@
+import argparse
+import itertools
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest import (FEE, INITIAL_EQUITY, SLIPPAGE, Strategy, add_data_arguments, aligned_indicator, indicator_windows,
+                      load_data, signals, simulate)
+from candles import INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+CACHE_BYTES = 512 * 1024 * 1024
+
+# Values tried for each strategy parameter; unlisted ones keep the live bot's value.
+SEARCH_SPACE: Dict[str, Sequence] = {
+    'rsi_buy': [20, 25, 30, 35, 40],
+    'rsi_sell': [60, 65, 70, 75, 80],
+    'ema_window': [9, 14, 21, 50],
+    'rsi_window': [7, 14, 21],
+    'macd_fast': [8, 12],
+    'macd_slow': [21, 26],
+    'macd_sign': [9],
+}
+
+Result = Tuple[Strategy, Dict[str, float]]
+
+
+class IndicatorCache:
+    """Aligned indicator arrays by interval, indicator and windows, least recently used out first.
+
+    Pass it as the ``indicator`` of ``backtest.signals``, always with the
+    same klines. Combinations that share a window then reuse the array
+    instead of recomputing it; ``max_bytes`` bounds the memory this takes.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.values: 'OrderedDict[Tuple, np.ndarray]' = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, data: Dict[str, np.ndarray], interval: str, name: str, windows: Tuple[int, ...]) -> np.ndarray:
+        key = (interval, name, windows)
+        values = self.values.get(key)
+        if values is not None:
+            self.values.move_to_end(key)
+            self.hits += 1
+            return values
+        self.misses += 1
+        values = aligned_indicator(data, interval, name, windows)
+        self.values[key] = values
+        self.size += values.nbytes
+        while self.size > self.max_bytes and len(self.values) > 1:
+            self.size -= self.values.popitem(last=False)[1].nbytes
+        return values
+
+
+def grid(space: Dict[str, Sequence] = SEARCH_SPACE, rules: str = 'trader') -> List[Strategy]:
+    """Every combination of the values in ``space``."""
+    names = list(space)
+    strategies = [Strategy(rules=rules, **dict(zip(names, values))) for values in itertools.product(*space.values())]
+    return [strategy for strategy in strategies if valid(strategy)]
+
+
+def random_search(space: Dict[str, Sequence] = SEARCH_SPACE, samples: int = 100, rules: str = 'trader',
+                  seed: Optional[int] = None) -> List[Strategy]:
+    """Up to ``samples`` distinct combinations drawn uniformly from ``space``."""
+    rng = np.random.default_rng(seed)
+    strategies = {}
+    for _ in range(samples * 10):
+        strategy = Strategy(rules=rules, **{name: values[rng.integers(len(values))] for name, values in space.items()})
+        if valid(strategy):
+            strategies.setdefault(strategy, None)
+        if len(strategies) == samples:
+            break
+    return list(strategies)
+
+
+def valid(strategy: Strategy) -> bool:
+    return strategy.macd_fast < strategy.macd_slow
+
+
+def _windows(strategy: Strategy) -> Tuple:
+    return tuple(indicator_windows(strategy).values())
+
+
+def _batches(strategies: Iterable[Strategy], size: int) -> List[List[Strategy]]:
+    """Batches of ``size`` with combinations that share windows next to each other, for cache hits."""
+    ordered = sorted(strategies, key=lambda strategy: (_windows(strategy), strategy))
+    return [ordered[i:i + size] for i in range(0, len(ordered), size)]
+
+
+def evaluate(data: Dict[str, np.ndarray], strategies: Iterable[Strategy], cache: IndicatorCache,
+             fee: float = FEE, slippage: float = SLIPPAGE, initial_equity: float = INITIAL_EQUITY) -> List[Result]:
+    base = data[min(data, key=INTERVAL_MS.get)]
+    results = []
+    for strategy in strategies:
+        buy, sell = signals(data, strategy, cache)
+        results.append((strategy, simulate(base, buy, sell, fee, slippage, initial_equity).stats))
+    return results
+
+
+# Worker state: the klines, memory-mapped from the files the parent wrote, and their indicator cache.
+_data: Dict[str, np.ndarray] = {}
+_cache: Optional[IndicatorCache] = None
+
+
+def _init_worker(paths: Dict[str, str], cache_bytes: int) -> None:
+    global _data, _cache
+    _data = {interval: np.load(path, mmap_mode='r') for interval, path in paths.items()}
+    _cache = IndicatorCache(cache_bytes)
+
+
+def _evaluate_batch(strategies: List[Strategy], fee: float, slippage: float, initial_equity: float) -> List[Result]:
+    return evaluate(_data, strategies, _cache, fee, slippage, initial_equity)
+
+
+def optimize(data: Dict[str, np.ndarray], strategies: Iterable[Strategy], workers: Optional[int] = None,
+             fee: float = FEE, slippage: float = SLIPPAGE, initial_equity: float = INITIAL_EQUITY,
+             metric: str = 'return', batch_size: int = 8, cache_bytes: int = CACHE_BYTES) -> List[Result]:
+    """Backtest every strategy over a process pool and rank them by ``metric``, best first.
+
+    The klines are written once to ``.npy`` files that every worker
+    memory-maps, so they are neither pickled nor copied per worker. With
+    ``workers=1`` everything runs in this process.
+    """
+    batches = _batches(strategies, batch_size)
+    if workers == 1:
+        cache = IndicatorCache(cache_bytes)
+        results = [result for batch in batches for result in evaluate(data, batch, cache, fee, slippage, initial_equity)]
+    else:
+        with tempfile.TemporaryDirectory(prefix='algobot-') as directory:
+            paths = {}
+            for interval, klines in data.items():
+                paths[interval] = os.path.join(directory, f'{interval}.npy')
+                np.save(paths[interval], klines)
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(paths, cache_bytes)) as pool:
+                futures = [pool.submit(_evaluate_batch, batch, fee, slippage, initial_equity)
+                           for batch in batches]
+                results = [result for future in futures for result in future.result()]
+    # NaN scores (e.g. no trades) rank last.
+    return sorted(results, key=lambda result: -np.nan_to_num(result[1][metric], nan=-np.inf))
+
+
+def results_frame(results: List[Result]) -> pd.DataFrame:
+    return pd.DataFrame([{**strategy._asdict(), **stats} for strategy, stats in results])
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Search Algobot strategy parameters by backtesting them.")
+    add_data_arguments(parser)
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--samples', type=int, default=100, help="combinations to draw for a random search")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--workers', type=int, help="worker processes, one per CPU by default")
+    parser.add_argument('--metric', default='return', help="statistic to rank by, e.g. return or profit_factor")
+    parser.add_argument('--top', type=int, default=20)
+    for name, values in SEARCH_SPACE.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", nargs='+', type=Strategy.__annotations__[name],
+                            default=values)
+    return parser.parse_args(args)
+
+
+def main(args=None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    options = parse_args(args)
+    data = load_data(options.data, options.resample)
+    space = {name: getattr(options, name) for name in SEARCH_SPACE}
+    if options.search == 'grid':
+        strategies = grid(space, options.rules)
+    else:
+        strategies = random_search(space, options.samples, options.rules, options.seed)
+    started = time.perf_counter()
+    results = optimize(data, strategies, options.workers, options.fee, options.slippage, options.equity,
+                       options.metric)
+    logger.info(f"Backtested {len(results)} combinations in {time.perf_counter() - started:.1f}s")
+    columns = list(SEARCH_SPACE) + ['return', 'max_drawdown', 'trades', 'win_rate', 'profit_factor']
+    print(results_frame(results[:options.top])[columns].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from backtest import (FEE, SLIPPAGE, Strategy, align, aligned_indicator, backtest, load_klines, resample, signals,
+                      simulate)
+from candles import CANDLE_DTYPE
+from indicators import atr, ema, macd_diff, rsi
+from test_indicators import batch, klines
+
+MINUTE = 60_000
+
+
+def candles(count, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, count)))
+    data = np.zeros(count, CANDLE_DTYPE)
+    data['time'] = 1_600_000_020_000 // (15 * MINUTE) * (15 * MINUTE) + np.arange(count) * MINUTE
+    data['open'] = np.concatenate(([close[0]], close[:-1]))
+    data['close'] = close
+    data['high'] = np.maximum(data['open'], close) * 1.001
+    data['low'] = np.minimum(data['open'], close) * 0.999
+    data['volume'] = rng.uniform(1, 10, count)
+    data['closed'] = True
+    return data
+
+
+def test_batch_indicators_match_ta():
+    data = klines(2000, 3)
+    expected = batch(data)
+    high, low, close = data['high'].to_numpy(), data['low'].to_numpy(), data['close'].to_numpy()
+    assert np.array_equal(ema(close), expected['ema'], equal_nan=True)
+    assert np.array_equal(macd_diff(close), expected['macd'], equal_nan=True)
+    assert np.array_equal(rsi(close), expected['rsi'], equal_nan=True)
+    assert np.allclose(atr(high, low, close), expected['atr'], rtol=1e-12, atol=0)
+
+
+def test_longer_intervals_only_use_closed_candles():
+    base = candles(60)
+    fifteen = resample(base, '15m')
+    assert len(fifteen) == 4 and fifteen['high'][0] == base['high'][:15].max()
+    index = align(base, '1m', fifteen, '15m')
+    # The first 15m candle is known from the close of its 15th minute on.
+    assert (index[:14] == -1).all() and (index[14:29] == 0).all() and index[29] == 1
+
+
+def test_simulation_matches_a_bar_by_bar_loop():
+    data = candles(5000, 1)
+    rng = np.random.default_rng(2)
+    buy, sell = rng.random(5000) < 0.01, rng.random(5000) < 0.01
+    result = simulate(data, buy, sell)
+
+    equity, units, trades = 10_000.0, None, 0
+    for i in range(1, len(data)):
+        if units is None and buy[i - 1]:
+            units = equity * (1 - FEE) / (data['open'][i] * (1 + SLIPPAGE))
+            trades += 1
+        elif units is not None and sell[i - 1] and not buy[i - 1]:
+            equity, units = units * data['open'][i] * (1 - SLIPPAGE) * (1 - FEE), None
+    if units is not None:
+        equity = units * data['close'][-1] * (1 - SLIPPAGE) * (1 - FEE)
+    assert result.stats['trades'] == trades == len(result.trades)
+    assert result.stats['final_equity'] == pytest.approx(equity, rel=1e-9)
+    assert 0 <= result.stats['max_drawdown'] < 1
+
+
+def test_backtest_over_files(tmp_path):
+    data = candles(3000, 4)
+    # A Binance dump with a header row and microsecond times.
+    path = tmp_path / 'BTCUSDT-1m.csv'
+    with open(path, 'w') as f:
+        f.write('open_time,open,high,low,close,volume,close_time\n')
+        for time, open_, high, low, close, volume, _ in data.tolist():
+            f.write(f"{time * 1000},{open_!r},{high!r},{low!r},{close!r},{volume!r},{time * 1000 + 59_999_999}\n")
+    np.save(tmp_path / 'more.npy', data[-10:])
+    loaded = load_klines([str(path), str(tmp_path / 'more.npy')])
+    assert np.array_equal(loaded, data)
+
+    intervals = {'1m': loaded, '5m': resample(loaded, '5m')}
+    strategy = Strategy(rsi_buy=60, rsi_sell=40, rules='modular')
+    buy, sell = signals(intervals, strategy)
+    # The 5m MACD signal line is defined from its 34th candle on.
+    assert buy.any() and sell.any() and not (buy[:5 * 34 - 1] | sell[:5 * 34 - 1]).any()
+    assert backtest(intervals, strategy).stats['trades'] > 0
+
+
+def test_signals_only_compute_what_the_rules_read():
+    data = {'1m': candles(3000, 5)}
+    data['5m'] = resample(data['1m'], '5m')
+    requested = []
+
+    def indicator(data, interval, name, windows):
+        requested.append(name)
+        return aligned_indicator(data, interval, name, windows)
+
+    strategy = Strategy(rsi_buy=60, rsi_sell=40, rules='modular')
+    buy, sell = signals(data, strategy, indicator)
+    assert 'atr' not in requested
+    # An ATR warming up for most of the data no longer masks any signal.
+    assert all(np.array_equal(a, b) for a, b in zip(signals(data, strategy._replace(atr_window=2500)), (buy, sell)))
+    assert buy.any() and sell.any()
@@ -0,0 +1,30 @@
+import numpy as np
+
+from candles import CandleRing, candle_dtype
+
+
+def candle(time, close, closed=True):
+    return (time, close, close + 1, close - 1, close, 10.0, closed)
+
+
+def test_view_is_contiguous_and_shared_after_wrapping():
+    ring = CandleRing(4, candle_dtype(['rsi']))
+    for i in range(11):
+        ring.append(candle(i * 60000, 100.0 + i))
+        ring.assign(-1, 'rsi', float(i))
+    view = ring.view()
+    assert len(view) == 4 and ring.last_time() == 600000
+    assert view.base is ring.data and np.shares_memory(view, ring.data)
+    assert view['close'].tolist() == [107.0, 108.0, 109.0, 110.0]
+    assert view['rsi'].tolist() == [7.0, 8.0, 9.0, 10.0]
+
+    # Updates land in place, in whichever copy of a row the view covers.
+    ring.replace(-1, candle(600000, 120.0, closed=False))
+    ring.assign(0, 'rsi', 70.0)
+    assert view['close'][-1] == 120.0 and not view['closed'][-1]
+    assert view['rsi'].tolist() == [70.0, 8.0, 9.0, 10.0]
+
+    ring.append(candle(660000, 121.0))
+    view = ring.view()
+    assert view['time'].tolist() == [480000, 540000, 600000, 660000]
+    assert np.isnan(view['rsi'][-1]) and view['rsi'][-2] == 10.0
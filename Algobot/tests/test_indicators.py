@@ -0,0 +1,57 @@
+
+import numpy as np
+import pandas as pd
+import pytest
+from ta.momentum import RSIIndicator
+from ta.trend import MACD, EMAIndicator
+from ta.volatility import AverageTrueRange
+
+from indicators import INDICATOR_NAMES, IndicatorSet
+
+
+def klines(count, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, count)))
+    # Repeated closes exercise the zero-move and constant-series paths.
+    close[count // 3:count // 3 + 20] = close[count // 3]
+    spread = np.abs(rng.normal(0, 0.001, count)) * close
+    return pd.DataFrame({
+        'time': np.arange(count, dtype=np.int64) * 60000,
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+    })
+
+
+def batch(data):
+    return {
+        'atr': AverageTrueRange(data['high'], data['low'], data['close']).average_true_range().to_numpy(),
+        'macd': MACD(data['close']).macd_diff().to_numpy(),
+        'ema': EMAIndicator(data['close']).ema_indicator().to_numpy(),
+        'rsi': RSIIndicator(data['close']).rsi().to_numpy(),
+    }
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_ta_bit_for_bit(seed):
+    data = klines(500, seed)
+    indicators = IndicatorSet()
+    rows = [indicators.update(*row) for row in data[['time', 'high', 'low', 'close']].itertuples(index=False)]
+    expected = batch(data)
+    for name in INDICATOR_NAMES:
+        np.testing.assert_array_equal(np.array([row[name] for row in rows]), expected[name], err_msg=name)
+
+
+def test_open_candle_is_not_kept():
+    data = klines(200, 7)
+    indicators = IndicatorSet()
+    for row in data.iloc[:-1].itertuples(index=False):
+        indicators.update(row.time, row.high, row.low, row.close)
+    last = data.iloc[-1]
+    for close in (last['close'] * 1.01, last['close'] * 0.98):
+        indicators.update(last['time'], max(last['high'], close), min(last['low'], close), close, closed=False)
+    values = indicators.update(last['time'], last['high'], last['low'], last['close'], closed=False)
+
+    expected = batch(data)
+    assert values == {name: expected[name][-1] for name in INDICATOR_NAMES}
+    assert indicators.last_time == data['time'].iloc[-2]
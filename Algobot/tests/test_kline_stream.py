@@ -0,0 +1,135 @@
+
+import asyncio
+import time
+
+from aiohttp import web
+
+import kline_stream
+from kline_stream import KlineStream
+
+MINUTE = 60_000
+
+
+class FakeBinance:
+    """Local stand-in for the Binance combined kline stream and REST klines endpoint."""
+
+    def __init__(self, count=50):
+        start = (int(time.time() * 1000) // MINUTE - count + 1) * MINUTE
+        self.klines = [self.kline(start + i * MINUTE, 100.0 + i) for i in range(count)]
+        self.sockets = []
+        self.rest_calls = []
+
+    @staticmethod
+    def kline(open_time, close):
+        return [open_time, str(close), str(close + 1), str(close - 1), str(close), '10',
+                open_time + MINUTE - 1, '0', 1, '0', '0', '0']
+
+    def event(self, row, closed):
+        return {'stream': 'btcusdt@kline_1m', 'data': {'e': 'kline', 's': 'BTCUSDT', 'k': {
+            't': row[0], 'i': '1m', 'o': row[1], 'h': row[2], 'l': row[3], 'c': row[4], 'v': row[5], 'x': closed,
+        }}}
+
+    async def push(self, row, closed=False):
+        for ws in list(self.sockets):
+            await ws.send_json(self.event(row, closed))
+
+    async def handle_stream(self, request):
+        assert request.query['streams'] == 'btcusdt@kline_1m'
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.append(ws)
+        async for _ in ws:
+            pass
+        self.sockets.remove(ws)
+        return ws
+
+    async def handle_klines(self, request):
+        self.rest_calls.append(dict(request.query))
+        start = int(request.query.get('startTime', 0))
+        limit = int(request.query['limit'])
+        rows = [row for row in self.klines if row[0] >= start]
+        return web.json_response(rows[:limit] if 'startTime' in request.query else rows[-limit:])
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/stream', self.handle_stream)
+        app.router.add_get('/api/v3/klines', self.handle_klines)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+
+
+async def until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        await asyncio.sleep(0.01)
+
+
+def run(scenario, monkeypatch):
+    monkeypatch.setattr(kline_stream, 'RECONNECT_DELAY', 0.01)
+
+    async def main():
+        exchange = FakeBinance()
+        await exchange.start()
+        stream = KlineStream(['BTCUSDT'], ['1m'], size=100, stream_url=exchange.url.replace('http', 'ws') + '/stream',
+                             rest_url=exchange.url)
+        task = asyncio.ensure_future(stream.run())
+        try:
+            await until(lambda: exchange.sockets and len(stream.klines('BTCUSDT', '1m')) == 50)
+            await scenario(exchange, stream)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await exchange.runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_stream_updates_buffer_in_place(monkeypatch):
+    async def scenario(exchange, stream):
+        rest_calls = len(exchange.rest_calls)
+        last = exchange.klines[-1]
+        await exchange.push(exchange.kline(last[0], 200.0))
+        await until(lambda: stream.klines('BTCUSDT', '1m')[-1].close == 200.0)
+        await exchange.push(exchange.kline(last[0], 201.0), closed=True)
+        nxt = exchange.kline(last[0] + MINUTE, 202.0)
+        exchange.klines.append(nxt)
+        await exchange.push(nxt)
+        await until(lambda: stream.klines('BTCUSDT', '1m')[-1].close == 202.0)
+        klines = stream.klines('BTCUSDT', '1m')
+        assert len(klines) == 51
+        assert klines[-2].close == 201.0 and klines[-2].closed
+        assert not klines[-1].closed
+        assert len(exchange.rest_calls) == rest_calls
+
+    run(scenario, monkeypatch)
+
+
+def test_gap_is_backfilled_over_rest(monkeypatch):
+    async def scenario(exchange, stream):
+        last = exchange.klines[-1][0]
+        exchange.klines += [exchange.kline(last + i * MINUTE, 300.0 + i) for i in range(1, 4)]
+        await exchange.push(exchange.klines[-1])
+        await until(lambda: stream.klines('BTCUSDT', '1m')[-1].close == 303.0)
+        assert [k.close for k in stream.klines('BTCUSDT', '1m')[-3:]] == [301.0, 302.0, 303.0]
+        assert exchange.rest_calls[-1]['startTime'] == str(last + MINUTE)
+
+    run(scenario, monkeypatch)
+
+
+def test_reconnect_backfills_from_last_kline(monkeypatch):
+    async def scenario(exchange, stream):
+        last = exchange.klines[-1][0]
+        for ws in list(exchange.sockets):
+            await ws.close()
+        exchange.klines[-1] = exchange.kline(last, 150.0)
+        exchange.klines.append(exchange.kline(last + MINUTE, 151.0))
+        await until(lambda: stream.connects == 2 and stream.klines('BTCUSDT', '1m')[-1].close == 151.0)
+        klines = stream.klines('BTCUSDT', '1m')
+        assert klines[-2].close == 150.0
+        assert exchange.rest_calls[-1]['startTime'] == str(last)
+
+    run(scenario, monkeypatch)
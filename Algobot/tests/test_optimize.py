@@ -0,0 +1,36 @@
+from backtest import Strategy, backtest, resample
+from optimize import IndicatorCache, evaluate, grid, optimize, random_search, results_frame
+from test_backtest import candles
+
+SPACE = {'rsi_buy': [50, 60], 'rsi_sell': [40, 50], 'ema_window': [9, 14], 'macd_fast': [12, 30]}
+
+
+def test_search_spaces():
+    strategies = grid(SPACE, 'modular')
+    # macd_fast=30 is not faster than macd_slow=26.
+    assert len(strategies) == 8 and all(s.macd_fast == 12 and s.rules == 'modular' for s in strategies)
+    drawn = random_search(SPACE, samples=5, seed=1)
+    assert len(set(drawn)) == 5 and drawn == random_search(SPACE, samples=5, seed=1)
+    assert set(drawn) <= set(grid(SPACE))
+
+
+def test_windows_are_computed_once():
+    data = {'1m': candles(2000, 5)}
+    data['15m'] = resample(data['1m'], '15m')
+    cache = IndicatorCache()
+    evaluate(data, grid(SPACE, 'modular'), cache)
+    # Per interval: MACD, RSI and close once, EMA once per window; ATR is not read by the rules.
+    assert cache.misses == 2 * (3 + 2) and cache.hits == 8 * 2 * 4 - cache.misses
+
+
+def test_pool_matches_single_backtests():
+    data = {'1m': candles(3000, 4)}
+    data['5m'] = resample(data['1m'], '5m')
+    strategies = grid(SPACE, 'modular')
+    pooled = optimize(data, strategies, workers=2, batch_size=3)
+    assert results_frame(optimize(data, strategies, workers=1)).equals(results_frame(pooled))
+    assert sorted(strategy for strategy, _ in pooled) == sorted(strategies)
+    returns = [stats['return'] for _, stats in pooled]
+    assert returns == sorted(returns, reverse=True) and any(stats['trades'] for _, stats in pooled)
+    single = [(strategy, backtest(data, strategy).stats) for strategy, _ in pooled]
+    assert results_frame(single).equals(results_frame(pooled))
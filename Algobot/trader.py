@@ -5,13 +5,14 @@ import pandas as pd
 import numpy as np
 import traceback
 from binance.client import Client
-from ta.volatility import AverageTrueRange
-from ta.trend import MACD, EMAIndicator
-from ta.momentum import RSIIndicator
 from pymongo import MongoClient
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from candles import CandleRing, candle_dtype
+from indicators import INDICATOR_NAMES, IndicatorSet
+from kline_stream import KlineStream
+
 # Constants
 RETRY_DELAY = 5
 RSI_BUY_THRESHOLD = 30
@@ -39,6 +40,10 @@ db = mongo_client['trading_data']
 COLUMN_NAMES = ['time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_av', 'trades', 'tb_base_av', 'tb_quote_av', 'ignore']
 INTERVALS = [Client.KLINE_INTERVAL_1MINUTE, Client.KLINE_INTERVAL_5MINUTE, Client.KLINE_INTERVAL_15MINUTE]
 
+# Indicator state per interval, carried across loops; values are stored next to the candles.
+indicators = {interval: IndicatorSet() for interval in INTERVALS}
+CANDLE_DTYPE = candle_dtype(INDICATOR_NAMES)
+
 def get_klines(symbol: str, interval: str, retries: int = 3) -> list:
     """Retrieve klines data."""
     for _ in range(retries):
@@ -49,44 +54,47 @@ def get_klines(symbol: str, interval: str, retries: int = 3) -> list:
             time.sleep(RETRY_DELAY)
     raise Exception("Max retries exceeded for get_klines")
 
-def calculate_indicators(data: pd.DataFrame) -> pd.DataFrame:
-    """Calculate ATR, MACD, EMA, and RSI indicators."""
-    atr = AverageTrueRange(data['high'], data['low'], data['close'])
-    data['atr'] = atr.average_true_range()
-
-    macd = MACD(data['close'])
-    data['macd'] = macd.macd_diff()
-
-    ema = EMAIndicator(data['close'])
-    data['ema'] = ema.ema_indicator()
-
-    rsi = RSIIndicator(data['close'])
-    data['rsi'] = rsi.rsi()
-
-    return data
-
-def get_data(symbol: str, intervals: list) -> dict:
-    """Retrieve and preprocess data for multiple intervals."""
-    data = {}
-    for interval in intervals:
-        frame = get_klines(symbol, interval)
-        df = pd.DataFrame(frame, columns=COLUMN_NAMES)
-        df[['open', 'high', 'low', 'close', 'volume']] = df[['open', 'high', 'low', 'close', 'volume']].astype(float)
-        df = calculate_indicators(df)
-        data[interval] = df
-    return data
+def calculate_indicators(candles: CandleRing, state: IndicatorSet) -> np.ndarray:
+    """Feed the klines not seen yet to the incremental ATR, MACD, EMA and RSI and store their values in place.
+
+    Klines the stream has not marked closed are evaluated without advancing the state.
+    Returns a view of the candles.
+    """
+    view = candles.view()
+    times, highs, lows, closes, closed = view['time'], view['high'], view['low'], view['close'], view['closed']
+    start = 0 if state.last_time is None else int(np.searchsorted(times, state.last_time, side='right'))
+    for i in range(start, len(view)):
+        values = state.update(int(times[i]), float(highs[i]), float(lows[i]), float(closes[i]), closed=bool(closed[i]))
+        for name, value in values.items():
+            candles.assign(i, name, value)
+    return view
+
+def get_data(symbol: str, intervals: list, stream: KlineStream) -> dict:
+    """Update the indicators of every interval in the stream's buffers and return views of them.
+
+    The views share memory with the stream, so hold ``stream.lock`` while calling this and reading them.
+    """
+    return {interval: calculate_indicators(stream.candles(symbol, interval), indicators[interval])
+            for interval in intervals}
+
+def last_closed(candles: np.ndarray):
+    """The most recent closed candle of a view, or None before the first one closes."""
+    closed = np.flatnonzero(candles['closed'])
+    return candles[closed[-1]] if len(closed) else None
 
 def should_buy(data: dict) -> bool:
-    """Determine whether to buy based on the current data."""
-    for df in data.values():
-        if df['macd'].iloc[-1] <= 0 or df['ema'].iloc[-1] <= df['close'].iloc[-1] or df['rsi'].iloc[-1] >= RSI_BUY_THRESHOLD:
+    """Determine whether to buy based on the last closed candle of every interval."""
+    for candles in data.values():
+        last = last_closed(candles)
+        if last is None or last['macd'] <= 0 or last['ema'] <= last['close'] or last['rsi'] >= RSI_BUY_THRESHOLD:
             return False
     return True
 
 def should_sell(data: dict) -> bool:
-    """Determine whether to sell based on the current data."""
-    for df in data.values():
-        if df['macd'].iloc[-1] >= 0 or df['ema'].iloc[-1] >= df['close'].iloc[-1] or df['rsi'].iloc[-1] <= RSI_SELL_THRESHOLD:
+    """Determine whether to sell based on the last closed candle of every interval."""
+    for candles in data.values():
+        last = last_closed(candles)
+        if last is None or last['macd'] >= 0 or last['ema'] >= last['close'] or last['rsi'] <= RSI_SELL_THRESHOLD:
             return False
     return True
 
@@ -124,37 +132,52 @@ def place_order(symbol: str, side: str, quantity: float) -> float:
 
 def main():
     high_volume_periods = get_high_volume_periods(SYMBOL, INTERVALS[0])
+    # Klines are pushed over a WebSocket; each loop runs as soon as one changes.
+    stream = KlineStream([SYMBOL], INTERVALS, dtype=CANDLE_DTYPE)
+    stream.start()
 
+    # Open time of the last closed base-interval candle that was stored.
+    stored_time = None
     while True:
-        data = get_data(SYMBOL, INTERVALS)
-
-        if data is not None:
-            # Only trade during high volume periods
-            if data[INTERVALS[0]]['time'].iloc[-1] in high_volume_periods.values:
-                if should_buy(data):
-                    quantity = get_optimal_quantity(SYMBOL)
-                    remaining_quantity = place_order(SYMBOL, Client.SIDE_BUY, quantity)
-                    while remaining_quantity > 0:
-                        remaining_quantity = place_order(SYMBOL, Client.SIDE_BUY, remaining_quantity)
-                elif should_sell(data):
-                    quantity = get_optimal_quantity(SYMBOL)
-                                        remaining_quantity = place_order(SYMBOL, Client.SIDE_SELL, quantity)
-                    while remaining_quantity > 0:
-                        remaining_quantity = place_order(SYMBOL, Client.SIDE_SELL, remaining_quantity)
-
-            # Store data in MongoDB
-            db[SYMBOL].insert_one(data[INTERVALS[0]].to_dict())
-
-            # Plot closing prices and indicators
-            plt.figure(figsize=(14, 7))
-            sns.lineplot(data=data[INTERVALS[0]], x='time', y='close')
-            sns.lineplot(data=data[INTERVALS[0]], x='time', y='macd')
-            sns.lineplot(data=data[INTERVALS[0]], x='time', y='ema')
-            sns.lineplot(data=data[INTERVALS[0]], x='time', y='rsi')
-            plt.title(f'Closing Prices and Indicators of {SYMBOL} Over Time')
-            plt.show()
-        else:
-            break  # Exit the loop if there's an error getting data
+        stream.wait()
+        if not stream.ready():
+            continue
+        # Signals are read straight from the stream's buffers; the stream waits while we hold the lock.
+        with stream.lock:
+            data = get_data(SYMBOL, INTERVALS, stream)
+            closed_time = indicators[INTERVALS[0]].last_time
+            # The loop runs on every kline update; signals are only taken on a
+            # closed base-interval candle, so an open one cannot trigger a trade.
+            if closed_time == stored_time:
+                continue
+            buy, sell = should_buy(data), should_sell(data)
+            history = data[INTERVALS[0]].copy()
+        stored_time = closed_time
+
+        # Only trade during high volume periods
+        if closed_time in high_volume_periods.values:
+            if buy:
+                quantity = get_optimal_quantity(SYMBOL)
+                remaining_quantity = place_order(SYMBOL, Client.SIDE_BUY, quantity)
+                while remaining_quantity > 0:
+                    remaining_quantity = place_order(SYMBOL, Client.SIDE_BUY, remaining_quantity)
+            elif sell:
+                quantity = get_optimal_quantity(SYMBOL)
+                remaining_quantity = place_order(SYMBOL, Client.SIDE_SELL, quantity)
+                while remaining_quantity > 0:
+                    remaining_quantity = place_order(SYMBOL, Client.SIDE_SELL, remaining_quantity)
+
+        # Store data in MongoDB
+        db[SYMBOL].insert_one({name: history[name].tolist() for name in history.dtype.names})
+
+        # Plot closing prices and indicators
+        plt.figure(figsize=(14, 7))
+        sns.lineplot(x=history['time'], y=history['close'])
+        sns.lineplot(x=history['time'], y=history['macd'])
+        sns.lineplot(x=history['time'], y=history['ema'])
+        sns.lineplot(x=history['time'], y=history['rsi'])
+        plt.title(f'Closing Prices and Indicators of {SYMBOL} Over Time')
+        plt.show()
 
 if __name__ == "__main__":
     main()
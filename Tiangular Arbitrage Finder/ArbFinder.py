@@ -1,21 +1,28 @@
 import asyncio
-import aiohttp
-import json
+import os
 import pandas as pd
-from aiohttp import TCPConnector
-from contextlib import asynccontextmanager
-from requests_cache import install_cache
-from typing import Dict, List, Tuple, Union
+from typing import Callable, Dict, List, Optional
 import logging
-from gql import gql, Client
-from gql.transport.aiohttp import AIOHTTPTransport
+from flask import Flask, Response, jsonify, request
+
+from chain_sync import ReserveSync
+from cycles import CycleCache
+from feed import OpportunityFeed, Scanner
+from graph import TokenGraph
+from graphql_pool import GraphQLClientPool
+from scheduler import ExchangeScheduler
+from slippage import size_cycles
+from snapshot import Snapshot, take_snapshot
 
 # Constants
-CONFIG_FILE = "config.json"
-CACHE_EXPIRE_TIME = 300
 TIME_INTERVAL = 5
-QUOTE_ASSET_AMOUNT = 1000
-CHUNK_SIZE = 50
+PROFIT_THRESHOLD = 0.01
+MAX_CYCLE_LENGTH = 3
+SNAPSHOT_MAX_PAIRS = 50000
+REQUESTS_PER_SECOND = 10
+MAX_CONCURRENCY = 16
+CYCLE_CACHE_PATH = 'cycle_cache.npz'
+POOL_DISCOVERY_INTERVAL = 300
 
 log = logging.getLogger(__name__)
 
@@ -23,199 +30,152 @@ log = logging.getLogger(__name__)
 UNISWAP_API = 'https://api.thegraph.com/subgraphs/name/uniswap/uniswap-v2'
 SUSHISWAP_API = 'https://api.thegraph.com/subgraphs/name/sushiswap/exchange'
 PANCAKESWAP_API = 'https://api.thegraph.com/subgraphs/name/pancakeswap/exchange-v2'
+EXCHANGE_APIS = {
+    'uniswap': UNISWAP_API,
+    'sushiswap': SUSHISWAP_API,
+    'pancakeswap': PANCAKESWAP_API,
+}
+
+# JSON-RPC nodes, e.g. UNISWAP_RPC_URL=http://127.0.0.1:8545 for a local anvil.
+# Exchanges with a node follow Sync events after one subgraph bootstrap; the
+# rest keep polling their subgraph every tick.
+RPC_URLS = {
+    exchange: os.environ[f"{exchange.upper()}_RPC_URL"]
+    for exchange in EXCHANGE_APIS
+    if os.environ.get(f"{exchange.upper()}_RPC_URL")
+}
 
 # GraphQL client setup
-async def get_graphql_client(url):
-    transport = AIOHTTPTransport(url=url)
-    client = Client(transport=transport, fetch_schema_from_transport=True)
-    return client
-# ... (previous part of the code)
-
-async def get_symbols(session: aiohttp.ClientSession, exchange: str) -> List[Dict]:
-    if exchange not in ['uniswap', 'sushiswap', 'pancakeswap']:
-        raise ValueError('Unsupported exchange')
-
-    if exchange == 'uniswap':
-        url = UNISWAP_API
-    elif exchange == 'sushiswap':
-        url = SUSHISWAP_API
-    else:
-        url = PANCAKESWAP_API
-
-    client = await get_graphql_client(url)
-    query = gql("""
-    {
-      pairs(first: 1000) {
-        id
-        token0 {
-          symbol
-        }
-        token1 {
-          symbol
-        }
-      }
-    }
-    """)
-
-    result = await client.execute_async(query)
-    pairs = result['pairs']
-
-    symbols = [
-        {
-            'symbol_id': pair['id'],
-            'symbol_type': 'SPOT',
-            'base_asset': pair['token0']['symbol'],
-            'quote_asset': pair['token1']['symbol']
-        }
-        for pair in pairs
-    ]
-
-    return symbols
-
-# Replace the following functions with new implementations
-# ... (get_exchange_rate, calculate_triangular_profit, calculate_average_percentage_change, get_average_percentage_change)
-
-# ... (previous part of the code)
-
-async def get_exchange_rate(session: aiohttp.ClientSession, exchange: str, base_asset: str, quote_asset: str) -> float:
-    cache_key = f"{exchange}_{base_asset}_{quote_asset}"
-    if cache_key in exchange_rate_cache:
-        return exchange_rate_cache[cache_key]
-    else:
-        if exchange not in ['uniswap', 'sushiswap', 'pancakeswap']:
-            raise ValueError('Unsupported exchange')
-
-        if exchange == 'uniswap':
-            url = UNISWAP_API
-        elif exchange == 'sushiswap':
-            url = SUSHISWAP_API
-        else:
-            url = PANCAKESWAP_API
-
-        client = await get_graphql_client(url)
-        query = gql("""
-        query GetExchangeRate($baseAsset: String!, $quoteAsset: String!) {
-          pairs(where: {token0: $baseAsset, token1: $quoteAsset}) {
-            token0Price
-          }
-        }
-        """)
-
-        variables = {'baseAsset': base_asset, 'quoteAsset': quote_asset}
-        result = await client.execute_async(query, variable_values=variables)
-
-        if len(result['pairs']) == 0:
-            raise ValueError(f"No exchange rate found for {base_asset} and {quote_asset}")
-
-        exchange_rate = float(result['pairs'][0]['token0Price'])
-        exchange_rate_cache[cache_key] = exchange_rate
-        return exchange_rate
-
-# Replace the following functions with new implementations
-# ... (calculate_triangular_profit, calculate_average_percentage_change, get_average_percentage_change)
-# ... (previous part of the code)
-
-async def calculate_triangular_profit(quote_asset_amount: int, exchange_rate_a: float, exchange_rate_b: float, exchange_rate_c: float) -> float:
-    base_asset_amount_a = quote_asset_amount / exchange_rate_a
-    base_asset_amount_b = base_asset_amount_a * exchange_rate_b
-    base_asset_amount_c = base_asset_amount_b * exchange_rate_c
-    profit_percentage = (base_asset_amount_c - quote_asset_amount) / quote_asset_amount
-    return profit_percentage
-
-async def calculate_average_percentage_change(symbol_id: str, ohlcv_data: Dict) -> float:
-    price_data = [c for _, _, _, c, _ in ohlcv_data['data']]
-    percentage_changes = [(price_data[i] - price_data[i-1]) / price_data[i-1] for i in range(1, len(price_data))]
-    average_percentage_change = sum(percentage_changes) / len(percentage_changes)
-    return average_percentage_change
-
-async def get_average_percentage_change(session: aiohttp.ClientSession, exchange: str, symbol_id: str, period_id: str='1DAY', limit: int=30) -> float:
-    cache_key = f"{exchange}_{symbol_id}_{period_id}_{limit}"
-    if cache_key in average_percentage_change_cache:
-        return average_percentage_change_cache[cache_key]
-    else:
-        query_params = {'symbol_id': symbol_id, 'period_id': period_id, 'limit': limit}
+graphql_pool = GraphQLClientPool(EXCHANGE_APIS)
+schedulers = {
+    exchange: ExchangeScheduler(rate=REQUESTS_PER_SECOND, burst=2 * REQUESTS_PER_SECOND, max_concurrency=MAX_CONCURRENCY)
+    for exchange in EXCHANGE_APIS
+}
+# Cycles are enumerated once per pool universe and reloaded at startup.
+cycle_cache = CycleCache(CYCLE_CACHE_PATH)
+
+reserve_syncs: List[ReserveSync] = []
+reserve_sync_tasks: List[asyncio.Task] = []
+
+async def stop_reserve_syncs() -> None:
+    for task in reserve_sync_tasks:
+        task.cancel()
+    await asyncio.gather(*reserve_sync_tasks, return_exceptions=True)
+    for sync in reserve_syncs:
+        await sync.close()
+    reserve_syncs.clear()
+    reserve_sync_tasks.clear()
+
+async def start_reserve_syncs(snapshot: Snapshot) -> None:
+    # A restart after a failed task must not leave the old pollers running
+    # or their node sessions open.
+    await stop_reserve_syncs()
+    by_url: Dict[str, List[str]] = {}
+    for exchange, url in RPC_URLS.items():
+        by_url.setdefault(url, []).append(exchange)
+    for url, exchanges in by_url.items():
+        sync = ReserveSync(url, exchanges)
+        await sync.bootstrap(snapshot)
+        reserve_syncs.append(sync)
+        reserve_sync_tasks.append(asyncio.create_task(sync.run()))
+    if reserve_syncs:
+        reserve_sync_tasks.append(asyncio.create_task(follow_new_pools(list(reserve_syncs))))
+
+async def follow_new_pools(syncs: List[ReserveSync]) -> None:
+    """Hand pools listed after bootstrap to the reserve syncs every POOL_DISCOVERY_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(POOL_DISCOVERY_INTERVAL)
         try:
-            ohlcv_data = await make_request(session, exchange, 'ohlcv', query_params)
-            average_percentage_change = await calculate_average_percentage_change(symbol_id, ohlcv_data)
-            average_percentage_change_cache[cache_key] = average_percentage_change
-            return average_percentage_change
+            sessions = await graphql_pool.connect_all()
+            synced = {exchange: session for exchange, session in sessions.items() if exchange in RPC_URLS}
+            snapshot = await take_snapshot(synced, max_pairs=SNAPSHOT_MAX_PAIRS, schedulers=schedulers)
+            for sync in syncs:
+                await sync.follow(snapshot)
         except Exception as e:
-            log.error(f"Error calculating average percentage change for symbol {symbol_id}: {e}")
-            return 0.0
+            log.error(f"Error following new pools: {e}")
+
+async def get_snapshot(on_pairs: Optional[Callable[[str, List[Dict]], None]] = None) -> Snapshot:
+    """Fetch the pairs of every exchange; ``on_pairs`` sees each page as it lands."""
+    sessions = await graphql_pool.connect_all()
+    if not RPC_URLS:
+        return await take_snapshot(sessions, max_pairs=SNAPSHOT_MAX_PAIRS, schedulers=schedulers, on_pairs=on_pairs)
+    if not reserve_sync_tasks or any(task.done() for task in reserve_sync_tasks):
+        snapshot = await take_snapshot(sessions, max_pairs=SNAPSHOT_MAX_PAIRS, schedulers=schedulers, on_pairs=on_pairs)
+        await start_reserve_syncs(snapshot)
+        return snapshot
+    polled = {exchange: session for exchange, session in sessions.items() if exchange not in RPC_URLS}
+    # Chain-synced pools are already local, so they are handed over first.
+    synced = {}
+    for sync in reserve_syncs:
+        synced.update(sync.snapshot().pairs)
+    if on_pairs is not None:
+        for exchange, pairs in synced.items():
+            on_pairs(exchange, pairs)
+    snapshot = await take_snapshot(polled, max_pairs=SNAPSHOT_MAX_PAIRS, schedulers=schedulers, on_pairs=on_pairs)
+    return Snapshot(dict(snapshot.pairs, **synced))
 
 # Replace the following functions with new implementations
 # ... (check_for_profitable_trades)
 
 # ... (previous part of the code)
 
-async def check_for_profitable_trades() -> pd.DataFrame:
-    async with aiohttp_session() as session:
-        tasks = []
-        for exchange in ['uniswap', 'sushiswap', 'pancakeswap']:
-            symbols = []
-            try:
-                symbols = await get_symbols(session, exchange)
-            except Exception as e:
-                log.error(f"Error getting symbols for {exchange}: {e}")
-                continue
-            symbol_ids = [symbol['symbol_id'] for symbol in symbols if symbol['symbol_type'] == 'SPOT']
-
-            tasks = []
-            for symbol_id in symbol_ids:
-                tasks.append(get_average_percentage_change(session, exchange, symbol_id))
-            try:
-                average_percentage_changes = await asyncio.gather(*tasks)
-            except Exception as e:
-                log.error(f"Error getting average percentage changes for symbols {symbol_ids} on {exchange}: {e}")
-                continue
-
-            for symbol, average_percentage_change in zip(symbol_ids, average_percentage_changes):
-                if average_percentage_change < 0:
-                    continue
-                base_asset, quote_asset = symbol.split('_')
-                exchange_rate_a = await get_exchange_rate(session, exchange, quote_asset, 'USD')
-                exchange_rate_b = await get_exchange_rate(session, exchange, base_asset, quote_asset)
-                for other_exchange in [e for e in ['uniswap', 'sushiswap', 'pancakeswap'] if e != exchange]:
-                    common_asset = set(ENDPOINTS[exchange]).intersection(set(ENDPOINTS[other_exchange]))
-                    if len(common_asset) == 0:
-                        continue
-                    common_asset = common_asset.pop().split('/')[-1]
-                    exchange_rate_c = await get_exchange_rate(session, other_exchange, common_asset, 'USD')
-                    quote_asset_amount = QUOTE_ASSET_AMOUNT
-                    profit_percentage = await calculate_triangular_profit(quote_asset_amount, exchange_rate_a, exchange_rate_b, exchange_rate_c)
-                    if profit_percentage > PROFIT_THRESHOLD:
-                        results.append({
-                            'exchange_a': exchange,
-                            'exchange_b': other_exchange,
-                            'symbol_a': symbol,
-                            'base_asset_a': base_asset,
-                            'quote_asset_a': quote_asset,
-                            'symbol_b': f"{common_asset}_{quote_asset}",
-                            'base_asset_b': common_asset,
-                            'quote_asset_b': quote_asset,
-                            'symbol_c': f"{common_asset}_{base_asset}",
-                            'base_asset_c': common_asset,
-                            'quote_asset_c': base_asset,
-                            'quote_asset_amount': quote_asset_amount,
-                            'profit_percentage': profit_percentage
-                        })
-
+async def check_for_profitable_trades(max_cycle_length: int = MAX_CYCLE_LENGTH, method: str = 'matrix') -> pd.DataFrame:
+    # Pages are added to the graph as they arrive, so building it overlaps
+    # with the requests still in flight instead of waiting for the slowest.
+    graph = TokenGraph()
+    await get_snapshot(graph.add_pairs)
+
+    # Spot prices ignore fees and depth, so take every spot-profitable cycle
+    # and let the reserve model decide which ones survive execution.
+    candidates = graph.find_opportunities(0.0, max_length=max_cycle_length, method=method, cycle_cache=cycle_cache)
+    spot_profits = dict(candidates)
+    opportunities = size_cycles(graph, list(spot_profits), PROFIT_THRESHOLD)
+    log.info(f"Scanned {graph.edge_count} edges across {len(graph)} tokens, "
+             f"{len(candidates)} spot cycles, {len(opportunities)} executable")
+    results = []
+    for sized in opportunities:
+        cycle = sized.pop('cycle')
+        result = graph.describe_cycle(cycle, sized['profit_percentage'], sized['optimal_input'])
+        result['spot_profit_percentage'] = spot_profits[cycle]
+        result.update(sized)
+        results.append(result)
     return pd.DataFrame(results)
 
+async def scan_opportunities() -> List[Dict]:
+    results = await check_for_profitable_trades()
+    return results.to_dict(orient='records')
+
 # ... (main function and other parts of the code)
+# Scans run continuously in the background; requests only read the latest results.
+feed = OpportunityFeed()
+scanner = Scanner(feed, scan_opportunities, TIME_INTERVAL)
+
 # Create Flask app
 app = Flask(__name__)
 
 # Define route for API endpoint
 @app.route('/profitable_trades', methods=['GET'])
 def profitable_trades():
-    try:
-        results = asyncio.run(check_for_profitable_trades())
-        return jsonify(results.to_dict(orient='records'))
-    except Exception as e:
-        return jsonify({"error": str(e)})
+    scanner.start()
+    state = feed.snapshot()
+    if state['error'] is not None and state['updated'] is None:
+        return jsonify({"error": state['error']})
+    response = jsonify(state['opportunities'])
+    response.headers['X-Feed-Sequence'] = str(state['sequence'])
+    return response
+
+# Server-sent events: an upsert for every new or changed opportunity and a
+# remove for every one that disappeared, each with its sequence number as the
+# event id so reconnecting clients resume via Last-Event-ID.
+@app.route('/profitable_trades/stream', methods=['GET'])
+def profitable_trades_stream():
+    scanner.start()
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('since'))
+    last_sequence = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return Response(feed.stream(last_sequence), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # Run Flask app
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=True, threaded=True)
 
@@ -0,0 +1,279 @@
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from snapshot import Snapshot
+
+log = logging.getLogger(__name__)
+
+# keccak256("Sync(uint112,uint112)"), emitted by every Uniswap-V2 style pair
+# after each mint, burn and swap with the pool's full new reserves.
+SYNC_TOPIC = '0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1'
+# getReserves() selector.
+GET_RESERVES = '0x0902f1ac'
+LOG_BLOCK_RANGE = 2000
+REORG_DEPTH = 64
+CALL_BATCH_SIZE = 500
+
+
+class JsonRpcError(Exception):
+    def __init__(self, error: Dict):
+        super().__init__(error.get('message', str(error)))
+        self.code = error.get('code')
+
+
+class JsonRpcClient:
+    """Minimal Ethereum JSON-RPC client over HTTP with request batching."""
+
+    def __init__(self, url: str, session: Optional[aiohttp.ClientSession] = None):
+        self.url = url
+        self._session = session
+        self._owns_session = session is None
+        self._ids = itertools.count(1)
+
+    async def _post(self, payload: Any) -> Any:
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        async with self._session.post(self.url, json=payload) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def call(self, method: str, *params: Any) -> Any:
+        reply = await self._post({'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': list(params)})
+        if 'error' in reply:
+            raise JsonRpcError(reply['error'])
+        return reply['result']
+
+    async def batch(self, calls: List[Tuple[str, List[Any]]]) -> List[Any]:
+        """Send calls as one JSON-RPC batch; each result is a value or a JsonRpcError."""
+        if not calls:
+            return []
+        ids = [next(self._ids) for _ in calls]
+        replies = await self._post([
+            {'jsonrpc': '2.0', 'id': call_id, 'method': method, 'params': params}
+            for call_id, (method, params) in zip(ids, calls)
+        ])
+        by_id = {reply.get('id'): reply for reply in replies}
+        results = []
+        for call_id in ids:
+            reply = by_id.get(call_id, {'error': {'message': 'missing reply'}})
+            results.append(JsonRpcError(reply['error']) if 'error' in reply else reply['result'])
+        return results
+
+    async def close(self) -> None:
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
+
+def decode_reserves(data: str) -> Tuple[int, int]:
+    """The first two 32-byte words of a Sync log or getReserves() return value."""
+    raw = data[2:] if data.startswith('0x') else data
+    return int(raw[0:64], 16), int(raw[64:128], 16)
+
+
+@dataclass
+class Pool:
+    exchange: str
+    pair: Dict
+    decimals0: int
+    decimals1: int
+    block: int = -1
+    log_index: int = -1
+
+    def update(self, reserve0: int, reserve1: int, block: int, log_index: int = -1) -> None:
+        """Store raw on-chain reserves in the subgraph's decimal-adjusted pair format."""
+        amount0 = reserve0 / 10 ** self.decimals0
+        amount1 = reserve1 / 10 ** self.decimals1
+        self.pair = dict(
+            self.pair,
+            reserve0=repr(amount0),
+            reserve1=repr(amount1),
+            token0Price=repr(amount0 / amount1) if amount1 else '0',
+            token1Price=repr(amount1 / amount0) if amount0 else '0',
+        )
+        self.block = block
+        self.log_index = log_index
+
+
+class ReserveSync:
+    """Pool reserves kept current from Uniswap-V2 ``Sync`` events on a JSON-RPC node.
+
+    Pools (and token metadata) are taken from a subgraph snapshot and their
+    reserves read with ``getReserves()`` at the current head; pools listed by
+    later snapshots are picked up with ``follow``. From then on every poll
+    fetches the ``Sync`` logs of the blocks since the last one and applies
+    them in chain order, so reserves trail the node by at most one poll. The last ``REORG_DEPTH`` block hashes are kept; when the chain
+    reorganises, pools touched by orphaned blocks are re-read and the logs
+    are replayed from the fork point.
+    """
+
+    def __init__(self, rpc_url: str, exchanges: Iterable[str], confirmations: int = 0,
+                 poll_interval: float = 1.0, session: Optional[aiohttp.ClientSession] = None):
+        self.rpc = JsonRpcClient(rpc_url, session)
+        self.exchanges = set(exchanges)
+        self.confirmations = confirmations
+        self.poll_interval = poll_interval
+        self.pools: Dict[str, Pool] = {}
+        self.block = -1
+        self.hashes: Dict[int, str] = {}
+        # Polls and newly followed pools must not interleave their reads.
+        self._lock = asyncio.Lock()
+
+    def add_pairs(self, exchange: str, pairs: Iterable[Dict]) -> List[str]:
+        """Track the pools of ``pairs`` not tracked yet; returns their addresses."""
+        added = []
+        for pair in pairs:
+            address = pair['id'].lower()
+            if address in self.pools:
+                continue
+            self.pools[address] = Pool(
+                exchange, pair, int(pair['token0'].get('decimals') or 18), int(pair['token1'].get('decimals') or 18)
+            )
+            added.append(address)
+        return added
+
+    async def _head(self) -> int:
+        return int(await self.rpc.call('eth_blockNumber'), 16) - self.confirmations
+
+    async def _block_hash(self, number: int) -> Optional[str]:
+        block = await self.rpc.call('eth_getBlockByNumber', hex(number), False)
+        return block['hash'] if block else None
+
+    def _remember(self, number: int, block_hash: str) -> None:
+        self.hashes[number] = block_hash
+        for stale in [n for n in self.hashes if n <= number - REORG_DEPTH]:
+            del self.hashes[stale]
+
+    async def refresh(self, addresses: Iterable[str], block: int) -> None:
+        """Read the reserves of ``addresses`` with batched ``getReserves()`` calls at ``block``."""
+        addresses = list(addresses)
+        for start in range(0, len(addresses), CALL_BATCH_SIZE):
+            chunk = addresses[start:start + CALL_BATCH_SIZE]
+            results = await self.rpc.batch([
+                ('eth_call', [{'to': address, 'data': GET_RESERVES}, hex(block)]) for address in chunk
+            ])
+            for address, result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    log.warning(f"getReserves failed for {address}: {result}")
+                    continue
+                self.pools[address].update(*decode_reserves(result), block)
+
+    async def bootstrap(self, snapshot: Snapshot) -> None:
+        """Take the pools of this node's exchanges from a snapshot and read their reserves at the head."""
+        for exchange, pairs in snapshot.pairs.items():
+            if exchange in self.exchanges:
+                self.add_pairs(exchange, pairs)
+        head = await self._head()
+        head_hash = await self._block_hash(head)
+        await self.refresh(list(self.pools), head)
+        self.block = head
+        self._remember(head, head_hash)
+        log.info(f"Synced reserves of {len(self.pools)} pools at block {head}")
+
+    async def follow(self, snapshot: Snapshot) -> int:
+        """Track the pools a later snapshot lists for this node's exchanges; returns how many were new.
+
+        New pools are read at the last polled block, so the next poll's logs
+        carry them forward like every other pool.
+        """
+        async with self._lock:
+            added = []
+            for exchange, pairs in snapshot.pairs.items():
+                if exchange in self.exchanges:
+                    added.extend(self.add_pairs(exchange, pairs))
+            await self.refresh(added, self.block)
+        if added:
+            log.info(f"Following {len(added)} new pools from block {self.block}")
+        return len(added)
+
+    def apply_logs(self, logs: List[Dict]) -> int:
+        """Apply Sync logs in chain order; returns how many were for tracked pools."""
+        applied = 0
+        logs = sorted(logs, key=lambda entry: (int(entry['blockNumber'], 16), int(entry['logIndex'], 16)))
+        for entry in logs:
+            if entry.get('removed'):
+                continue
+            pool = self.pools.get(entry['address'].lower())
+            if pool is None:
+                continue
+            block, log_index = int(entry['blockNumber'], 16), int(entry['logIndex'], 16)
+            if (block, log_index) <= (pool.block, pool.log_index):
+                continue
+            pool.update(*decode_reserves(entry['data']), block, log_index)
+            applied += 1
+        return applied
+
+    async def _find_fork(self) -> Optional[int]:
+        """The last remembered block still on the canonical chain, or None if all were orphaned."""
+        for number in sorted(self.hashes, reverse=True):
+            if await self._block_hash(number) == self.hashes[number]:
+                return number
+        return None
+
+    async def _handle_reorg(self, head: int) -> None:
+        fork = await self._find_fork()
+        if fork is None:
+            log.warning(f"Reorg deeper than {REORG_DEPTH} blocks, re-reading every pool")
+            await self.refresh(list(self.pools), head)
+            self.hashes.clear()
+            self.block = head
+            self._remember(head, await self._block_hash(head))
+            return
+        orphaned = [address for address, pool in self.pools.items() if pool.block > fork]
+        log.warning(f"Reorg back to block {fork}, re-reading {len(orphaned)} pools")
+        await self.refresh(orphaned, fork)
+        for number in [n for n in self.hashes if n > fork]:
+            del self.hashes[number]
+        self.block = fork
+
+    async def poll(self) -> int:
+        """Apply the Sync logs of every block since the last poll; returns the number applied."""
+        async with self._lock:
+            return await self._poll()
+
+    async def _poll(self) -> int:
+        head = await self._head()
+        if head <= self.block:
+            return 0
+        if self.hashes and await self._block_hash(self.block) != self.hashes.get(self.block):
+            await self._handle_reorg(head)
+        # Taken before the logs: if the head is reorganised while they are
+        # fetched, the next poll sees a different hash and replays the fork.
+        head_hash = await self._block_hash(head)
+        applied = 0
+        for start in range(self.block + 1, head + 1, LOG_BLOCK_RANGE):
+            end = min(head, start + LOG_BLOCK_RANGE - 1)
+            # Filtering by topic only: one query covers every pool, and
+            # logs of untracked pairs are dropped locally.
+            logs = await self.rpc.call('eth_getLogs', {
+                'fromBlock': hex(start), 'toBlock': hex(end), 'topics': [SYNC_TOPIC],
+            })
+            applied += self.apply_logs(logs)
+            self.block = end
+        self._remember(head, head_hash)
+        return applied
+
+    async def run(self) -> None:
+        """Poll until cancelled."""
+        while True:
+            try:
+                applied = await self.poll()
+                if applied:
+                    log.debug(f"Applied {applied} Sync events up to block {self.block}")
+            except Exception as e:
+                log.error(f"Error polling Sync events: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def snapshot(self) -> Snapshot:
+        pairs: Dict[str, List[Dict]] = {exchange: [] for exchange in self.exchanges}
+        for pool in self.pools.values():
+            pairs[pool.exchange].append(pool.pair)
+        return Snapshot(pairs)
+
+    async def close(self) -> None:
+        await self.rpc.close()
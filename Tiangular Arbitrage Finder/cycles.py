@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from matrix import RateMatrix
+
+log = logging.getLogger(__name__)
+
+
+def universe_key(matrix: RateMatrix) -> Tuple[str, np.ndarray]:
+    """Fingerprint which tokens share a pool, independently of node numbering.
+
+    Returns the key and the node of every token in address order, which is
+    the numbering cached cycles are stored in.
+    """
+    tokens = np.asarray(matrix.tokens)
+    nodes = np.argsort(tokens, kind='stable')
+    rank = np.empty(len(nodes), dtype=np.int64)
+    rank[nodes] = np.arange(len(nodes))
+    edges = np.sort(rank[matrix.src] * len(nodes) + rank[matrix.dst])
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update('\n'.join(tokens[nodes].tolist()).encode())
+    digest.update(edges.tobytes())
+    return digest.hexdigest(), nodes
+
+
+class CycleCache:
+    """Every candidate cycle of the last token universe, kept across ticks and restarts.
+
+    Pools are listed or delisted far less often than prices move, so cycles
+    are enumerated once per universe change and stored as int32 arrays over
+    tokens in address order. A tick then only remaps them to the current
+    node numbers and scores them. With a path, the arrays are saved there
+    and picked up again by the next process.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.key: Optional[str] = None
+        self.cycles: Dict[int, np.ndarray] = {}
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with np.load(self.path) as data:
+                self.key = str(data['key'])
+                self.cycles = {
+                    int(name[len('cycles_'):]): data[name] for name in data.files if name.startswith('cycles_')
+                }
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f"Ignoring unreadable cycle cache {self.path}: {e}")
+            self.key, self.cycles = None, {}
+
+    def _save(self) -> None:
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, key=np.array(self.key), **{f'cycles_{length}': cycles for length, cycles in self.cycles.items()})
+        os.replace(temporary, self.path)
+
+    def cycles_for(self, graph, matrix: RateMatrix, max_length: int = 3) -> List[np.ndarray]:
+        """The triangles (and 4-cycles when ``max_length >= 4``) of ``graph`` in its node numbers.
+
+        ``matrix`` must be built from ``graph``. Cycles are only enumerated
+        when the universe differs from the cached one.
+        """
+        key, nodes = universe_key(matrix)
+        if key != self.key:
+            self.key, self.cycles = key, {}
+        rank = np.empty(len(nodes), dtype=np.int32)
+        rank[nodes] = np.arange(len(nodes), dtype=np.int32)
+        found = []
+        enumerated = False
+        for length in [3, 4] if max_length >= 4 else [3]:
+            cycles = self.cycles.get(length)
+            if cycles is None:
+                if length == 3:
+                    cycles = matrix.triangles()
+                else:
+                    cycles = np.array(list(graph.quadrilaterals()), dtype=np.intp).reshape(-1, 4)
+                cycles = self.cycles[length] = rank[cycles]
+                enumerated = True
+            found.append(nodes[cycles])
+        if enumerated:
+            log.info(f"Enumerated cycles for a new universe of {len(nodes)} tokens: "
+                     f"{', '.join(f'{len(c)} of length {n}' for n, c in sorted(self.cycles.items()))}")
+            if self.path is not None:
+                self._save()
+        return found
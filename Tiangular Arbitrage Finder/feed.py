@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+HISTORY_SIZE = 10000
+KEEPALIVE_INTERVAL = 15.0
+
+Key = Tuple[str, ...]
+
+
+def opportunity_key(opportunity: Dict) -> Key:
+    """An opportunity is identified by the pools it trades through, in order."""
+    return tuple(opportunity['pairs'])
+
+
+class OpportunityFeed:
+    """Latest scan results plus a sequence-numbered log of what changed between scans.
+
+    Every opportunity that is new or whose fields changed is published as an
+    ``upsert`` event, and every opportunity that disappeared as a ``remove``
+    event. Each event gets the next sequence number. Subscribers get one queue
+    each; the last ``history_size`` events are kept so a reconnecting client
+    can resume from the last sequence number it saw.
+    """
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self.sequence = 0
+        self.scans = 0
+        self.updated: Optional[float] = None
+        self.error: Optional[str] = None
+        self.opportunities: Dict[Key, Dict] = {}
+        self.history: Deque[Dict] = deque(maxlen=history_size)
+        self._subscribers: List[queue.Queue] = []
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'sequence': self.sequence,
+                'updated': self.updated,
+                'scans': self.scans,
+                'error': self.error,
+                'opportunities': list(self.opportunities.values()),
+            }
+
+    def publish(self, opportunities: List[Dict]) -> List[Dict]:
+        """Replace the current result set and broadcast the difference to subscribers."""
+        latest = {opportunity_key(opportunity): opportunity for opportunity in opportunities}
+        with self._lock:
+            events = []
+            for key, opportunity in latest.items():
+                if self.opportunities.get(key) != opportunity:
+                    events.append({'type': 'upsert', 'key': list(key), 'opportunity': opportunity})
+            for key in self.opportunities.keys() - latest.keys():
+                events.append({'type': 'remove', 'key': list(key)})
+            for event in events:
+                self.sequence += 1
+                event['sequence'] = self.sequence
+                self.history.append(event)
+            self.opportunities = latest
+            self.scans += 1
+            self.updated = time.time()
+            self.error = None
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            for event in events:
+                subscriber.put(event)
+        return events
+
+    def fail(self, error: Exception) -> None:
+        """Record a failed scan; the previous result set stays current."""
+        with self._lock:
+            self.error = str(error)
+
+    def subscribe(self, last_sequence: Optional[int] = None) -> queue.Queue:
+        """Register a subscriber queue, pre-filled with the events it missed.
+
+        Without ``last_sequence`` (or when it is older than the history), the
+        queue starts with an upsert for every current opportunity instead.
+        """
+        subscriber: queue.Queue = queue.Queue()
+        with self._lock:
+            oldest = self.history[0]['sequence'] if self.history else self.sequence + 1
+            if last_sequence is not None and last_sequence + 1 >= oldest:
+                backlog = [event for event in self.history if event['sequence'] > last_sequence]
+            else:
+                backlog = [
+                    {'type': 'upsert', 'key': list(key), 'opportunity': opportunity, 'sequence': self.sequence}
+                    for key, opportunity in self.opportunities.items()
+                ]
+            for event in backlog:
+                subscriber.put(event)
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def stream(self, last_sequence: Optional[int] = None, keepalive: float = KEEPALIVE_INTERVAL) -> Iterator[str]:
+        """Yield server-sent events until the client disconnects."""
+        subscriber = self.subscribe(last_sequence)
+        try:
+            while True:
+                try:
+                    event = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"id: {event['sequence']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+class Scanner:
+    """Runs a scan coroutine in a loop on a dedicated thread and publishes each result to a feed.
+
+    ``start`` may be called from any number of request threads at once; only
+    the first starts the scan thread.
+    """
+
+    def __init__(self, feed: OpportunityFeed, scan: Callable[[], Awaitable[List[Dict]]], interval: float):
+        self.feed = feed
+        self.scan = scan
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=asyncio.run, args=(self._run(),), name='arbitrage-scanner',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._lock:
+            self._stop.set()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    async def _run(self) -> None:
+        # One event loop for the scanner's lifetime, so pooled sessions and
+        # schedulers are reused across scans.
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                events = self.feed.publish(await self.scan())
+                log.info(f"Scan finished in {time.monotonic() - started:.1f}s, {len(events)} changes")
+            except Exception as e:
+                log.error(f"Scan failed: {e}")
+                self.feed.fail(e)
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
@@ -0,0 +1,245 @@
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from cycles import CycleCache
+from matrix import RateMatrix
+
+Cycle = Tuple[int, ...]
+
+
+@dataclass
+class Edge:
+    exchange: str
+    pair_id: str
+    rate: float
+    weight: float
+    reserve_in: float = 0.0
+    reserve_out: float = 0.0
+
+
+class TokenGraph:
+    """Directed token graph with -log(rate) edge weights.
+
+    Nodes are tokens keyed by address, so two tokens sharing a symbol never
+    collide. Each directed edge keeps the best rate seen across all exchanges,
+    which makes a profitable cycle exactly a negative-weight cycle.
+    """
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.symbols: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.succ: List[Dict[int, Edge]] = []
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    @property
+    def edge_count(self) -> int:
+        return sum(len(edges) for edges in self.succ)
+
+    def add_token(self, address: str, symbol: str) -> int:
+        node = self.index.get(address)
+        if node is None:
+            node = len(self.tokens)
+            self.index[address] = node
+            self.tokens.append(address)
+            self.symbols.append(symbol)
+            self.succ.append({})
+        return node
+
+    def add_rate(self, exchange: str, pair_id: str, src: int, dst: int, rate: float,
+                 reserve_in: float = 0.0, reserve_out: float = 0.0) -> None:
+        if rate <= 0 or src == dst:
+            return
+        edge = self.succ[src].get(dst)
+        if edge is None or rate > edge.rate:
+            self.succ[src][dst] = Edge(exchange, pair_id, rate, -math.log(rate), reserve_in, reserve_out)
+
+    def add_pair(self, exchange: str, pair: Dict) -> None:
+        """Add both directions of a subgraph pair.
+
+        ``token1Price`` is token1 received per token0 and ``token0Price`` is
+        token0 received per token1, as reported by the Uniswap-V2 style schemas.
+        """
+        token0 = self.add_token(pair['token0']['id'], pair['token0']['symbol'])
+        token1 = self.add_token(pair['token1']['id'], pair['token1']['symbol'])
+        reserve0 = float(pair.get('reserve0') or 0.0)
+        reserve1 = float(pair.get('reserve1') or 0.0)
+        self.add_rate(exchange, pair['id'], token0, token1, float(pair['token1Price']), reserve0, reserve1)
+        self.add_rate(exchange, pair['id'], token1, token0, float(pair['token0Price']), reserve1, reserve0)
+
+    def add_pairs(self, exchange: str, pairs: Iterable[Dict]) -> None:
+        for pair in pairs:
+            self.add_pair(exchange, pair)
+
+    def cycle_edges(self, cycle: Cycle) -> List[Edge]:
+        return [self.succ[cycle[i]][cycle[(i + 1) % len(cycle)]] for i in range(len(cycle))]
+
+    def cycle_rate(self, cycle: Cycle) -> float:
+        return math.exp(-sum(edge.weight for edge in self.cycle_edges(cycle)))
+
+    def triangles(self) -> Iterator[Cycle]:
+        """Yield every directed 3-cycle once, rooted at its smallest node."""
+        succ = self.succ
+        for a, out_a in enumerate(succ):
+            for b in out_a:
+                if b < a:
+                    continue
+                for c in succ[b]:
+                    if c > a and a in succ[c]:
+                        yield (a, b, c)
+
+    def quadrilaterals(self) -> Iterator[Cycle]:
+        """Yield every simple directed 4-cycle once, rooted at its smallest node."""
+        succ = self.succ
+        for a, out_a in enumerate(succ):
+            for b in out_a:
+                if b < a:
+                    continue
+                for c in succ[b]:
+                    if c <= a:
+                        continue
+                    for d in succ[c]:
+                        if d > a and d != b and a in succ[d]:
+                            yield (a, b, c, d)
+
+    def cycles(self, max_length: int = 3) -> Iterator[Cycle]:
+        yield from self.triangles()
+        if max_length >= 4:
+            yield from self.quadrilaterals()
+
+    def negative_cycles(self, max_length: Optional[int] = None) -> List[Cycle]:
+        """Find negative cycles with a queue-based Bellman-Ford (SPFA).
+
+        Every node starts at distance 0, which is equivalent to a virtual source
+        connected to all of them. The predecessor graph is checked for cycles
+        after every ``len(self)`` relaxations; each cycle found there is
+        negative, is recorded once (rooted at its smallest node) and has its
+        closing edge disabled so the search terminates.
+        """
+        size = len(self)
+        dist = [0.0] * size
+        pred = [-1] * size
+        queue = deque(range(size))
+        queued = [True] * size
+        disabled = set()
+        found: Dict[Cycle, None] = {}
+        relaxations = 0
+        budget = size * max(self.edge_count, 1)
+        while queue and budget > 0:
+            u = queue.popleft()
+            queued[u] = False
+            for v, edge in self.succ[u].items():
+                if (u, v) in disabled:
+                    continue
+                candidate = dist[u] + edge.weight
+                if candidate < dist[v] - 1e-12:
+                    dist[v] = candidate
+                    pred[v] = u
+                    relaxations += 1
+                    if not queued[v]:
+                        queued[v] = True
+                        queue.append(v)
+            if relaxations >= size or not queue:
+                budget -= relaxations
+                relaxations = 0
+                for cycle in self._predecessor_cycles(pred):
+                    found.setdefault(cycle)
+                    disabled.add((cycle[-1], cycle[0]))
+                    for node in cycle:
+                        pred[node] = -1
+        return [cycle for cycle in found if max_length is None or len(cycle) <= max_length]
+
+    @staticmethod
+    def _predecessor_cycles(pred: List[int]) -> List[Cycle]:
+        cycles = []
+        seen = [-1] * len(pred)
+        for start in range(len(pred)):
+            node = start
+            while node >= 0 and seen[node] < 0:
+                seen[node] = start
+                node = pred[node]
+            if node < 0 or seen[node] != start:
+                continue
+            cycle = [node]
+            walk = pred[node]
+            while walk != node:
+                cycle.append(walk)
+                walk = pred[walk]
+            # pred points backwards, so reverse to get the trading direction.
+            cycle.reverse()
+            root = cycle.index(min(cycle))
+            cycles.append(tuple(cycle[root:] + cycle[:root]))
+        return cycles
+
+    def find_opportunities(self, profit_threshold: float, max_length: int = 3, method: str = 'enumerate',
+                           cycle_cache: Optional[CycleCache] = None) -> List[Tuple[Cycle, float]]:
+        """Return ``(cycle, profit_percentage)`` for every cycle above the threshold.
+
+        ``method='enumerate'`` scores every 3-cycle (and 4-cycle when
+        ``max_length >= 4``) in Python, ``method='matrix'`` scores the same
+        cycles with NumPy broadcasts over a RateMatrix, and
+        ``method='bellman_ford'`` only reports the negative cycles SPFA happens
+        to surface, which scales better on dense graphs. With a ``cycle_cache``
+        the matrix method scores the cached cycles instead of enumerating.
+        """
+        if method == 'matrix':
+            return self._matrix_opportunities(profit_threshold, max_length, cycle_cache)
+        if method == 'enumerate':
+            candidates: Iterable[Cycle] = self.cycles(max_length)
+        elif method == 'bellman_ford':
+            candidates = self.negative_cycles(max_length)
+        else:
+            raise ValueError(f"Unsupported cycle search method: {method}")
+
+        limit = -math.log1p(profit_threshold)
+        opportunities = []
+        for cycle in candidates:
+            weight = sum(edge.weight for edge in self.cycle_edges(cycle))
+            if weight < limit:
+                opportunities.append((cycle, math.expm1(-weight)))
+        opportunities.sort(key=lambda item: item[1], reverse=True)
+        return opportunities
+
+    def _matrix_opportunities(self, profit_threshold: float, max_length: int,
+                              cycle_cache: Optional[CycleCache] = None) -> List[Tuple[Cycle, float]]:
+        matrix = RateMatrix.from_graph(self)
+        if cycle_cache is not None:
+            opportunities = []
+            for cycles in cycle_cache.cycles_for(self, matrix, max_length):
+                profits = matrix.cycle_profits(cycles)
+                keep = profits > profit_threshold
+                opportunities.extend(zip(map(tuple, cycles[keep].tolist()), profits[keep].tolist()))
+            opportunities.sort(key=lambda item: item[1], reverse=True)
+            return opportunities
+        cycles, profits = matrix.triangle_profits(profit_threshold)
+        opportunities = list(zip(map(tuple, cycles.tolist()), profits.tolist()))
+        if max_length >= 4:
+            quads = np.array(list(self.quadrilaterals()), dtype=np.intp).reshape(-1, 4)
+            quad_profits = matrix.cycle_profits(quads)
+            keep = quad_profits > profit_threshold
+            opportunities.extend(zip(map(tuple, quads[keep].tolist()), quad_profits[keep].tolist()))
+        opportunities.sort(key=lambda item: item[1], reverse=True)
+        return opportunities
+
+    def describe_cycle(self, cycle: Cycle, profit_percentage: float, quote_asset_amount: float) -> Dict:
+        # Node numbers follow the order pages arrived in, so start the cycle at
+        # its lowest token address to report it the same way every tick.
+        start = min(range(len(cycle)), key=lambda i: self.tokens[cycle[i]])
+        cycle = cycle[start:] + cycle[:start]
+        edges = self.cycle_edges(cycle)
+        return {
+            'path': ' -> '.join(self.symbols[node] for node in cycle + cycle[:1]),
+            'tokens': [self.tokens[node] for node in cycle],
+            'exchanges': [edge.exchange for edge in edges],
+            'pairs': [edge.pair_id for edge in edges],
+            'rates': [edge.rate for edge in edges],
+            'cycle_length': len(cycle),
+            'quote_asset_amount': quote_asset_amount,
+            'profit_percentage': profit_percentage,
+        }
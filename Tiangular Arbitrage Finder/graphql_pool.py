@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+from aiohttp import TCPConnector
+from gql import Client
+from gql.client import AsyncClientSession
+from gql.transport.aiohttp import AIOHTTPTransport
+
+log = logging.getLogger(__name__)
+
+SCHEMA_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_cache')
+CONNECTION_LIMIT = 100
+KEEPALIVE_TIMEOUT = 60
+EXECUTE_TIMEOUT = 30
+
+
+class GraphQLClientPool:
+    """Long-lived GraphQL sessions, one per subgraph endpoint.
+
+    All transports share a single keep-alive TCPConnector, so TCP/TLS
+    connections are reused across queries and endpoints. Each endpoint's
+    introspection result is fetched once and cached on disk; later starts
+    build the schema from that file and skip introspection entirely.
+    """
+
+    def __init__(self, urls: Dict[str, str], schema_dir: str = SCHEMA_CACHE_DIR):
+        self.urls = urls
+        self.schema_dir = schema_dir
+        self._connector: Optional[TCPConnector] = None
+        self._clients: Dict[str, Client] = {}
+        self._sessions: Dict[str, AsyncClientSession] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _schema_path(self, name: str) -> str:
+        return os.path.join(self.schema_dir, f"{name}.json")
+
+    def _load_introspection(self, name: str) -> Optional[Dict]:
+        try:
+            with open(self._schema_path(name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning(f"Ignoring unreadable schema cache for {name}: {e}")
+            return None
+
+    def _save_introspection(self, name: str, introspection: Dict) -> None:
+        os.makedirs(self.schema_dir, exist_ok=True)
+        path = self._schema_path(name)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(introspection, f)
+        os.replace(path + '.tmp', path)
+
+    async def _connect(self, name: str) -> AsyncClientSession:
+        transport = AIOHTTPTransport(
+            url=self.urls[name],
+            client_session_args={'connector': self._connector, 'connector_owner': False},
+        )
+        introspection = self._load_introspection(name)
+        client = Client(
+            transport=transport,
+            introspection=introspection,
+            fetch_schema_from_transport=introspection is None,
+            execute_timeout=EXECUTE_TIMEOUT,
+        )
+        session = await client.connect_async(reconnecting=False)
+        if introspection is None and client.introspection is not None:
+            self._save_introspection(name, client.introspection)
+        self._clients[name] = client
+        return session
+
+    async def get(self, name: str) -> AsyncClientSession:
+        """Return the connected session for an endpoint, connecting on first use.
+
+        Sessions are bound to the event loop that created them; if called from
+        a different loop the pool is rebuilt there.
+        """
+        if name not in self.urls:
+            raise ValueError('Unsupported exchange')
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._reset(loop)
+        session = self._sessions.get(name)
+        if session is not None:
+            return session
+        async with self._lock:
+            if name not in self._sessions:
+                if self._connector is None:
+                    self._connector = TCPConnector(
+                        ssl=False, limit=CONNECTION_LIMIT, keepalive_timeout=KEEPALIVE_TIMEOUT, ttl_dns_cache=300
+                    )
+                self._sessions[name] = await self._connect(name)
+        return self._sessions[name]
+
+    async def connect_all(self) -> Dict[str, AsyncClientSession]:
+        """Connect every endpoint concurrently and return the sessions that are up."""
+        names = list(self.urls)
+        results = await asyncio.gather(*(self.get(name) for name in names), return_exceptions=True)
+        sessions = {}
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                log.error(f"Error connecting to {name}: {result}")
+                continue
+            sessions[name] = result
+        return sessions
+
+    def _reset(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Objects bound to a previous (likely closed) loop cannot be awaited here.
+        self._connector = None
+        self._clients = {}
+        self._sessions = {}
+        self._loop = loop
+        self._lock = asyncio.Lock()
+
+    async def close(self) -> None:
+        for client in self._clients.values():
+            await client.close_async()
+        if self._connector is not None:
+            await self._connector.close()
+        self._connector = None
+        self._clients = {}
+        self._sessions = {}
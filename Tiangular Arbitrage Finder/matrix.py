@@ -0,0 +1,123 @@
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+MAX_PATHS = 1 << 22
+
+
+class RateMatrix:
+    """Sparse (CSR) rate matrix over the tokens of a TokenGraph.
+
+    Row ``a`` holds the best rate for swapping token ``a`` into every token it
+    has a pool with, so the growth of a cycle a -> b -> c -> a is
+    ``R[a, b] * R[b, c] * R[c, a]``. A dense n x n array would need gigabytes
+    for a full subgraph universe, so entries are kept sorted by the flat key
+    ``a * n + b`` and looked up with ``np.searchsorted``.
+    """
+
+    def __init__(self, tokens: List[str], src: np.ndarray, dst: np.ndarray, rates: np.ndarray):
+        size = len(tokens)
+        keys = src.astype(np.int64) * size + dst
+        order = np.argsort(keys, kind='stable')
+        self.tokens = tokens
+        self.index: Dict[str, int] = {token: i for i, token in enumerate(tokens)}
+        self.keys = keys[order]
+        self.src = src[order]
+        self.dst = dst[order]
+        self.rates = rates[order]
+        self.indptr = np.searchsorted(self.src, np.arange(size + 1))
+
+    @classmethod
+    def from_graph(cls, graph) -> 'RateMatrix':
+        count = graph.edge_count
+        src = np.empty(count, dtype=np.intp)
+        dst = np.empty(count, dtype=np.intp)
+        rates = np.empty(count, dtype=np.float64)
+        position = 0
+        for node, edges in enumerate(graph.succ):
+            end = position + len(edges)
+            src[position:end] = node
+            dst[position:end] = list(edges.keys())
+            rates[position:end] = [edge.rate for edge in edges.values()]
+            position = end
+        return cls(list(graph.tokens), src, dst, rates)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def lookup(self, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """Vectorized ``R[src, dst]``, 0.0 where the two tokens share no pool."""
+        keys = np.asarray(src, dtype=np.int64) * len(self) + dst
+        position = np.searchsorted(self.keys, keys)
+        position[position == len(self.keys)] = 0
+        found = self.keys[position] == keys
+        return np.where(found, self.rates[position], 0.0)
+
+    def dense(self) -> np.ndarray:
+        rates = np.zeros((len(self), len(self)), dtype=np.float64)
+        rates[self.src, self.dst] = self.rates
+        return rates
+
+    def _two_leg_paths(self, max_paths: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield ``(first, second, a, c)`` chunks of two-leg paths a -> b -> c with b > a and c > a.
+
+        Each edge a -> b (with b > a) is expanded into all two-leg paths
+        through b's CSR row, in chunks of at most ``max_paths`` paths.
+        ``first`` and ``second`` are the entry positions of the two legs.
+        """
+        forward = np.flatnonzero(self.dst > self.src)
+        fanout = np.diff(self.indptr)[self.dst[forward]]
+        cumulative = np.cumsum(fanout)
+        start = 0
+        while start < len(forward):
+            done = cumulative[start] - fanout[start]
+            stop = max(int(np.searchsorted(cumulative, done + max_paths, side='right')), start + 1)
+            edges = forward[start:stop]
+            counts = fanout[start:stop]
+            start = stop
+            total = int(counts.sum())
+            if not total:
+                continue
+            offsets = np.repeat(np.cumsum(counts) - counts, counts)
+            second = np.repeat(self.indptr[self.dst[edges]], counts) + np.arange(total) - offsets
+            first = np.repeat(edges, counts)
+            a = self.src[first]
+            c = self.dst[second]
+            valid = c > a
+            yield first[valid], second[valid], a[valid], c[valid]
+
+    def triangles(self, max_paths: int = MAX_PATHS) -> np.ndarray:
+        """Every directed triangle as an ``(m, 3)`` array rooted at its smallest token index."""
+        cycles = [np.empty((0, 3), dtype=np.intp)]
+        for first, second, a, c in self._two_leg_paths(max_paths):
+            closed = self.lookup(c, a) > 0
+            cycles.append(np.stack([a[closed], self.dst[first[closed]], c[closed]], axis=1))
+        return np.concatenate(cycles)
+
+    def triangle_profits(self, profit_threshold: float, max_paths: int = MAX_PATHS) -> Tuple[np.ndarray, np.ndarray]:
+        """Score every directed triangle and keep those above the threshold.
+
+        The closing leg c -> a of every two-leg path is looked up for all of
+        them at once, and a threshold mask picks the winners. Returns
+        ``(cycles, profits)`` with ``cycles`` an ``(m, 3)`` array rooted at its
+        smallest token index.
+        """
+        limit = 1.0 + profit_threshold
+        cycles: List[np.ndarray] = []
+        profits: List[np.ndarray] = []
+        for first, second, a, c in self._two_leg_paths(max_paths):
+            growth = self.rates[first] * self.rates[second] * self.lookup(c, a)
+            hit = growth > limit
+            if hit.any():
+                cycles.append(np.stack([a[hit], self.dst[first[hit]], c[hit]], axis=1))
+                profits.append(growth[hit] - 1.0)
+        if not cycles:
+            return np.empty((0, 3), dtype=np.intp), np.empty(0, dtype=np.float64)
+        return np.concatenate(cycles), np.concatenate(profits)
+
+    def cycle_profits(self, cycles: np.ndarray) -> np.ndarray:
+        """Score an ``(m, k)`` array of cycles in one vectorized pass."""
+        growth = np.ones(len(cycles), dtype=np.float64)
+        for leg in range(cycles.shape[1]):
+            growth *= self.lookup(cycles[:, leg], cycles[:, (leg + 1) % cycles.shape[1]])
+        return growth - 1.0
@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from graphql import build_schema, graphql, introspection_from_schema
+
+log = logging.getLogger(__name__)
+
+# The subset of the Uniswap-V2 style subgraph schema the scanner queries.
+SUBGRAPH_SCHEMA = build_schema("""
+type Token {
+  id: ID!
+  symbol: String!
+  decimals: String!
+}
+
+type Pair {
+  id: ID!
+  token0: Token!
+  token1: Token!
+  reserve0: String!
+  reserve1: String!
+  token0Price: String!
+  token1Price: String!
+}
+
+input Pair_filter {
+  id_gt: String
+  id_lt: String
+  token0: String
+  token1: String
+}
+
+enum Pair_orderBy {
+  id
+}
+
+enum OrderDirection {
+  asc
+  desc
+}
+
+type Query {
+  pairs(first: Int = 100, where: Pair_filter, orderBy: Pair_orderBy, orderDirection: OrderDirection): [Pair!]!
+}
+""")
+
+
+class Cassette:
+    """Recorded upstream state, saved as gzipped JSON.
+
+    Subgraph pairs are stored as one table per endpoint rather than as the
+    individual page responses, so a replay answers any paging or sharding
+    of the query, not only the exact requests that were recorded.
+    """
+
+    def __init__(self, pairs: Optional[Dict[str, List[Dict]]] = None):
+        self.pairs: Dict[str, List[Dict]] = pairs or {}
+
+    def add_pairs(self, endpoint: str, pairs: List[Dict]) -> None:
+        table = {pair['id']: pair for pair in self.pairs.get(endpoint, [])}
+        table.update((pair['id'], pair) for pair in pairs)
+        self.pairs[endpoint] = sorted(table.values(), key=lambda pair: pair['id'])
+
+    def save(self, path: str) -> None:
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump({'pairs': self.pairs}, f)
+
+    @classmethod
+    def load(cls, path: str) -> 'Cassette':
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('pairs'))
+
+
+class RecordingSession:
+    """Wraps a gql session and copies every pair it returns into a cassette."""
+
+    def __init__(self, session, cassette: Cassette, endpoint: str):
+        self.session = session
+        self.cassette = cassette
+        self.endpoint = endpoint
+
+    async def execute(self, document, *args, **kwargs):
+        result = await self.session.execute(document, *args, **kwargs)
+        if isinstance(result, dict) and result.get('pairs'):
+            self.cassette.add_pairs(self.endpoint, result['pairs'])
+        return result
+
+
+class PairTable(list):
+    """Pairs sorted by id, with the id column kept for range lookups."""
+
+    def __init__(self, pairs: List[Dict]):
+        super().__init__(sorted(pairs, key=lambda pair: pair['id']))
+        self.ids = [pair['id'] for pair in self]
+
+
+def resolve_pairs(table: PairTable, first: int = 100, where: Optional[Dict] = None,
+                  orderBy: Optional[str] = None, orderDirection: Optional[str] = None) -> List[Dict]:
+    """Answer a ``pairs`` query; id range filters are two binary searches on the sorted table."""
+    where = where or {}
+    lo = bisect_right(table.ids, where['id_gt']) if 'id_gt' in where else 0
+    hi = bisect_left(table.ids, where['id_lt']) if 'id_lt' in where else len(table)
+    pairs = table[lo:hi]
+    if 'token0' in where:
+        pairs = [pair for pair in pairs if pair['token0']['id'] == where['token0']]
+    if 'token1' in where:
+        pairs = [pair for pair in pairs if pair['token1']['id'] == where['token1']]
+    if orderDirection == 'desc':
+        pairs = pairs[::-1]
+    return pairs[:first]
+
+
+class ReplayServer:
+    """Local stand-in for the subgraph APIs, served from a cassette.
+
+    Subgraph endpoints are ``POST /subgraphs/<endpoint>`` and are executed
+    against ``SUBGRAPH_SCHEMA``, so introspection and validation behave as
+    upstream. Every request waits ``latency`` (plus up to ``jitter``) seconds and is answered with
+    HTTP 429 with probability ``throttle_rate``.
+    """
+
+    def __init__(self, cassette: Cassette, latency: float = 0.0, jitter: float = 0.0,
+                 throttle_rate: float = 0.0, seed: Optional[int] = None):
+        self.cassette = cassette
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.throttled = 0
+        self._tables = {endpoint: PairTable(pairs) for endpoint, pairs in cassette.pairs.items()}
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+        self.app = web.Application()
+        self.app.router.add_post('/subgraphs/{endpoint}', self.handle_graphql)
+
+    def endpoint_url(self, endpoint: str) -> str:
+        return f"{self.url}/subgraphs/{endpoint}"
+
+    def reset_counters(self) -> None:
+        self.requests = 0
+        self.throttled = 0
+
+    async def _delay(self) -> bool:
+        """Apply the configured latency; True if this request should be throttled."""
+        self.requests += 1
+        delay = self.latency + self.jitter * self.random.random()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            self.throttled += 1
+            return True
+        return False
+
+    async def handle_graphql(self, request: web.Request) -> web.Response:
+        if await self._delay():
+            # Rate-limiting gateways answer before GraphQL runs, with a plain-text body.
+            return web.Response(status=429, text='Too Many Requests')
+        endpoint = request.match_info['endpoint']
+        if endpoint not in self._tables:
+            return web.json_response({'errors': [{'message': f'Unknown endpoint {endpoint}'}]}, status=404)
+        payload = await request.json()
+        table = self._tables[endpoint]
+        root = {'pairs': lambda info, **args: resolve_pairs(table, **args)}
+        result = await graphql(SUBGRAPH_SCHEMA, payload['query'], root_value=root,
+                               variable_values=payload.get('variables'), operation_name=payload.get('operationName'))
+        response: Dict[str, Any] = {'data': result.data}
+        if result.errors:
+            response['errors'] = [{'message': error.message} for error in result.errors]
+        return web.json_response(response)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+        self._runner = None
+
+
+def write_introspection(schema_dir: str, endpoints: List[str]) -> None:
+    """Seed a schema cache directory so clients skip introspection against the replay server."""
+    os.makedirs(schema_dir, exist_ok=True)
+    introspection = introspection_from_schema(SUBGRAPH_SCHEMA)
+    for endpoint in endpoints:
+        with open(os.path.join(schema_dir, f"{endpoint}.json"), 'w') as f:
+            json.dump(introspection, f)
+
+
+def synthetic_pairs(count: int, tokens: int, seed: int = 0, mispricing: float = 0.02) -> List[Dict]:
+    """Generate ``count`` pairs over ``tokens`` tokens.
+
+    Every token has a hidden reference price; each pool prices its tokens at
+    that ratio with up to ``mispricing`` relative noise, so some cycles are
+    profitable. Reserves are drawn so pool depth varies over two orders of
+    magnitude.
+    """
+    rng = random.Random(seed)
+    token_ids = [f"0x{rng.getrandbits(160):040x}" for _ in range(tokens)]
+    prices = [10 ** rng.uniform(-2, 3) for _ in range(tokens)]
+    pairs = []
+    seen = set()
+    while len(pairs) < count:
+        i, j = rng.sample(range(tokens), 2)
+        if (i, j) in seen or (j, i) in seen:
+            if len(seen) >= tokens * (tokens - 1) // 2:
+                break
+            continue
+        seen.add((i, j))
+        # token1 per token0 at the reference prices, then mispriced.
+        price = prices[i] / prices[j] * (1 + rng.uniform(-mispricing, mispricing))
+        reserve0 = 10 ** rng.uniform(3, 5) / prices[i]
+        reserve1 = reserve0 * price
+        pairs.append({
+            'id': f"0x{rng.getrandbits(160):040x}",
+            'token0': {'id': token_ids[i], 'symbol': f"T{i}", 'decimals': '18'},
+            'token1': {'id': token_ids[j], 'symbol': f"T{j}", 'decimals': '18'},
+            'reserve0': repr(reserve0),
+            'reserve1': repr(reserve1),
+            'token0Price': repr(reserve0 / reserve1),
+            'token1Price': repr(reserve1 / reserve0),
+        })
+    return pairs
+
+
+async def record(urls: Dict[str, str], path: str, max_pairs: Optional[int] = None) -> Cassette:
+    """Snapshot every subgraph's pairs into a cassette file."""
+    from graphql_pool import GraphQLClientPool
+    from snapshot import fetch_pairs
+
+    cassette = Cassette()
+    pool = GraphQLClientPool(urls)
+    try:
+        sessions = await pool.connect_all()
+        await asyncio.gather(*(
+            fetch_pairs(RecordingSession(session, cassette, endpoint), max_pairs=max_pairs)
+            for endpoint, session in sessions.items()
+        ))
+    finally:
+        await pool.close()
+    cassette.save(path)
+    return cassette
+
+
+async def serve(path: str, port: int, latency: float, jitter: float, throttle_rate: float) -> None:
+    server = ReplayServer(Cassette.load(path), latency, jitter, throttle_rate)
+    await server.start(port=port)
+    for endpoint in server.cassette.pairs:
+        log.info(f"Serving {endpoint} at {server.endpoint_url(endpoint)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    from ArbFinder import EXCHANGE_APIS, SNAPSHOT_MAX_PAIRS
+
+    parser = argparse.ArgumentParser(description='Record or replay subgraph responses.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record')
+    record_parser.add_argument('path')
+    record_parser.add_argument('--max-pairs', type=int, default=SNAPSHOT_MAX_PAIRS)
+    serve_parser = commands.add_parser('serve')
+    serve_parser.add_argument('path')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--latency', type=float, default=0.0)
+    serve_parser.add_argument('--jitter', type=float, default=0.0)
+    serve_parser.add_argument('--throttle-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'record':
+        asyncio.run(record(EXCHANGE_APIS, args.path, args.max_pairs))
+    else:
+        asyncio.run(serve(args.path, args.port, args.latency, args.jitter, args.throttle_rate))
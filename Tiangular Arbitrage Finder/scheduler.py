@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Allow ``rate`` requests per second on average with bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def pause(self, delay: float) -> None:
+        """Hold back every request through this bucket for at least ``delay`` seconds."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - delay * self.rate
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts with additive increase / multiplicative decrease.
+
+    Each fast, successful request grows the limit by ``1 / limit`` (about one
+    slot per round of requests); a throttled request halves it, and a request
+    slower than ``target_latency`` trims it by 10%.
+    """
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64, target_latency: float = 2.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float, throttled: bool = False) -> None:
+        if throttled:
+            self.limit = max(self.min_limit, self.limit / 2)
+        elif latency > self.target_latency:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+
+def is_throttled(error: Exception) -> bool:
+    """True for HTTP 429 responses, as raised by the gql aiohttp transport."""
+    return getattr(error, 'code', None) == 429 or getattr(error, 'status', None) == 429
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds a 429 response asked to wait in its Retry-After header, if any.
+
+    The gql transport raises a TransportServerError from aiohttp's
+    ClientResponseError, which carries the response headers.
+    """
+    for candidate in (error, error.__cause__):
+        headers = getattr(candidate, 'headers', None)
+        value = headers.get('Retry-After') if headers else None
+        if value is not None:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                # An HTTP date; fall back to exponential backoff.
+                return None
+    return None
+
+
+class ExchangeScheduler:
+    """Per-exchange request scheduler: token bucket, adaptive concurrency and 429 retries."""
+
+    def __init__(self, rate: float = 10.0, burst: int = 20, initial: int = 8, max_concurrency: int = 64,
+                 target_latency: float = 2.0, max_retries: int = 4, backoff: float = 0.5):
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(initial, 1, max_concurrency, target_latency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.requests = 0
+        self.throttled = 0
+
+    async def run(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``call`` once a rate token and a concurrency slot are free, retrying on 429.
+
+        A retry waits as long as the response's Retry-After header asks, or
+        with jittered exponential backoff when there is none.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            await self.limiter.acquire()
+            started = time.monotonic()
+            throttled = False
+            try:
+                self.requests += 1
+                return await call()
+            except Exception as e:
+                throttled = is_throttled(e)
+                if throttled:
+                    self.throttled += 1
+                if not throttled or attempt == self.max_retries:
+                    raise
+                delay = retry_after(e)
+            finally:
+                await self.limiter.release(time.monotonic() - started, throttled)
+            if delay is None:
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+            # Every request to the exchange backs off, not just this retry.
+            self.bucket.pause(delay)
+            log.warning(f"Throttled, retrying in {delay:.2f}s (concurrency limit {self.limiter.limit:.1f})")
+            await asyncio.sleep(delay)
@@ -0,0 +1,110 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+DEFAULT_FEE = 0.003
+
+# Swap fees charged on the input amount of each constant-product pool.
+EXCHANGE_FEES = {
+    'uniswap': 0.003,
+    'sushiswap': 0.003,
+    'pancakeswap': 0.0025,
+}
+
+
+def cycle_reserves(graph, cycles: np.ndarray, fees: Dict[str, float] = EXCHANGE_FEES) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Gather ``(reserve_in, reserve_out, fee)`` arrays of shape ``(m, k)`` for each leg of each cycle."""
+    m, k = cycles.shape
+    reserve_in = np.zeros((m, k), dtype=np.float64)
+    reserve_out = np.zeros((m, k), dtype=np.float64)
+    fee = np.zeros((m, k), dtype=np.float64)
+    succ = graph.succ
+    for row, cycle in enumerate(cycles.tolist()):
+        for leg in range(k):
+            edge = succ[cycle[leg]][cycle[(leg + 1) % k]]
+            reserve_in[row, leg] = edge.reserve_in
+            reserve_out[row, leg] = edge.reserve_out
+            fee[row, leg] = fees.get(edge.exchange, DEFAULT_FEE)
+    return reserve_in, reserve_out, fee
+
+
+def compose(reserve_in: np.ndarray, reserve_out: np.ndarray, fee: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Collapse each cycle's legs into one ``out = a * x / (b + c * x)`` curve.
+
+    A single x*y=k pool with input fee f pays ``g * R_out * x / (R_in + g * x)``
+    with ``g = 1 - f``, i.e. ``(a, b, c) = (g * R_out, R_in, g)``. Feeding one
+    such curve into another gives another of the same form:
+    ``(a1 * a2, b1 * b2, b2 * c1 + a1 * c2)``.
+    """
+    gamma = 1.0 - fee
+    a = gamma[:, 0] * reserve_out[:, 0]
+    b = reserve_in[:, 0].copy()
+    c = gamma[:, 0].copy()
+    for leg in range(1, reserve_in.shape[1]):
+        leg_a = gamma[:, leg] * reserve_out[:, leg]
+        leg_b = reserve_in[:, leg]
+        c = leg_b * c + a * gamma[:, leg]
+        a = a * leg_a
+        b = b * leg_b
+    return a, b, c
+
+
+def optimal_input(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """Input maximizing ``a * x / (b + c * x) - x``; 0 where no size is profitable.
+
+    Setting the derivative ``a * b / (b + c * x) ** 2 - 1`` to zero gives
+    ``x = (sqrt(a * b) - b) / c``, which is positive exactly when the marginal
+    rate ``a / b`` exceeds 1.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        size = (np.sqrt(a * b) - b) / c
+    return np.where((a > b) & (b > 0) & (c > 0), size, 0.0)
+
+
+def simulate(reserve_in: np.ndarray, reserve_out: np.ndarray, fee: np.ndarray, amount_in: np.ndarray) -> np.ndarray:
+    """Swap ``amount_in`` through every leg of every cycle, one pool at a time."""
+    amount = np.asarray(amount_in, dtype=np.float64)
+    for leg in range(reserve_in.shape[1]):
+        effective = amount * (1.0 - fee[:, leg])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            amount = np.where(
+                reserve_in[:, leg] > 0,
+                reserve_out[:, leg] * effective / (reserve_in[:, leg] + effective),
+                0.0,
+            )
+    return amount
+
+
+def size_cycles(graph, cycles: List[Tuple[int, ...]], profit_threshold: float, fees: Dict[str, float] = EXCHANGE_FEES) -> List[Dict]:
+    """Size every candidate cycle and keep those that stay profitable after fees and price impact.
+
+    A cycle is kept when the profit realised at its optimal size, as a fraction
+    of that size, beats ``profit_threshold``; the marginal rate only holds for
+    an infinitesimal trade and overstates it.
+    Cycles are grouped by length so each group is evaluated in one vectorized pass.
+    """
+    sized = []
+    by_length: Dict[int, List[Tuple[int, ...]]] = {}
+    for cycle in cycles:
+        by_length.setdefault(len(cycle), []).append(cycle)
+    for group in by_length.values():
+        indices = np.array(group, dtype=np.intp)
+        reserve_in, reserve_out, fee = cycle_reserves(graph, indices, fees)
+        a, b, c = compose(reserve_in, reserve_out, fee)
+        amount_in = optimal_input(a, b, c)
+        amount_out = simulate(reserve_in, reserve_out, fee, amount_in)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            marginal = np.where(b > 0, a / b, 0.0)
+            realised = np.where(amount_in > 0, (amount_out - amount_in) / amount_in, 0.0)
+        keep = (amount_in > 0) & (realised > profit_threshold)
+        for row in np.flatnonzero(keep).tolist():
+            sized.append({
+                'cycle': group[row],
+                'marginal_rate': float(marginal[row]),
+                'optimal_input': float(amount_in[row]),
+                'expected_output': float(amount_out[row]),
+                'expected_profit': float(amount_out[row] - amount_in[row]),
+                'profit_percentage': float(realised[row]),
+            })
+    sized.sort(key=lambda item: item['profit_percentage'], reverse=True)
+    return sized
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from gql import GraphQLRequest, gql
+from gql.client import AsyncClientSession
+
+from scheduler import ExchangeScheduler
+
+log = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+PageCallback = Callable[[List[Dict]], None]
+# Pair ids are lowercase hex addresses, so the first hex digit splits the
+# id space into 16 ranges that can be cursor-paged independently.
+SHARD_BOUNDS = [''] + ['0x' + digit for digit in '123456789abcdef'] + ['0xg']
+
+PAIRS_PAGE_QUERY = gql("""
+query PairsPage($first: Int!, $lastId: String!, $upperId: String!) {
+  pairs(first: $first, where: {id_gt: $lastId, id_lt: $upperId}, orderBy: id, orderDirection: asc) {
+    id
+    token0 {
+      id
+      symbol
+      decimals
+    }
+    token1 {
+      id
+      symbol
+      decimals
+    }
+    reserve0
+    reserve1
+    token0Price
+    token1Price
+  }
+}
+""")
+
+
+async def fetch_pair_range(session: AsyncClientSession, lower: str, upper: str, page_size: int = PAGE_SIZE,
+                           max_pairs: Optional[int] = None, scheduler: Optional[ExchangeScheduler] = None,
+                           on_page: Optional[PageCallback] = None) -> List[Dict]:
+    """Page through the pairs with ``lower < id < upper`` using an ``id_gt`` cursor.
+
+    Cursor paging keeps each page an index seek, unlike ``skip`` which the
+    hosted service caps and which gets slower the deeper it goes. Each page
+    is handed to ``on_page`` as soon as it lands.
+    """
+    pairs: List[Dict] = []
+    last_id = lower
+    while max_pairs is None or len(pairs) < max_pairs:
+        first = page_size if max_pairs is None else min(page_size, max_pairs - len(pairs))
+        variables = {'first': first, 'lastId': last_id, 'upperId': upper}
+
+        # A request per page: the shards page concurrently, so the shared
+        # query must not carry any one page's variables.
+        page_request = GraphQLRequest(PAIRS_PAGE_QUERY, variable_values=variables)
+
+        def request():
+            return session.execute(page_request)
+
+        result = await (scheduler.run(request) if scheduler is not None else request())
+        page = result['pairs']
+        if max_pairs is not None:
+            page = page[:max_pairs - len(pairs)]
+        pairs.extend(page)
+        if on_page is not None:
+            on_page(page)
+        if len(page) < first:
+            break
+        last_id = page[-1]['id']
+    return pairs
+
+
+async def fetch_pairs(session: AsyncClientSession, page_size: int = PAGE_SIZE, max_pairs: Optional[int] = None,
+                      scheduler: Optional[ExchangeScheduler] = None, on_page: Optional[PageCallback] = None) -> List[Dict]:
+    """Fetch every pair of a subgraph, in id order.
+
+    With a scheduler the 16 id ranges are paged concurrently, bounded by its
+    rate limit and adaptive concurrency; without one a single cursor walks
+    the whole id space. ``max_pairs`` is split evenly across the ranges still
+    open, and quota a short range leaves unused is split again over the
+    ranges that filled theirs, so the pairs kept depend only on the data and
+    no range pages past the global cap.
+    """
+    if scheduler is None:
+        return await fetch_pair_range(session, SHARD_BOUNDS[0], SHARD_BOUNDS[-1], page_size, max_pairs, on_page=on_page)
+    shards = list(zip(SHARD_BOUNDS, SHARD_BOUNDS[1:]))
+    fetched: List[List[Dict]] = [[] for _ in shards]
+    open_shards = list(range(len(shards)))
+    remaining = max_pairs
+    while open_shards and (remaining is None or remaining > 0):
+        if remaining is None:
+            quotas = [None] * len(open_shards)
+        else:
+            share, extra = divmod(remaining, len(open_shards))
+            quotas = [share + (rank < extra) for rank in range(len(open_shards))]
+        rounds = [(shard, quota) for shard, quota in zip(open_shards, quotas) if quota != 0]
+        pages = await asyncio.gather(*(
+            fetch_pair_range(session, fetched[shard][-1]['id'] if fetched[shard] else shards[shard][0],
+                             shards[shard][1], page_size, quota, scheduler, on_page)
+            for shard, quota in rounds
+        ))
+        for (shard, quota), page in zip(rounds, pages):
+            fetched[shard].extend(page)
+            if remaining is not None:
+                remaining -= len(page)
+            # A range that came back short of its quota has no more pairs.
+            if quota is None or len(page) < quota:
+                open_shards.remove(shard)
+    return [pair for shard_pairs in fetched for pair in shard_pairs]
+
+
+class Snapshot:
+    """All pairs of every exchange as of one tick.
+
+    Rate lookups are answered from memory, so a tick costs one paged bulk
+    query per exchange and nothing per leg.
+    """
+
+    def __init__(self, pairs: Dict[str, List[Dict]], taken_at: Optional[float] = None):
+        self.pairs = pairs
+        self.taken_at = time.time() if taken_at is None else taken_at
+        self._by_tokens: Dict[Tuple[str, str, str], Dict] = {}
+        for exchange, exchange_pairs in pairs.items():
+            for pair in exchange_pairs:
+                self._by_tokens[(exchange, pair['token0']['id'], pair['token1']['id'])] = pair
+
+    def __len__(self) -> int:
+        return sum(len(exchange_pairs) for exchange_pairs in self.pairs.values())
+
+    def get_pair(self, exchange: str, token0: str, token1: str) -> Optional[Dict]:
+        return self._by_tokens.get((exchange, token0, token1))
+
+    def get_exchange_rate(self, exchange: str, base_asset: str, quote_asset: str) -> float:
+        """Base asset per quote asset, the ``token0Price`` of the base/quote pair."""
+        pair = self.get_pair(exchange, base_asset, quote_asset)
+        if pair is not None:
+            return float(pair['token0Price'])
+        pair = self.get_pair(exchange, quote_asset, base_asset)
+        if pair is not None:
+            return float(pair['token1Price'])
+        raise ValueError(f"No exchange rate found for {base_asset} and {quote_asset}")
+
+
+async def take_snapshot(sessions: Dict[str, AsyncClientSession], page_size: int = PAGE_SIZE, max_pairs: Optional[int] = None,
+                        schedulers: Optional[Dict[str, ExchangeScheduler]] = None,
+                        on_pairs: Optional[Callable[[str, List[Dict]], None]] = None) -> Snapshot:
+    """Fetch every exchange's pairs concurrently into one Snapshot.
+
+    An exchange whose fetch fails is logged and left out of the snapshot so
+    one bad endpoint does not cost the whole tick. ``on_pairs(exchange, page)``
+    sees every page the moment it lands, so consumers can work while the
+    other requests are still in flight.
+    """
+    exchanges = list(sessions)
+    results = await asyncio.gather(
+        *(fetch_pairs(sessions[exchange], page_size, max_pairs, (schedulers or {}).get(exchange),
+                      partial(on_pairs, exchange) if on_pairs is not None else None)
+          for exchange in exchanges),
+        return_exceptions=True,
+    )
+    pairs = {}
+    for exchange, result in zip(exchanges, results):
+        if isinstance(result, Exception):
+            log.error(f"Error getting pairs for {exchange}: {result}")
+            continue
+        pairs[exchange] = result
+    return Snapshot(pairs)
@@ -0,0 +1,79 @@
+# conftest.py
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cycles import CycleCache
+from graphql_pool import GraphQLClientPool
+from replay import Cassette, ReplayServer, synthetic_pairs, write_introspection
+from scheduler import ExchangeScheduler
+
+EXCHANGES = ['uniswap', 'sushiswap', 'pancakeswap']
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: slow scan benchmarks, run with -m benchmark or --benchmark-enable')
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip benchmarks unless they were asked for."""
+    if 'benchmark' in (config.getoption('markexpr', '') or '') or config.getoption('benchmark_enable', False) \
+            or config.getoption('benchmark_only', False):
+        return
+    skip = pytest.mark.skip(reason='benchmark; run with -m benchmark or --benchmark-enable')
+    for item in items:
+        if item.get_closest_marker('benchmark') is not None:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope='module')
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def synthetic_cassette(pair_count: int, seed: int = 0) -> Cassette:
+    """Split ``pair_count`` pairs over the exchanges, sharing one token universe."""
+    tokens = max(50, pair_count // 25)
+    pairs = synthetic_pairs(pair_count, tokens, seed)
+    cassette = Cassette()
+    for index, exchange in enumerate(EXCHANGES):
+        cassette.add_pairs(exchange, pairs[index::len(EXCHANGES)])
+    return cassette
+
+
+@pytest.fixture
+def replay_finder(event_loop, tmp_path, monkeypatch):
+    """Point ArbFinder at a replay server for a synthetic cassette.
+
+    Returns a factory ``(pair_count, **server_options) -> ReplayServer``.
+    """
+    import ArbFinder
+
+    servers = []
+
+    def start(pair_count: int, **options) -> ReplayServer:
+        server = ReplayServer(synthetic_cassette(pair_count), seed=0, **options)
+        event_loop.run_until_complete(server.start())
+        servers.append(server)
+        schema_dir = str(tmp_path / 'schema_cache')
+        write_introspection(schema_dir, EXCHANGES)
+        pool = GraphQLClientPool({exchange: server.endpoint_url(exchange) for exchange in EXCHANGES}, schema_dir)
+        servers.append(pool)
+        monkeypatch.setattr(ArbFinder, 'graphql_pool', pool)
+        monkeypatch.setattr(ArbFinder, 'cycle_cache', CycleCache(str(tmp_path / 'cycle_cache.npz')))
+        monkeypatch.setattr(ArbFinder, 'schedulers', {
+            exchange: ExchangeScheduler(rate=1000, burst=1000, max_concurrency=ArbFinder.MAX_CONCURRENCY, backoff=0.01)
+            for exchange in EXCHANGES
+        })
+        return server
+
+    yield start
+    for resource in reversed(servers):
+        event_loop.run_until_complete(resource.close() if isinstance(resource, GraphQLClientPool) else resource.stop())
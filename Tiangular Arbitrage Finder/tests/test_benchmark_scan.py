@@ -0,0 +1,44 @@
+
+import pytest
+
+import ArbFinder
+
+pytest.importorskip('pytest_benchmark')
+
+PAIR_COUNTS = [1000, 10000, 50000]
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('pair_count', PAIR_COUNTS)
+def test_scan_benchmark(benchmark, event_loop, replay_finder, pair_count):
+    server = replay_finder(pair_count)
+    ticks = []
+
+    def scan():
+        server.reset_counters()
+        results = event_loop.run_until_complete(ArbFinder.check_for_profitable_trades())
+        ticks.append((server.requests, len(results)))
+        return results
+
+    results = benchmark.pedantic(scan, rounds=3, iterations=1, warmup_rounds=1)
+    requests, opportunities = ticks[-1]
+    benchmark.extra_info['pairs'] = pair_count
+    benchmark.extra_info['requests_per_tick'] = requests
+    benchmark.extra_info['opportunities'] = opportunities
+    if benchmark.stats is not None:
+        benchmark.extra_info['opportunities_per_second'] = opportunities / benchmark.stats.stats.mean
+    assert len(results) > 0
+    # One page per 1000 pairs and shard, plus one final short page per shard.
+    assert requests <= pair_count // 1000 + 16 * len(ArbFinder.EXCHANGE_APIS)
+
+
+def test_scan_survives_latency_and_throttling(event_loop, replay_finder):
+    server = replay_finder(1000)
+    expected = event_loop.run_until_complete(ArbFinder.check_for_profitable_trades())
+
+    server.latency, server.jitter, server.throttle_rate = 0.005, 0.01, 0.2
+    server.reset_counters()
+    results = event_loop.run_until_complete(ArbFinder.check_for_profitable_trades())
+
+    assert server.throttled > 0
+    assert results['path'].tolist() == expected['path'].tolist()
@@ -0,0 +1,182 @@
+
+import pytest
+from aiohttp import web
+
+from chain_sync import GET_RESERVES, SYNC_TOPIC, ReserveSync
+from snapshot import Snapshot
+
+POOL = '0x' + 'ab' * 20
+OTHER = '0x' + 'cd' * 20
+NEW = '0x' + 'ef' * 20
+
+
+def word(value):
+    return f"{value:064x}"
+
+
+class FakeNode:
+    """In-memory chain answering the JSON-RPC calls ReserveSync makes, like a local anvil."""
+
+    def __init__(self):
+        self.blocks = [{'hash': '0x0', 'logs': []}]
+        self.reserves = {POOL: [(10 ** 18, 2 * 10 ** 6)]}
+        # Runs once, right after the next eth_getLogs reply is built.
+        self.after_logs = None
+
+    def mine(self, syncs=(), fork=''):
+        number = len(self.blocks)
+        logs = []
+        for log_index, (address, reserve0, reserve1) in enumerate(syncs):
+            logs.append({
+                'address': address, 'topics': [SYNC_TOPIC], 'data': '0x' + word(reserve0) + word(reserve1),
+                'blockNumber': hex(number), 'logIndex': hex(log_index),
+            })
+        self.blocks.append({'hash': f"0x{number}{fork}", 'logs': logs})
+        for address, history in self.reserves.items():
+            latest = [(r0, r1) for a, r0, r1 in syncs if a == address]
+            history.append(latest[-1] if latest else history[-1])
+
+    def reorg(self, depth, syncs=()):
+        del self.blocks[-depth:]
+        for history in self.reserves.values():
+            del history[-depth:]
+        for block_syncs in syncs:
+            self.mine(block_syncs, fork='b')
+
+    def answer(self, method, params):
+        if method == 'eth_blockNumber':
+            return hex(len(self.blocks) - 1)
+        if method == 'eth_getBlockByNumber':
+            number = int(params[0], 16)
+            return {'hash': self.blocks[number]['hash']} if number < len(self.blocks) else None
+        if method == 'eth_call':
+            assert params[0]['data'] == GET_RESERVES
+            reserve0, reserve1 = self.reserves[params[0]['to']][int(params[1], 16)]
+            return '0x' + word(reserve0) + word(reserve1) + word(0)
+        if method == 'eth_getLogs':
+            start, end = int(params[0]['fromBlock'], 16), int(params[0]['toBlock'], 16)
+            logs = [log for block in self.blocks[start:end + 1] for log in block['logs']]
+            if self.after_logs is not None:
+                self.after_logs, after_logs = None, self.after_logs
+                after_logs()
+            return logs
+        raise AssertionError(method)
+
+    async def handle(self, request):
+        payload = await request.json()
+        if isinstance(payload, list):
+            return web.json_response([
+                {'jsonrpc': '2.0', 'id': call['id'], 'result': self.answer(call['method'], call['params'])}
+                for call in payload
+            ])
+        return web.json_response({'jsonrpc': '2.0', 'id': payload['id'],
+                                  'result': self.answer(payload['method'], payload['params'])})
+
+
+@pytest.fixture
+def node(event_loop):
+    fake = FakeNode()
+    app = web.Application()
+    app.router.add_post('/', fake.handle)
+    runner = web.AppRunner(app)
+    event_loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    event_loop.run_until_complete(site.start())
+    fake.url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+    yield fake
+    event_loop.run_until_complete(runner.cleanup())
+
+
+def pair(address=POOL, token1='0xusdc'):
+    return {
+        'id': address,
+        'token0': {'id': '0xweth', 'symbol': 'WETH', 'decimals': '18'},
+        'token1': {'id': token1, 'symbol': token1[2:].upper(), 'decimals': '6'},
+        'reserve0': '0', 'reserve1': '0', 'token0Price': '0', 'token1Price': '0',
+    }
+
+
+def snapshot(*pairs):
+    return Snapshot({'uniswap': list(pairs or [pair()]), 'pancakeswap': []})
+
+
+def rate(sync, quote='0xusdc'):
+    return sync.snapshot().get_exchange_rate('uniswap', quote, '0xweth')
+
+
+def test_follows_sync_events(event_loop, node):
+    sync = ReserveSync(node.url, ['uniswap'])
+    event_loop.run_until_complete(sync.bootstrap(snapshot()))
+    assert rate(sync) == pytest.approx(2.0)
+
+    node.mine([(POOL, 10 ** 18, 3 * 10 ** 6), (OTHER, 1, 1), (POOL, 10 ** 18, 4 * 10 ** 6)])
+    node.mine()
+    assert event_loop.run_until_complete(sync.poll()) == 2
+    assert rate(sync) == pytest.approx(4.0)
+    assert list(sync.pools) == [POOL]
+    assert event_loop.run_until_complete(sync.poll()) == 0
+    event_loop.run_until_complete(sync.close())
+
+
+def test_replays_from_fork_after_reorg(event_loop, node):
+    sync = ReserveSync(node.url, ['uniswap'])
+    event_loop.run_until_complete(sync.bootstrap(snapshot()))
+    node.mine([(POOL, 10 ** 18, 3 * 10 ** 6)])
+    node.mine([(POOL, 10 ** 18, 5 * 10 ** 6)])
+    event_loop.run_until_complete(sync.poll())
+    assert rate(sync) == pytest.approx(5.0)
+
+    # The last block is replaced by one without a Sync for the pool, plus a new empty block.
+    node.reorg(1, [[], []])
+    event_loop.run_until_complete(sync.poll())
+    assert rate(sync) == pytest.approx(3.0)
+    event_loop.run_until_complete(sync.close())
+
+
+def test_detects_reorg_while_logs_are_fetched(event_loop, node):
+    sync = ReserveSync(node.url, ['uniswap'])
+    event_loop.run_until_complete(sync.bootstrap(snapshot()))
+    node.mine([(POOL, 10 ** 18, 3 * 10 ** 6)])
+    # The block the logs came from is orphaned before the poll finishes.
+    node.after_logs = lambda: node.reorg(1, [[(POOL, 10 ** 18, 5 * 10 ** 6)]])
+    event_loop.run_until_complete(sync.poll())
+    assert rate(sync) == pytest.approx(3.0)
+
+    node.mine()
+    event_loop.run_until_complete(sync.poll())
+    assert rate(sync) == pytest.approx(5.0)
+    event_loop.run_until_complete(sync.close())
+
+
+def test_follows_pools_listed_after_bootstrap(event_loop, node):
+    sync = ReserveSync(node.url, ['uniswap'])
+    event_loop.run_until_complete(sync.bootstrap(snapshot()))
+    node.reserves[NEW] = [(10 ** 18, 1500 * 10 ** 6)] * len(node.blocks)
+    node.mine([(NEW, 10 ** 18, 1600 * 10 ** 6)])
+    event_loop.run_until_complete(sync.poll())
+    assert list(sync.pools) == [POOL]
+
+    assert event_loop.run_until_complete(sync.follow(snapshot(pair(), pair(NEW, '0xdai')))) == 1
+    assert rate(sync, '0xdai') == pytest.approx(1600.0)
+    node.mine([(NEW, 10 ** 18, 1700 * 10 ** 6)])
+    event_loop.run_until_complete(sync.poll())
+    assert rate(sync, '0xdai') == pytest.approx(1700.0)
+    assert event_loop.run_until_complete(sync.follow(snapshot(pair(), pair(NEW, '0xdai')))) == 0
+    event_loop.run_until_complete(sync.close())
+
+
+def test_restarting_syncs_stops_the_old_ones(event_loop, node, monkeypatch):
+    import ArbFinder
+
+    monkeypatch.setattr(ArbFinder, 'RPC_URLS', {'uniswap': node.url})
+    monkeypatch.setattr(ArbFinder, 'reserve_syncs', [])
+    monkeypatch.setattr(ArbFinder, 'reserve_sync_tasks', [])
+    event_loop.run_until_complete(ArbFinder.start_reserve_syncs(snapshot()))
+    [old_sync], old_tasks = list(ArbFinder.reserve_syncs), list(ArbFinder.reserve_sync_tasks)
+
+    event_loop.run_until_complete(ArbFinder.start_reserve_syncs(snapshot()))
+    assert all(task.cancelled() for task in old_tasks)
+    assert old_sync.rpc._session is None
+    assert ArbFinder.reserve_syncs[0] is not old_sync
+    event_loop.run_until_complete(ArbFinder.stop_reserve_syncs())
+    assert ArbFinder.reserve_syncs == [] and ArbFinder.reserve_sync_tasks == []
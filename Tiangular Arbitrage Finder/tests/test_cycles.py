@@ -0,0 +1,62 @@
+
+import random
+
+import ArbFinder
+from cycles import CycleCache, universe_key
+from graph import TokenGraph
+from matrix import RateMatrix
+from replay import synthetic_pairs
+from snapshot import take_snapshot
+
+
+def build_graph(pairs):
+    graph = TokenGraph()
+    graph.add_pairs('uniswap', pairs)
+    return graph
+
+
+def test_cached_cycles_match_enumeration(tmp_path):
+    pairs = synthetic_pairs(2000, 60, seed=1, mispricing=0.05)
+    path = str(tmp_path / 'cycles.npz')
+    graph = build_graph(pairs)
+    expected = graph.find_opportunities(0.0, max_length=4, method='matrix')
+    assert expected
+
+    cache = CycleCache(path)
+    assert graph.find_opportunities(0.0, max_length=4, method='matrix', cycle_cache=cache) == expected
+
+    # Same universe in a different arrival order, reloaded by a new process.
+    random.Random(2).shuffle(pairs)
+    reordered = build_graph(pairs)
+    reloaded = CycleCache(path)
+    key = reloaded.key
+    found = reordered.find_opportunities(0.0, max_length=4, method='matrix', cycle_cache=reloaded)
+    assert reloaded.key == key
+    assert sorted(reordered.describe_cycle(cycle, profit, 0)['path'] for cycle, profit in found) == \
+        sorted(graph.describe_cycle(cycle, profit, 0)['path'] for cycle, profit in expected)
+
+
+def test_universe_change_re_enumerates(tmp_path):
+    pairs = synthetic_pairs(500, 40, seed=3)
+    cache = CycleCache(str(tmp_path / 'cycles.npz'))
+    build_graph(pairs[:400]).find_opportunities(0.0, method='matrix', cycle_cache=cache)
+    key = cache.key
+    graph = build_graph(pairs)
+    found = graph.find_opportunities(0.0, method='matrix', cycle_cache=cache)
+    assert cache.key != key
+    assert found == graph.find_opportunities(0.0, method='matrix')
+
+
+def test_capped_snapshots_of_the_same_data_share_a_key(event_loop, replay_finder):
+    server = replay_finder(3000, latency=0.001, jitter=0.01)
+    sessions = event_loop.run_until_complete(ArbFinder.graphql_pool.connect_all())
+    keys = []
+    for seed in (1, 2):
+        # Pages land in a different order each time; the capped universe must not.
+        server.random.seed(seed)
+        graph = TokenGraph()
+        event_loop.run_until_complete(take_snapshot(
+            sessions, page_size=100, max_pairs=900, schedulers=ArbFinder.schedulers, on_pairs=graph.add_pairs
+        ))
+        keys.append(universe_key(RateMatrix.from_graph(graph))[0])
+    assert keys[0] == keys[1]
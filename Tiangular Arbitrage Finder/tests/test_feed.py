@@ -0,0 +1,123 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from feed import OpportunityFeed, Scanner
+
+
+def opportunity(*pairs, profit=0.01):
+    return {'pairs': list(pairs), 'profit_percentage': profit}
+
+
+def drain(subscriber):
+    events = []
+    while not subscriber.empty():
+        events.append(subscriber.get_nowait())
+    return events
+
+
+def parse(chunk):
+    """Turn one server-sent event into (id, event, data)."""
+    fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+    return int(fields['id']), fields['event'], json.loads(fields['data'])
+
+
+def test_publish_broadcasts_upserts_and_removes():
+    feed = OpportunityFeed()
+    subscriber = feed.subscribe()
+    a, b = opportunity('0xa', '0xb'), opportunity('0xb', '0xc')
+
+    events = feed.publish([a, b])
+    assert [(event['type'], event['sequence']) for event in events] == [('upsert', 1), ('upsert', 2)]
+    assert drain(subscriber) == events
+
+    # Unchanged opportunities publish nothing; changed ones are upserted, missing ones removed.
+    assert feed.publish([a, b]) == []
+    changed = opportunity('0xa', '0xb', profit=0.02)
+    events = feed.publish([changed])
+    assert [(event['type'], event['key'], event['sequence']) for event in events] == [
+        ('upsert', ['0xa', '0xb'], 3),
+        ('remove', ['0xb', '0xc'], 4),
+    ]
+    assert drain(subscriber) == events
+    assert feed.snapshot()['opportunities'] == [changed]
+    assert feed.snapshot()['sequence'] == 4
+
+    feed.unsubscribe(subscriber)
+    feed.publish([])
+    assert drain(subscriber) == []
+
+
+def test_subscribe_resumes_after_last_sequence():
+    feed = OpportunityFeed()
+    feed.publish([opportunity('0xa', '0xb')])
+    feed.publish([opportunity('0xa', '0xb'), opportunity('0xb', '0xc')])
+    feed.publish([opportunity('0xb', '0xc')])
+
+    assert [event['sequence'] for event in drain(feed.subscribe(1))] == [2, 3]
+    assert drain(feed.subscribe(3)) == []
+    # Without a sequence, the current opportunities are replayed as upserts.
+    assert [(event['type'], event['key']) for event in drain(feed.subscribe())] == [('upsert', ['0xb', '0xc'])]
+
+
+def test_subscribe_older_than_history_gets_a_full_snapshot():
+    feed = OpportunityFeed(history_size=2)
+    for profit in [0.01, 0.02, 0.03]:
+        feed.publish([opportunity('0xa', '0xb', profit=profit)])
+    assert [event['sequence'] for event in drain(feed.subscribe(1))] == [2, 3]
+    backlog = drain(feed.subscribe(0))
+    assert [(event['type'], event['sequence'], event['opportunity']['profit_percentage']) for event in backlog] == [
+        ('upsert', 3, 0.03)
+    ]
+
+
+def test_stream_resumes_from_last_event_id(monkeypatch):
+    import ArbFinder
+
+    feed = OpportunityFeed()
+    feed.publish([opportunity('0xa', '0xb')])
+    feed.publish([opportunity('0xb', '0xc')])
+    monkeypatch.setattr(ArbFinder, 'feed', feed)
+    monkeypatch.setattr(ArbFinder.scanner, 'start', lambda: None)
+
+    response = ArbFinder.app.test_client().get('/profitable_trades/stream', headers={'Last-Event-ID': '1'})
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    received = [parse(next(chunks)) for _ in range(2)]
+    response.close()
+    assert [(sequence, kind) for sequence, kind, _ in received] == [(2, 'upsert'), (3, 'remove')]
+    assert received[0][2]['opportunity'] == opportunity('0xb', '0xc')
+
+
+def test_concurrent_start_runs_one_scanner():
+    feed = OpportunityFeed()
+    started = threading.Event()
+    release = threading.Event()
+    scans = []
+
+    async def scan():
+        scans.append(threading.current_thread().name)
+        started.set()
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return []
+
+    scanner = Scanner(feed, scan, interval=60)
+    barrier = threading.Barrier(16)
+
+    def request():
+        barrier.wait()
+        scanner.start()
+
+    threads = [threading.Thread(target=request) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert started.wait(5)
+    release.set()
+    scanner.stop(timeout=0)
+    assert scans == ['arbitrage-scanner']
+    assert sum(thread.name == 'arbitrage-scanner' for thread in threading.enumerate()) <= 1
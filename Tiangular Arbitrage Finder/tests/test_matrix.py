@@ -0,0 +1,18 @@
+import pytest
+
+from graph import TokenGraph
+from replay import synthetic_pairs
+
+
+@pytest.mark.parametrize('max_length', [3, 4])
+def test_matrix_scores_match_enumeration(max_length):
+    graph = TokenGraph()
+    graph.add_pairs('uniswap', synthetic_pairs(300, 25, seed=5, mispricing=0.05))
+    graph.add_pairs('sushiswap', synthetic_pairs(300, 25, seed=6, mispricing=0.05))
+    enumerated = dict(graph.find_opportunities(0.0, max_length=max_length, method='enumerate'))
+    vectorized = dict(graph.find_opportunities(0.0, max_length=max_length, method='matrix'))
+    assert enumerated and set(vectorized) == set(enumerated)
+    if max_length == 4:
+        assert any(len(cycle) == 4 for cycle in enumerated)
+    for cycle, profit in enumerated.items():
+        assert vectorized[cycle] == pytest.approx(profit, rel=1e-12, abs=1e-12)
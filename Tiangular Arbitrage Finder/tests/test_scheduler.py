@@ -0,0 +1,144 @@
+import asyncio
+import types
+
+import aiohttp
+import pytest
+from multidict import CIMultiDict, CIMultiDictProxy
+from gql.transport.exceptions import TransportServerError
+from yarl import URL
+
+import scheduler
+from scheduler import ExchangeScheduler, TokenBucket, retry_after
+
+
+class FakeClock:
+    """Monotonic time that only moves when the scheduler sleeps (or the test advances it)."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler, 'time', clock)
+    monkeypatch.setattr(scheduler, 'asyncio', types.SimpleNamespace(
+        sleep=clock.sleep, Lock=asyncio.Lock, Condition=asyncio.Condition))
+    monkeypatch.setattr(scheduler, 'random', types.SimpleNamespace(random=lambda: 0.0))
+    return clock
+
+
+def throttled(headers=None) -> TransportServerError:
+    """A 429 as the gql aiohttp transport raises it, from aiohttp's ClientResponseError."""
+    request_info = aiohttp.RequestInfo(URL('http://subgraph.test'), 'POST', CIMultiDictProxy(CIMultiDict()))
+    cause = aiohttp.ClientResponseError(request_info, (), status=429, headers=headers)
+    error = TransportServerError(str(cause), cause.status)
+    error.__cause__ = cause
+    return error
+
+
+def test_token_bucket_bursts_then_refills_at_rate(event_loop, clock):
+    bucket = TokenBucket(rate=10, burst=5)
+
+    async def acquire(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    event_loop.run_until_complete(acquire(5))
+    assert clock.sleeps == []
+    event_loop.run_until_complete(acquire(1))
+    assert clock.sleeps == [pytest.approx(0.1)]
+
+    clock.now += 0.35
+    bucket._refill()
+    assert bucket.tokens == pytest.approx(3.5)
+    clock.now += 60
+    bucket._refill()
+    assert bucket.tokens == 5
+
+
+def test_pause_holds_back_the_next_request(event_loop, clock):
+    bucket = TokenBucket(rate=4, burst=10)
+    bucket.pause(2.0)
+    event_loop.run_until_complete(bucket.acquire())
+    assert clock.sleeps == [pytest.approx(2.25)]
+
+
+def test_throttle_halves_the_limit_and_successes_grow_it_back(event_loop, clock):
+    exchange = ExchangeScheduler(rate=1024, burst=1024, initial=8, max_concurrency=16)
+    responses = iter([throttled()])
+
+    async def call():
+        error = next(responses, None)
+        if error is not None:
+            raise error
+        return 'ok'
+
+    assert event_loop.run_until_complete(exchange.run(call)) == 'ok'
+    assert exchange.throttled == 1
+    assert exchange.requests == 2
+    # Halved by the 429, then one additive step for the retry that succeeded.
+    assert exchange.limiter.limit == pytest.approx(4 + 1 / 4)
+
+    limits = []
+    for _ in range(40):
+        event_loop.run_until_complete(exchange.run(call))
+        limits.append(exchange.limiter.limit)
+    assert limits == sorted(limits)
+    assert limits[-1] > 8
+    assert limits[-1] <= 16
+
+
+def test_slow_request_trims_the_limit(event_loop, clock):
+    exchange = ExchangeScheduler(rate=1024, burst=1024, initial=10, target_latency=2.0)
+
+    async def slow():
+        clock.now += 3.0
+        return 'ok'
+
+    event_loop.run_until_complete(exchange.run(slow))
+    assert exchange.limiter.limit == pytest.approx(9.0)
+
+
+def test_retry_honours_retry_after(event_loop, clock):
+    exchange = ExchangeScheduler(rate=10, burst=10, backoff=0.5)
+    responses = iter([throttled({'Retry-After': '7'}), throttled()])
+
+    async def call():
+        error = next(responses, None)
+        if error is not None:
+            raise error
+        return 'ok'
+
+    assert event_loop.run_until_complete(exchange.run(call)) == 'ok'
+    # Each wait is Retry-After, then backoff * 2 ** 1 without a header; the
+    # paused bucket then holds the retry for one more refill interval.
+    assert clock.sleeps == [7.0, pytest.approx(0.1), 1.0, pytest.approx(0.1)]
+
+
+def test_retry_after_parsing():
+    assert retry_after(throttled({'Retry-After': '2.5'})) == 2.5
+    assert retry_after(throttled({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) is None
+    assert retry_after(throttled()) is None
+    assert retry_after(ValueError()) is None
+
+
+def test_gives_up_after_max_retries(event_loop, clock):
+    exchange = ExchangeScheduler(rate=1024, burst=1024, max_retries=2, backoff=0.5)
+
+    async def call():
+        raise throttled()
+
+    with pytest.raises(TransportServerError):
+        event_loop.run_until_complete(exchange.run(call))
+    assert exchange.requests == 3
+    assert exchange.throttled == 3
+    assert exchange.limiter.limit == 1
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from graph import TokenGraph
+from slippage import compose, cycle_reserves, optimal_input, simulate, size_cycles
+
+
+def pair(pair_id, token0, token1, reserve0, reserve1):
+    return {
+        'id': pair_id,
+        'token0': {'id': token0, 'symbol': token0.upper()},
+        'token1': {'id': token1, 'symbol': token1.upper()},
+        'reserve0': str(reserve0),
+        'reserve1': str(reserve1),
+        'token0Price': str(reserve0 / reserve1 if reserve1 else 0.0),
+        'token1Price': str(reserve1 / reserve0 if reserve0 else 0.0),
+    }
+
+
+def triangle(premium=1.05, usdc_weth=2_000_000.0, weth_dai=1_000.0, dai_usdc=2_100_000.0):
+    graph = TokenGraph()
+    graph.add_pairs('uniswap', [
+        pair('p1', 'usdc', 'weth', usdc_weth, usdc_weth / 2000),
+        pair('p2', 'weth', 'dai', weth_dai, weth_dai * 2000),
+        pair('p3', 'dai', 'usdc', dai_usdc, dai_usdc * premium),
+    ])
+    return graph, (graph.index['usdc'], graph.index['weth'], graph.index['dai'])
+
+
+def test_composed_curve_is_the_pool_by_pool_output():
+    graph, cycle = triangle()
+    reserve_in, reserve_out, fee = cycle_reserves(graph, np.array([cycle]))
+    a, b, c = compose(reserve_in, reserve_out, fee)
+    amounts = np.array([1.0, 1_000.0, 50_000.0])
+    # One x*y=k pool with the fee on the input.
+    effective = amounts * 0.997
+    assert simulate(reserve_in[:, :1], reserve_out[:, :1], fee[:, :1], amounts) == pytest.approx(
+        reserve_out[0, 0] * effective / (reserve_in[0, 0] + effective))
+    swapped = simulate(np.repeat(reserve_in, 3, 0), np.repeat(reserve_out, 3, 0), np.repeat(fee, 3, 0), amounts)
+    assert swapped == pytest.approx(a * amounts / (b + c * amounts), rel=1e-12)
+
+
+def test_optimal_input_is_the_numeric_argmax():
+    graph, cycle = triangle()
+    [sized] = size_cycles(graph, [cycle], 0.0)
+    reserve_in, reserve_out, fee = cycle_reserves(graph, np.array([cycle]))
+    grid = np.linspace(0, 4 * sized['optimal_input'], 400_001)
+    profits = simulate(*(np.repeat(x, len(grid), 0) for x in (reserve_in, reserve_out, fee)), grid) - grid
+    best = grid[profits.argmax()]
+    assert sized['optimal_input'] == pytest.approx(best, rel=1e-4)
+    assert sized['expected_profit'] >= profits.max() - 1e-6
+    assert sized['expected_profit'] > 0 and sized['marginal_rate'] > 1
+
+
+def test_unprofitable_cycle_gets_no_size():
+    # A 0.5% mispricing does not cover three 0.3% fees.
+    graph, cycle = triangle(premium=1.005)
+    reserve_in, reserve_out, fee = cycle_reserves(graph, np.array([cycle]))
+    assert optimal_input(*compose(reserve_in, reserve_out, fee)) == [0.0]
+    assert size_cycles(graph, [cycle], 0.0) == []
+
+
+def test_zero_reserve_gets_no_size():
+    graph, cycle = triangle()
+    graph.succ[cycle[1]][cycle[2]].reserve_in = 0.0
+    reserve_in, reserve_out, fee = cycle_reserves(graph, np.array([cycle]))
+    assert optimal_input(*compose(reserve_in, reserve_out, fee)) == [0.0]
+    assert simulate(reserve_in, reserve_out, fee, np.array([1_000.0])) == [0.0]
+    assert size_cycles(graph, [cycle], 0.0) == []
+
+
+def test_threshold_applies_to_the_realised_profit():
+    # The marginal rate clears 3%, but price impact at the optimal size leaves about 2%.
+    graph, cycle = triangle()
+    [sized] = size_cycles(graph, [cycle], 0.0)
+    assert sized['marginal_rate'] > 1.03
+    assert sized['profit_percentage'] < 0.03
+    assert size_cycles(graph, [cycle], 0.03) == []
+    assert size_cycles(graph, [cycle], 0.015) != []
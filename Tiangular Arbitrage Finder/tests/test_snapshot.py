@@ -0,0 +1,37 @@
+
+import ArbFinder
+from snapshot import take_snapshot
+
+
+def test_streamed_pages_match_snapshot(event_loop, replay_finder):
+    replay_finder(3000, latency=0.005, jitter=0.01)
+    sessions = event_loop.run_until_complete(ArbFinder.graphql_pool.connect_all())
+    streamed = {}
+
+    def on_pairs(exchange, page):
+        streamed.setdefault(exchange, []).extend(page)
+
+    snapshot = event_loop.run_until_complete(
+        take_snapshot(sessions, page_size=100, max_pairs=700, schedulers=ArbFinder.schedulers, on_pairs=on_pairs)
+    )
+    for exchange, pairs in snapshot.pairs.items():
+        assert len(pairs) == 700
+        assert sorted(pair['id'] for pair in streamed[exchange]) == sorted(pair['id'] for pair in pairs)
+
+
+def test_capped_snapshot_is_deterministic(event_loop, replay_finder):
+    # About 62 pairs per id range and exchange, so some ranges fall short of
+    # their quota and the rest is made up from the others.
+    server = replay_finder(3000, latency=0.001, jitter=0.01)
+    sessions = event_loop.run_until_complete(ArbFinder.graphql_pool.connect_all())
+    taken = []
+    for seed in (1, 2):
+        server.random.seed(seed)
+        snapshot = event_loop.run_until_complete(
+            take_snapshot(sessions, page_size=100, max_pairs=990, schedulers=ArbFinder.schedulers)
+        )
+        taken.append({exchange: [pair['id'] for pair in pairs] for exchange, pairs in snapshot.pairs.items()})
+    for exchange, ids in taken[0].items():
+        assert len(ids) == 990
+        assert ids == sorted(ids)
+        assert taken[1][exchange] == ids
@@ -1,62 +1,470 @@
 import asyncio
+import logging
+import struct
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
 import aioredis
-from typing import Any, Optional
+
+from app.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+# Floats are stored as a one-byte tag followed by a little-endian double:
+# 9 bytes instead of up to 24 for str(), with no float() parsing on reads.
+_FLOAT_TAG = b"d"
+_FLOAT = struct.Struct("<d")
+
+
+def encode_value(value: Any) -> Any:
+    """
+    Encode a value for Redis, packing floats into their binary form. 
+
+    :param value: The value to encode.
+    :return: The encoded value.
+    """
+    if isinstance(value, float):
+        return _FLOAT_TAG + _FLOAT.pack(value)
+    return value
+
+
+def decode_value(raw: Optional[bytes]) -> Optional[Any]:
+    """
+    Decode a value read from Redis. Values written by encode_value come back
+    as floats; anything else is returned as stored. 
+
+    :param raw: The raw value or None.
+    :return: The decoded value or None.
+    """
+    if raw is not None and len(raw) == 9 and raw[:1] == _FLOAT_TAG:
+        return _FLOAT.unpack_from(raw, 1)[0]
+    return raw
+
+
+class CachePipeline:
+    """
+    A class that queues cache operations and sends them to Redis in a single
+    round-trip. Reads return futures that resolve once the pipeline runs.
+    """ 
+
+    def __init__(self, pipeline, expire_time: int):
+        self._pipeline = pipeline
+        self._expire_time = expire_time
+        self._futures: List[Optional[asyncio.Future]] = []
+
+    def get(self, key: str) -> asyncio.Future:
+        """
+        Queue a read. 
+
+        :param key: The key for the cache item.
+        :return: A future for the value, or None if the key does not exist.
+        """
+        self._pipeline.get(key)
+        future = asyncio.get_running_loop().create_future()
+        self._futures.append(future)
+        return future
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Queue a write with the cache's expiration time. 
+
+        :param key: The key for the cache item.
+        :param value: The value to be stored in the cache.
+        """
+        self._pipeline.set(key, encode_value(value), ex=self._expire_time)
+        self._futures.append(None)
+
+    def delete(self, key: str) -> None:
+        """
+        Queue a delete. 
+
+        :param key: The key for the cache item.
+        """
+        self._pipeline.delete(key)
+        self._futures.append(None)
+
+    async def execute(self) -> None:
+        """
+        Send every queued operation and resolve the pending reads.
+        """
+        if not self._futures:
+            return
+        futures, self._futures = self._futures, []
+        results = await self._pipeline.execute()
+        for future, result in zip(futures, results):
+            if future is not None:
+                future.set_result(decode_value(result))
 
 
 class AsyncCache:
-    """
-    A class that represents an asynchronous cache and provides methods for
-    setting, getting, and deleting cache items.
-    """ 
-
-    def __init__(self, url: str, expire_time: int):
-        self.url = url
-        self.expire_time = expire_time
-        self._connection = None 
-
-    async def _get_connection(self):
-        """
-        Get the Redis connection. If it does not exist, create it. 
-
-        :return: The Redis connection.
-        """
-        if self._connection is None or self._connection.closed:
-            self._connection = await aioredis.from_url(self.url)
-        return self._connection 
-
-    async def set(self, key: str, value: Any) -> None:
-        """
-        Set a key-value pair in the cache with an expiration time. 
-
-        :param key: The key for the cache item.
-        :param value: The value to be stored in the cache.
-        """
-        redis = await self._get_connection()
-        await redis.set(key, value, expire=self.expire_time) 
-
-    async def get(self, key: str) -> Optional[Any]:
-        """
-        Get the value associated with a key in the cache. 
-
-        :param key: The key for the cache item.
-        :return: The value associated with the key or None if the key does not exist.
-        """
-        redis = await self._get_connection()
-        return await redis.get(key) 
-
-    async def delete(self, key: str) -> None:
-        """
-        Delete a key-value pair from the cache. 
-
-        :param key: The key for the cache item.
-        """
-        redis = await self._get_connection()
-        await redis.delete(key) 
-
-    async def close(self) -> None:
-        """
-        Close the Redis connection.
-        """
-        if self._connection is not None and not self._connection.closed:
-            self._connection.close()
-            await self._connection.wait_closed()
+    """
+    A class that represents an asynchronous cache and provides methods for
+    setting, getting, and deleting cache items.
+    """ 
+
+    def __init__(self, url: str, expire_time: int, name: str = "cache"):
+        self.url = url
+        self.expire_time = expire_time
+        self.name = name
+        self._connection = None
+        self._hits = metrics.counter("cache_lookups_total", cache=name, tier="redis", result="hit")
+        self._misses = metrics.counter("cache_lookups_total", cache=name, tier="redis", result="miss")
+        self._latency = metrics.histogram("cache_latency_seconds", cache=name, op="mget") 
+
+    async def _get_connection(self):
+        """
+        Get the Redis connection. If it does not exist, create it. 
+
+        :return: The Redis connection.
+        """
+        if self._connection is None:
+            self._connection = aioredis.from_url(self.url)
+        return self._connection 
+
+    async def set(self, key: str, value: Any) -> None:
+        """
+        Set a key-value pair in the cache with an expiration time. 
+
+        :param key: The key for the cache item.
+        :param value: The value to be stored in the cache.
+        """
+        redis = await self._get_connection()
+        await redis.set(key, encode_value(value), ex=self.expire_time) 
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Get the value associated with a key in the cache. 
+
+        :param key: The key for the cache item.
+        :return: The value associated with the key or None if the key does not exist.
+        """
+        redis = await self._get_connection()
+        return decode_value(await redis.get(key)) 
+
+    async def delete(self, key: str) -> None:
+        """
+        Delete a key-value pair from the cache. 
+
+        :param key: The key for the cache item.
+        """
+        redis = await self._get_connection()
+        await redis.delete(key) 
+
+    async def get_many(self, keys: Iterable[str]) -> List[Optional[Any]]:
+        """
+        Get the values of many keys with a single MGET. 
+
+        :param keys: The keys for the cache items.
+        :return: The values in key order, None for keys that do not exist.
+        """
+        keys = list(keys)
+        if not keys:
+            return []
+        redis = await self._get_connection()
+        started = time.perf_counter()
+        values = [decode_value(raw) for raw in await redis.mget(keys)]
+        self._latency.record(time.perf_counter() - started)
+        found = sum(value is not None for value in values)
+        self._hits.inc(found)
+        self._misses.inc(len(values) - found)
+        return values
+
+    async def set_many(self, items: Dict[str, Any]) -> None:
+        """
+        Set many key-value pairs with the cache's expiration time in a single
+        pipelined round-trip. 
+
+        :param items: The keys and values to be stored in the cache.
+        """
+        if not items:
+            return
+        async with self.pipeline() as pipe:
+            for key, value in items.items():
+                pipe.set(key, value)
+
+    @asynccontextmanager
+    async def pipeline(self) -> AsyncIterator[CachePipeline]:
+        """
+        Queue mixed get/set/delete operations and send them in one round-trip
+        when the block exits. 
+
+        :return: The pipeline to queue operations on.
+        """
+        redis = await self._get_connection()
+        pipe = CachePipeline(redis.pipeline(transaction=False), self.expire_time)
+        yield pipe
+        await pipe.execute()
+
+    async def load_many(self, loaders: Dict[str, Loader]) -> Dict[str, Any]:
+        """
+        Run the loaders concurrently and store their results in one pipelined
+        write. 
+
+        :param loaders: A coroutine function per key producing its value.
+        :return: The loaded value, or the exception raised, per key.
+        """
+        keys = list(loaders)
+        results = await asyncio.gather(*(loaders[key]() for key in keys), return_exceptions=True)
+        loaded = dict(zip(keys, results))
+        await self.set_many({key: value for key, value in loaded.items() if not isinstance(value, Exception)})
+        return loaded
+
+    async def get_or_load_many(self, loaders: Dict[str, Loader]) -> List[Any]:
+        """
+        Get many keys in one round-trip and load the misses. 
+
+        :param loaders: A coroutine function per key producing its value on a miss.
+        :return: The values in key order, or the exception raised loading a key.
+        """
+        keys = list(loaders)
+        values = await self.get_many(keys)
+        misses = {key: loaders[key] for key, value in zip(keys, values) if value is None}
+        if misses:
+            loaded = await self.load_many(misses)
+            values = [loaded[key] if key in loaded else value for key, value in zip(keys, values)]
+        return values
+
+    async def get_or_load(self, key: str, loader: Loader) -> Any:
+        """
+        Get a key and load it on a miss. 
+
+        :param key: The key for the cache item.
+        :param loader: A coroutine function producing the value on a miss.
+        :return: The value.
+        """
+        (value,) = await self.get_or_load_many({key: loader})
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    async def close(self) -> None:
+        """
+        Close the Redis connection.
+        """
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+
+class TieredCache:
+    """
+    A class that puts a bounded in-process LRU in front of an AsyncCache.
+    Redis stays the shared second tier between worker processes. Concurrent
+    misses on the same key share one load (single-flight), and entries past
+    their TTL can be served stale while a background load refreshes them.
+    """ 
+
+    def __init__(
+        self,
+        remote: AsyncCache,
+        max_entries: int = 100_000,
+        ttl: Optional[float] = None,
+        stale_ttl: float = 0.0,
+    ):
+        """
+        :param remote: The Redis-backed cache.
+        :param max_entries: The maximum number of in-process entries.
+        :param ttl: Seconds an in-process entry is fresh (default: the remote expiry).
+        :param stale_ttl: Extra seconds a stale entry may be served while it refreshes.
+        """
+        self.remote = remote
+        self.max_entries = max_entries
+        self.ttl = remote.expire_time if ttl is None else ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[str, Tuple[Any, float, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: set = set()
+        self._hits = metrics.counter("cache_lookups_total", cache=remote.name, tier="local", result="hit")
+        self._misses = metrics.counter("cache_lookups_total", cache=remote.name, tier="local", result="miss")
+
+    def _lookup(self, key: str) -> Tuple[Optional[Any], bool]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        value, fresh_until, stale_until = entry
+        now = time.monotonic()
+        if now < fresh_until:
+            self._entries.move_to_end(key)
+            return value, False
+        if now < stale_until:
+            return value, True
+        del self._entries[key]
+        return None, False
+
+    def _store(self, key: str, value: Any) -> None:
+        fresh_until = time.monotonic() + self.ttl
+        self._entries[key] = (value, fresh_until, fresh_until + self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Get a value from the LRU, falling back to Redis. 
+
+        :param key: The key for the cache item.
+        :return: The value or None if the key does not exist in either tier.
+        """
+        (value,) = await self.get_many([key])
+        return value
+
+    async def get_many(self, keys: Iterable[str]) -> List[Optional[Any]]:
+        """
+        Get many values, sending only the LRU misses to Redis in one MGET. 
+
+        :param keys: The keys for the cache items.
+        :return: The values in key order, None for keys that do not exist.
+        """
+        keys = list(keys)
+        values: List[Optional[Any]] = []
+        misses = []
+        for i, key in enumerate(keys):
+            value, stale = self._lookup(key)
+            values.append(None if stale else value)
+            if value is None or stale:
+                misses.append(i)
+        self._hits.inc(len(keys) - len(misses))
+        self._misses.inc(len(misses))
+        if misses:
+            remote_values = await self.remote.get_many([keys[i] for i in misses])
+            for i, value in zip(misses, remote_values):
+                if value is not None:
+                    self._store(keys[i], value)
+                    values[i] = value
+        return values
+
+    async def set(self, key: str, value: Any) -> None:
+        """
+        Set a value in both tiers. 
+
+        :param key: The key for the cache item.
+        :param value: The value to be stored in the cache.
+        """
+        self._store(key, value)
+        await self.remote.set(key, value)
+
+    async def set_many(self, items: Dict[str, Any]) -> None:
+        """
+        Set many values in both tiers. 
+
+        :param items: The keys and values to be stored in the cache.
+        """
+        for key, value in items.items():
+            self._store(key, value)
+        await self.remote.set_many(items)
+
+    async def delete(self, key: str) -> None:
+        """
+        Delete a value from both tiers. 
+
+        :param key: The key for the cache item.
+        """
+        self._entries.pop(key, None)
+        await self.remote.delete(key)
+
+    async def load_many(self, loaders: Dict[str, Loader]) -> Dict[str, Any]:
+        """
+        Load many keys, joining any load already in flight for a key instead
+        of starting another one. 
+
+        :param loaders: A coroutine function per key producing its value.
+        :return: The loaded value, or the exception raised, per key.
+        """
+        loop = asyncio.get_running_loop()
+        joined = {key: self._inflight[key] for key in loaders if key in self._inflight}
+        owned = {key: loop.create_future() for key in loaders if key not in joined}
+        self._inflight.update(owned)
+        try:
+            results = await asyncio.gather(*(loaders[key]() for key in owned), return_exceptions=True)
+            loaded = dict(zip(owned, results))
+            await self.set_many({key: value for key, value in loaded.items() if not isinstance(value, Exception)})
+        except BaseException as e:
+            loaded = {key: e for key in owned}
+            raise
+        finally:
+            for key, future in owned.items():
+                self._inflight.pop(key, None)
+                if not future.done():
+                    future.set_result(loaded[key])
+        for key, future in joined.items():
+            loaded[key] = await asyncio.shield(future)
+        return loaded
+
+    def _refresh(self, loaders: Dict[str, Loader]) -> None:
+        loaders = {key: loader for key, loader in loaders.items() if key not in self._refreshing}
+        if not loaders:
+            return
+        self._refreshing.update(loaders)
+
+        async def refresh() -> None:
+            try:
+                await self.load_many(loaders)
+            except Exception as e:
+                log.warning(f"Background refresh of {len(loaders)} keys failed: {e}")
+            finally:
+                self._refreshing.difference_update(loaders)
+
+        asyncio.get_running_loop().create_task(refresh())
+
+    async def get_or_load_many(self, loaders: Dict[str, Loader]) -> List[Any]:
+        """
+        Get many keys from either tier and load the misses with single-flight.
+        Stale in-process entries are returned as-is and refreshed in the
+        background. 
+
+        :param loaders: A coroutine function per key producing its value on a miss.
+        :return: The values in key order, or the exception raised loading a key.
+        """
+        keys = list(loaders)
+        values: List[Optional[Any]] = [None] * len(keys)
+        stale = {}
+        remote_keys = []
+        for i, key in enumerate(keys):
+            value, is_stale = self._lookup(key)
+            if value is None:
+                remote_keys.append(i)
+                continue
+            values[i] = value
+            if is_stale:
+                stale[key] = loaders[key]
+        self._hits.inc(len(keys) - len(remote_keys))
+        self._misses.inc(len(remote_keys))
+        if stale:
+            self._refresh(stale)
+        if remote_keys:
+            remote_values = await self.remote.get_many([keys[i] for i in remote_keys])
+            misses = {}
+            for i, value in zip(remote_keys, remote_values):
+                if value is None:
+                    misses[keys[i]] = loaders[keys[i]]
+                    continue
+                self._store(keys[i], value)
+                values[i] = value
+            if misses:
+                loaded = await self.load_many(misses)
+                values = [loaded[key] if key in loaded else value for key, value in zip(keys, values)]
+        return values
+
+    async def get_or_load(self, key: str, loader: Loader) -> Any:
+        """
+        Get a key from either tier and load it on a miss with single-flight. 
+
+        :param key: The key for the cache item.
+        :param loader: A coroutine function producing the value on a miss.
+        :return: The value.
+        """
+        (value,) = await self.get_or_load_many({key: loader})
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    async def close(self) -> None:
+        """
+        Drop the in-process entries and close the Redis connection.
+        """
+        self._entries.clear()
+        await self.remote.close()
@@ -0,0 +1,217 @@
+import asyncio
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.exceptions import ApiRequestError
+from app.exchange import Exchange
+
+CANDLE_DTYPE = np.dtype(
+    [
+        ("time", "<i8"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("volume", "<f8"),
+    ]
+)
+
+PERIOD_SECONDS: Dict[str, int] = {
+    "1MIN": 60,
+    "5MIN": 300,
+    "15MIN": 900,
+    "1HRS": 3600,
+    "4HRS": 14400,
+    "1DAY": 86400,
+    "7DAY": 604800,
+}
+
+
+def parse_candles(
+    rows: Union[np.ndarray, List[List[float]]], period_id: str, now: Optional[float] = None
+) -> np.ndarray:
+    """
+    Convert OHLCV rows, oldest first, into a structured candle array. Rows
+    are either ``[open, high, low, close, volume]`` or carry the period start
+    time (in seconds) as an extra first column. Rows without a time are
+    assumed to end at the last closed period.
+
+    :param rows: The OHLCV rows from the exchange.
+    :param period_id: The period ID.
+    :param now: The current time in seconds (default: the wall clock).
+    :return: The candles as a CANDLE_DTYPE array.
+    """
+    candles = np.zeros(len(rows), dtype=CANDLE_DTYPE)
+    if not len(rows):
+        return candles
+    values = np.asarray(rows, dtype=np.float64)
+    if values.shape[1] == 6:
+        candles["time"] = values[:, 0]
+        values = values[:, 1:]
+    else:
+        period = PERIOD_SECONDS[period_id]
+        last_closed = (int(now if now is not None else time.time()) // period - 1) * period
+        candles["time"] = last_closed - period * np.arange(len(rows) - 1, -1, -1)
+    for column, name in enumerate(("open", "high", "low", "close", "volume")):
+        candles[name] = values[:, column]
+    return candles
+
+
+def percentage_change_stats(closes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the average percentage change and its standard deviation for
+    every row of a close price matrix in one vectorized pass. Rows may be
+    left-padded with NaN for symbols with a shorter history.
+
+    :param closes: An (n_symbols, n_candles) array of closing prices, oldest first.
+    :return: The n average percentage changes and the n volatilities (NaN with no changes).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = np.diff(closes, axis=1) / closes[:, :-1]
+    counts = np.sum(~np.isnan(changes), axis=1)
+    totals = np.nansum(changes, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.where(counts > 0, totals / counts, np.nan)
+        variances = np.nansum((changes - means[:, None]) ** 2, axis=1) / counts
+    return means, np.where(counts > 0, np.sqrt(variances), np.nan)
+
+
+class CandleStore:
+    """
+    A class that keeps an append-only, memory-mapped candle file per
+    exchange, symbol and period, and fetches only the candles that closed
+    since the last update.
+    """
+
+    def __init__(self, root: str):
+        self.root: str = root
+        self._series: Dict[str, np.memmap] = {}
+
+    def path(self, exchange: str, symbol_id: str, period_id: str) -> str:
+        """
+        Get the file holding a candle series.
+
+        :param exchange: The exchange name.
+        :param symbol_id: The symbol ID.
+        :param period_id: The period ID.
+        :return: The file path.
+        """
+        safe_symbol = re.sub(r"[^A-Za-z0-9_.-]", "_", symbol_id)
+        return os.path.join(self.root, exchange, period_id, f"{safe_symbol}.bin")
+
+    def load(self, exchange: str, symbol_id: str, period_id: str) -> np.ndarray:
+        """
+        Map a candle series into memory without reading it.
+
+        :param exchange: The exchange name.
+        :param symbol_id: The symbol ID.
+        :param period_id: The period ID.
+        :return: The candles, oldest first, as a read-only CANDLE_DTYPE array.
+        """
+        path = self.path(exchange, symbol_id, period_id)
+        size = os.path.getsize(path) // CANDLE_DTYPE.itemsize if os.path.exists(path) else 0
+        series = self._series.get(path)
+        if series is None or len(series) != size:
+            if size == 0:
+                return np.zeros(0, dtype=CANDLE_DTYPE)
+            series = np.memmap(path, dtype=CANDLE_DTYPE, mode="r", shape=(size,))
+            self._series[path] = series
+        return series
+
+    def append(self, exchange: str, symbol_id: str, period_id: str, candles: np.ndarray) -> int:
+        """
+        Append the candles newer than the last stored one.
+
+        :param exchange: The exchange name.
+        :param symbol_id: The symbol ID.
+        :param period_id: The period ID.
+        :param candles: The candles, oldest first.
+        :return: The number of candles appended.
+        """
+        series = self.load(exchange, symbol_id, period_id)
+        if len(series):
+            candles = candles[candles["time"] > series["time"][-1]]
+        if not len(candles):
+            return 0
+        path = self.path(exchange, symbol_id, period_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            f.write(np.ascontiguousarray(candles, dtype=CANDLE_DTYPE).tobytes())
+        return len(candles)
+
+    def missing(self, exchange: str, symbol_id: str, period_id: str, limit: int, now: Optional[float] = None) -> int:
+        """
+        Count the closed candles not stored yet, capped at ``limit``.
+
+        :param exchange: The exchange name.
+        :param symbol_id: The symbol ID.
+        :param period_id: The period ID.
+        :param limit: The number of candles the caller needs.
+        :param now: The current time in seconds (default: the wall clock).
+        :return: The number of candles to fetch.
+        """
+        series = self.load(exchange, symbol_id, period_id)
+        if not len(series):
+            return limit
+        period = PERIOD_SECONDS[period_id]
+        last_closed = (int(now if now is not None else time.time()) // period - 1) * period
+        return int(min(limit, max(0, (last_closed - int(series["time"][-1])) // period)))
+
+    async def update(
+        self, exchange: Exchange, symbol_id: str, period_id: str, limit: int, now: Optional[float] = None
+    ) -> int:
+        """
+        Fetch and append the candles that closed since the last update.
+
+        :param exchange: The exchange.
+        :param symbol_id: The symbol ID.
+        :param period_id: The period ID.
+        :param limit: The number of candles the caller needs.
+        :param now: The current time in seconds (default: the wall clock).
+        :return: The number of candles appended.
+        """
+        count = self.missing(exchange.name, symbol_id, period_id, limit, now)
+        if count == 0:
+            return 0
+        try:
+            rows = await exchange.get_ohlcv_data(symbol_id, period_id, count)
+            candles = parse_candles(rows, period_id, now)
+        except ApiRequestError as e:
+            raise e
+        except Exception as e:
+            raise ApiRequestError(f"Error fetching candles for symbol {symbol_id} on {exchange.name}: {e}")
+        return self.append(exchange.name, symbol_id, period_id, candles)
+
+    async def update_many(
+        self, exchange: Exchange, symbol_ids: List[str], period_id: str, limit: int, now: Optional[float] = None
+    ) -> List[Union[int, Exception]]:
+        """
+        Update many candle series concurrently.
+
+        :return: The number of candles appended per symbol, or the error raised for a symbol.
+        """
+        return await asyncio.gather(
+            *(self.update(exchange, symbol_id, period_id, limit, now) for symbol_id in symbol_ids),
+            return_exceptions=True,
+        )
+
+    def closes(self, exchange: str, symbol_ids: List[str], period_id: str, limit: int) -> np.ndarray:
+        """
+        Stack the last ``limit`` closing prices of many symbols.
+
+        :param exchange: The exchange name.
+        :param symbol_ids: The symbol IDs.
+        :param period_id: The period ID.
+        :param limit: The number of candles per symbol.
+        :return: An (n_symbols, limit) array, left-padded with NaN for shorter histories.
+        """
+        closes = np.full((len(symbol_ids), limit), np.nan)
+        for row, symbol_id in enumerate(symbol_ids):
+            tail = self.load(exchange, symbol_id, period_id)["close"][-limit:]
+            if len(tail):
+                closes[row, limit - len(tail):] = tail
+        return closes
@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.matrix import RateMatrix
+
+log = logging.getLogger(__name__)
+
+
+class CycleCache:
+    """
+    A class that keeps the triangles of the last asset universe as an int32
+    index array, enumerated once per universe change and persisted so the
+    next process starts without enumerating. Registry IDs are assigned in
+    first-seen order and differ between runs, so cycles are stored over the
+    linked assets sorted by name and remapped on every lookup.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path: Optional[str] = path
+        self.key: Optional[str] = None
+        self.cycles: np.ndarray = np.empty((0, 3), dtype=np.int32)
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with np.load(self.path) as data:
+                self.key = str(data["key"])
+                self.cycles = data["cycles"]
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f"Ignoring unreadable cycle cache {self.path}: {e}")
+            self.key, self.cycles = None, np.empty((0, 3), dtype=np.int32)
+
+    def _save(self) -> None:
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as f:
+            np.savez(f, key=np.array(self.key), cycles=self.cycles)
+        os.replace(temporary, self.path)
+
+    @staticmethod
+    def universe(matrix: RateMatrix, roots: Optional[List[str]] = None) -> Tuple[str, np.ndarray]:
+        """
+        Fingerprint which assets are linked, independently of registry IDs.
+
+        :param matrix: The rate matrix.
+        :param roots: Optional start assets.
+        :return: The key and the matrix index of every linked asset in name order.
+        """
+        size = len(matrix)
+        src, dst = np.nonzero(matrix.rates[:size, :size] > 0)
+        linked = np.unique(src)
+        names = np.asarray([matrix.assets[i] for i in linked.tolist()], dtype=str)
+        order = np.argsort(names, kind="stable")
+        nodes = linked[order]
+        rank = np.full(size, -1, dtype=np.int64)
+        rank[nodes] = np.arange(len(nodes))
+        edges = np.sort(rank[src] * len(nodes) + rank[dst])
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update("\n".join(names[order].tolist()).encode())
+        digest.update(b"\0" + "\n".join(roots).encode() if roots is not None else b"")
+        digest.update(edges.tobytes())
+        return digest.hexdigest(), nodes
+
+    def triangles(self, matrix: RateMatrix, roots: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Get every triangle of the matrix, enumerating only when the universe
+        differs from the cached one.
+
+        :param matrix: The rate matrix.
+        :param roots: Optional start assets (e.g. the configured quote assets).
+        :return: An (m, 3) int32 array of asset indices.
+        """
+        key, nodes = self.universe(matrix, roots)
+        if key != self.key:
+            rank = np.full(len(matrix), -1, dtype=np.int32)
+            rank[nodes] = np.arange(len(nodes), dtype=np.int32)
+            self.key = key
+            self.cycles = rank[matrix.triangles(roots)]
+            log.info(f"Enumerated {len(self.cycles)} triangles over {len(nodes)} assets")
+            if self.path is not None:
+                self._save()
+        return nodes.astype(np.int32)[self.cycles]
@@ -0,0 +1,103 @@
+import json
+from typing import Any, List, NamedTuple
+
+import numpy as np
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def decode_json(body: bytes) -> Any:
+    """
+    Decode a JSON response body of unknown shape.
+
+    :param body: The raw response body.
+    :return: The decoded value.
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+if msgspec is not None:
+
+    class Symbol(msgspec.Struct):
+        """
+        A symbol listed on an exchange.
+        """
+
+        base_asset: str
+        quote_asset: str
+        symbol_id: str = ""
+        symbol_type: str = "SPOT"
+
+    class _SymbolsResponse(msgspec.Struct):
+        data: List[Symbol]
+
+    class _ExchangeRate(msgspec.Struct):
+        rate: float
+
+    class _ExchangeRateResponse(msgspec.Struct):
+        data: _ExchangeRate
+
+    class _OhlcvResponse(msgspec.Struct):
+        data: List[List[float]]
+
+    # Decoders validate against the schema while parsing and skip every
+    # field they do not declare, so no intermediate dicts are built.
+    # Non-strict mode accepts numbers sent as strings, as float() did.
+    _symbols_decoder = msgspec.json.Decoder(_SymbolsResponse, strict=False)
+    _exchange_rate_decoder = msgspec.json.Decoder(_ExchangeRateResponse, strict=False)
+    _ohlcv_decoder = msgspec.json.Decoder(_OhlcvResponse, strict=False)
+
+    def decode_symbols(body: bytes) -> List[Symbol]:
+        """Decode a symbols response into the listed symbols."""
+        return _symbols_decoder.decode(body).data
+
+    def decode_exchange_rate(body: bytes) -> float:
+        """Decode an exchange rate response into the rate."""
+        return _exchange_rate_decoder.decode(body).data.rate
+
+    def decode_ohlcv(body: bytes) -> np.ndarray:
+        """Decode an OHLCV response into an (n, k) float array of rows, oldest first."""
+        return np.asarray(_ohlcv_decoder.decode(body).data, dtype=np.float64)
+
+else:
+
+    class Symbol(NamedTuple):
+        """
+        A symbol listed on an exchange.
+        """
+
+        base_asset: str
+        quote_asset: str
+        symbol_id: str = ""
+        symbol_type: str = "SPOT"
+
+    def decode_symbols(body: bytes) -> List[Symbol]:
+        """Decode a symbols response into the listed symbols."""
+        return [
+            Symbol(
+                symbol["base_asset"],
+                symbol["quote_asset"],
+                symbol.get("symbol_id", ""),
+                symbol.get("symbol_type", "SPOT"),
+            )
+            for symbol in decode_json(body)["data"]
+        ]
+
+    def decode_exchange_rate(body: bytes) -> float:
+        """Decode an exchange rate response into the rate."""
+        return float(decode_json(body)["data"]["rate"])
+
+    def decode_ohlcv(body: bytes) -> np.ndarray:
+        """Decode an OHLCV response into an (n, k) float array of rows, oldest first."""
+        return np.asarray(decode_json(body)["data"], dtype=np.float64)
+
@@ -1,22 +1,36 @@
 class ApiRequestError(Exception):
-    """An exception class to represent API request errors.""" 
+    """An exception class to represent API request errors.""" 
 
-    def __init__(self, message: str):
-        """
-        Initialize the ApiRequestError exception with a message. 
+    def __init__(self, message: str):
+        """
+        Initialize the ApiRequestError exception with a message. 
 
-        :param message: The error message.
-        """
-        super().__init__(message)
+        :param message: The error message.
+        """
+        super().__init__(message)
 
 
 class CacheError(Exception):
-    """An exception class to represent cache errors.""" 
+    """An exception class to represent cache errors.""" 
 
-    def __init__(self, message: str):
-        """
-        Initialize the CacheError exception with a message. 
+    def __init__(self, message: str):
+        """
+        Initialize the CacheError exception with a message. 
 
-        :param message: The error message.
-        """
-        super().__init__(message)
+        :param message: The error message.
+        """
+        super().__init__(message)
+
+
+class RateLimitError(ApiRequestError):
+    """An exception class to represent rate-limited (HTTP 429) API requests.""" 
+
+    def __init__(self, message: str, retry_after: float = None):
+        """
+        Initialize the RateLimitError exception with a message. 
+
+        :param message: The error message.
+        :param retry_after: The delay in seconds requested by the Retry-After header, if any.
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
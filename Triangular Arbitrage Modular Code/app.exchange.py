@@ -1,84 +1,157 @@
-from typing import Dict, Union, List, Any 
+import time
+from functools import partial
+from typing import Any, Callable, Dict, List, Tuple, Union
 
-import aiohttp 
+import aiohttp
+import numpy as np
 
-from app.exceptions import ApiRequestError
+from app.decoders import Symbol, decode_exchange_rate, decode_json, decode_ohlcv, decode_symbols
+from app.exceptions import ApiRequestError, RateLimitError
+from app.metrics import metrics
+from app.registry import registry
+from app.scheduler import RequestScheduler
 
 
 class Exchange:
-    """
-    A class that represents an exchange and provides methods for making API requests
-    to the exchange and retrieving market data.
-    """ 
-
-    def __init__(
-        self,
-        name: str,
-        api_key: str,
-        base_url: str,
-        endpoints: Dict[str, str],
-        session: aiohttp.ClientSession,
-    ):
-        self.name: str = name
-        self.api_key: str = api_key
-        self.base_url: str = base_url
-        self.endpoints: Dict[str, str] = endpoints
-        self.session: aiohttp.ClientSession = session
-        self.headers: Dict[str, str] = {"X-API-Key": api_key} 
-
-    async def make_request(self, endpoint: str, params: Dict[str, Union[str, int]]) -> Dict:
-        """
-        Make an API request to the exchange. 
-
-        :param endpoint: The endpoint for the request.
-        :param params: The query parameters for the request.
-        :return: The JSON response as a dictionary.
-        """
-        url = f"{self.base_url}{self.endpoints[endpoint]}"
-        async with self.session.get(url, params=params, headers=self.headers) as response:
-            if response.status != 200:
-                raise ApiRequestError(
-                    f"Request to {url} failed with status {response.status}: {response.reason}."
-                )
-            return await response.json() 
-
-    async def get_symbols(self) -> Dict:
-        """Retrieve symbols for the exchange."""
-        return await self.make_request("symbols", {})
-    async def get_exchange_rate(
-        self, base_asset: str, quote_asset: str, exchange_rate_cache
-    ) -> float:
-        """
-        Retrieve the exchange rate for a given base and quote asset. 
-
-        :param base_asset: The base asset.
-        :param quote_asset: The quote asset.
-        :param exchange_rate_cache: The cache for exchange rates.
-        :return: The exchange rate as a float.
-        """
-        cache_key = f"{self.name}_{base_asset}_{quote_asset}"
-        exchange_rate = await exchange_rate_cache.get(cache_key)
-        if exchange_rate is None:
-            params = {"base_asset": base_asset, "quote_asset": quote_asset}
-            response = await self.make_request("exchangerate", params)
-            exchange_rate = float(response["data"]["rate"])
-            await exchange_rate_cache.set(cache_key, exchange_rate)
-        return exchange_rate 
-
-    async def get_ohlcv_data(
-        self, symbol_id: str, period_id: str, limit: int
-    ) -> Dict:
-        """
-        Retrieve the OHLCV data for a given symbol, period, and limit. 
-
-        :param symbol_id: The symbol ID.
-        :param period_id: The period ID.
-        :param limit: The limit on the number of data points.
-        :return: The JSON response as a dictionary.
-        """
-        query_params = {
-            "symbol_id": symbol_id,
-            "period_id": period_id,
-            "limit": limit,
-        }
-        return await self.make_request("ohlcv", query_params)
+    """
+    A class that represents an exchange and provides methods for making API requests
+    to the exchange and retrieving market data.
+    """ 
+
+    def __init__(
+        self,
+        name: str,
+        api_key: str,
+        base_url: str,
+        endpoints: Dict[str, str],
+        session: aiohttp.ClientSession,
+        scheduler: RequestScheduler = None,
+    ):
+        self.name: str = name
+        self.id: int = registry.exchange_id(name)
+        self.api_key: str = api_key
+        self.base_url: str = base_url
+        self.endpoints: Dict[str, str] = endpoints
+        self.session: aiohttp.ClientSession = session
+        self.scheduler: RequestScheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.headers: Dict[str, str] = {"X-API-Key": api_key} 
+
+    async def make_request(
+        self,
+        endpoint: str,
+        params: Dict[str, Union[str, int]],
+        decoder: Callable[[bytes], Any] = decode_json,
+    ) -> Any:
+        """
+        Make an API request to the exchange, paced by the exchange's request
+        scheduler and retried when rate limited. 
+
+        :param endpoint: The endpoint for the request.
+        :param params: The query parameters for the request.
+        :param decoder: Decodes the raw response body (default: generic JSON).
+        :return: The decoded response.
+        """
+        return await self.scheduler.run(partial(self._request, endpoint, params, decoder))
+
+    async def _request(
+        self, endpoint: str, params: Dict[str, Union[str, int]], decoder: Callable[[bytes], Any]
+    ) -> Any:
+        url = f"{self.base_url}{self.endpoints[endpoint]}"
+        started = time.perf_counter()
+        async with self.session.get(url, params=params, headers=self.headers) as response:
+            metrics.histogram("request_latency_seconds", exchange=self.name, endpoint=endpoint).record(
+                time.perf_counter() - started
+            )
+            metrics.counter("requests_total", exchange=self.name, endpoint=endpoint, status=str(response.status)).inc()
+            if response.status == 429:
+                retry_after = response.headers.get("Retry-After")
+                raise RateLimitError(
+                    f"Request to {url} was rate limited.",
+                    float(retry_after) if retry_after and retry_after.isdigit() else None,
+                )
+            if response.status != 200:
+                raise ApiRequestError(
+                    f"Request to {url} failed with status {response.status}: {response.reason}."
+                )
+            body = await response.read()
+        try:
+            return decoder(body)
+        except (ValueError, KeyError, TypeError) as e:
+            raise ApiRequestError(f"Invalid response from {url}: {e}")
+
+    async def get_symbols(self) -> List[Symbol]:
+        """Retrieve symbols for the exchange."""
+        return await self.make_request("symbols", {}, decode_symbols)
+
+    async def get_exchange_rate(
+        self, base_asset: str, quote_asset: str, exchange_rate_cache
+    ) -> float:
+        """
+        Retrieve the exchange rate for a given base and quote asset. 
+
+        :param base_asset: The base asset.
+        :param quote_asset: The quote asset.
+        :param exchange_rate_cache: The cache for exchange rates.
+        :return: The exchange rate as a float.
+        """
+        pair_id = self.pair_id(base_asset, quote_asset)
+        return float(
+            await exchange_rate_cache.get_or_load(
+                registry.cache_key(pair_id), lambda: self._fetch_exchange_rate(base_asset, quote_asset)
+            )
+        )
+
+    def pair_id(self, base_asset: str, quote_asset: str) -> int:
+        """
+        Get the registry ID of a base and quote asset pair on this exchange. 
+
+        :param base_asset: The base asset.
+        :param quote_asset: The quote asset.
+        :return: The pair ID.
+        """
+        return registry.pair_id(self.id, registry.token_id(base_asset), registry.token_id(quote_asset))
+
+    async def get_exchange_rates(
+        self, pair_ids: List[int], exchange_rate_cache
+    ) -> List[Union[float, Exception]]:
+        """
+        Retrieve the exchange rates for many pairs, reading and writing the
+        cache in one round-trip each. 
+
+        :param pair_ids: The registry IDs of the pairs on this exchange.
+        :param exchange_rate_cache: The cache for exchange rates.
+        :return: The exchange rates in pair order, or the exception raised for a pair.
+        """
+        loaders = {}
+        for pair_id in pair_ids:
+            _, base_id, quote_id = registry.pair(pair_id)
+            loaders[registry.cache_key(pair_id)] = partial(
+                self._fetch_exchange_rate, registry.token(base_id), registry.token(quote_id)
+            )
+        exchange_rates = await exchange_rate_cache.get_or_load_many(loaders)
+        return [
+            exchange_rate if isinstance(exchange_rate, Exception) else float(exchange_rate)
+            for exchange_rate in exchange_rates
+        ]
+
+    async def _fetch_exchange_rate(self, base_asset: str, quote_asset: str) -> float:
+        params = {"base_asset": base_asset, "quote_asset": quote_asset}
+        return await self.make_request("exchangerate", params, decode_exchange_rate)
+
+    async def get_ohlcv_data(
+        self, symbol_id: str, period_id: str, limit: int
+    ) -> np.ndarray:
+        """
+        Retrieve the OHLCV data for a given symbol, period, and limit. 
+
+        :param symbol_id: The symbol ID.
+        :param period_id: The period ID.
+        :param limit: The limit on the number of data points.
+        :return: The OHLCV rows, oldest first, as an (n, k) float array.
+        """
+        query_params = {
+            "symbol_id": symbol_id,
+            "period_id": period_id,
+            "limit": limit,
+        }
+        return await self.make_request("ohlcv", query_params, decode_ohlcv)
@@ -0,0 +1,223 @@
+import json
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.matrix import RateMatrix
+from app.registry import Interner
+
+# One fixed-width record per opportunity. Token and exchange IDs index the
+# log's own name tables, which are persisted next to it, so they stay valid
+# across restarts even though registry IDs do not.
+OPPORTUNITY_DTYPE = np.dtype(
+    [
+        ("time", "<i8"),
+        ("assets", "<i4", (3,)),
+        ("exchanges", "<i4", (3,)),
+        ("quote_asset_amount", "<f8"),
+        ("profit_percentage", "<f8"),
+    ]
+)
+TIME_DTYPE = np.dtype("<i8")
+
+
+class OpportunityLog:
+    """
+    A class that keeps an append-only, memory-mapped log of every profitable
+    triangle found, with the record times duplicated into a contiguous index
+    file so a time range is located with a binary search that touches only a
+    handful of pages. Record times are in microseconds and never decrease.
+    """
+
+    def __init__(self, root: str):
+        self.root: str = root
+        self.records_path: str = os.path.join(root, "opportunities.bin")
+        self.index_path: str = os.path.join(root, "time.idx")
+        self.names_path: str = os.path.join(root, "names.json")
+        self.tokens: Interner[str] = Interner()
+        self.exchanges: Interner[str] = Interner()
+        self._records: Optional[np.memmap] = None
+        self._times: Optional[np.memmap] = None
+        os.makedirs(root, exist_ok=True)
+        if os.path.exists(self.names_path):
+            with open(self.names_path) as f:
+                names = json.load(f)
+            for token in names["tokens"]:
+                self.tokens.intern(token)
+            for exchange in names["exchanges"]:
+                self.exchanges.intern(exchange)
+        self._repair()
+
+    def _count(self, path: str, itemsize: int) -> int:
+        return os.path.getsize(path) // itemsize if os.path.exists(path) else 0
+
+    def _repair(self) -> None:
+        # Records are written before their index entries, so after a crash
+        # between the two writes both files are cut back to what they share.
+        count = min(
+            self._count(self.records_path, OPPORTUNITY_DTYPE.itemsize),
+            self._count(self.index_path, TIME_DTYPE.itemsize),
+        )
+        for path, itemsize in ((self.records_path, OPPORTUNITY_DTYPE.itemsize), (self.index_path, TIME_DTYPE.itemsize)):
+            if os.path.exists(path) and os.path.getsize(path) != count * itemsize:
+                os.truncate(path, count * itemsize)
+
+    def __len__(self) -> int:
+        return self._count(self.index_path, TIME_DTYPE.itemsize)
+
+    def _save_names(self) -> None:
+        path = self.names_path + ".tmp"
+        with open(path, "w") as f:
+            json.dump({"tokens": self.tokens.values, "exchanges": self.exchanges.values}, f)
+        os.replace(path, self.names_path)
+
+    def records(self) -> np.ndarray:
+        """
+        Map the log into memory without reading it.
+
+        :return: Every record, oldest first, as a read-only OPPORTUNITY_DTYPE array.
+        """
+        size = len(self)
+        if size == 0:
+            return np.zeros(0, dtype=OPPORTUNITY_DTYPE)
+        if self._records is None or len(self._records) != size:
+            self._records = np.memmap(self.records_path, dtype=OPPORTUNITY_DTYPE, mode="r", shape=(size,))
+        return self._records
+
+    def times(self) -> np.ndarray:
+        """
+        Map the time index into memory without reading it.
+
+        :return: The record times in microseconds, oldest first.
+        """
+        size = len(self)
+        if size == 0:
+            return np.zeros(0, dtype=TIME_DTYPE)
+        if self._times is None or len(self._times) != size:
+            self._times = np.memmap(self.index_path, dtype=TIME_DTYPE, mode="r", shape=(size,))
+        return self._times
+
+    def append(
+        self,
+        matrix: RateMatrix,
+        cycles: np.ndarray,
+        profits: np.ndarray,
+        quote_asset_amount: float,
+        now: Optional[float] = None,
+    ) -> int:
+        """
+        Append scored triangles to the log.
+
+        :param matrix: The rate matrix the triangles were scored on.
+        :param cycles: An (m, 3) array of asset indices.
+        :param profits: The m profit percentages.
+        :param quote_asset_amount: The amount of quote asset traded.
+        :param now: The time the triangles were found, in seconds (default: the wall clock).
+        :return: The number of records appended.
+        """
+        if not len(profits):
+            return 0
+        cycles = np.asarray(cycles, dtype=np.intp)
+        venues = matrix.venue_ids[cycles, np.roll(cycles, -1, axis=1)]
+        known = (len(self.tokens), len(self.exchanges))
+        asset_ids, asset_inverse = np.unique(cycles, return_inverse=True)
+        venue_ids, venue_inverse = np.unique(venues, return_inverse=True)
+        asset_map = np.array([self.tokens.intern(matrix.assets[i]) for i in asset_ids.tolist()], dtype=np.int32)
+        venue_map = np.array([self.exchanges.intern(matrix.venues[i]) for i in venue_ids.tolist()], dtype=np.int32)
+        if (len(self.tokens), len(self.exchanges)) != known:
+            self._save_names()
+
+        times = self.times()
+        stamp = int((now if now is not None else time.time()) * 1e6)
+        if len(times):
+            stamp = max(stamp, int(times[-1]))
+        records = np.zeros(len(profits), dtype=OPPORTUNITY_DTYPE)
+        records["time"] = stamp
+        records["assets"] = asset_map[asset_inverse.reshape(cycles.shape)]
+        records["exchanges"] = venue_map[venue_inverse.reshape(venues.shape)]
+        records["quote_asset_amount"] = quote_asset_amount
+        records["profit_percentage"] = profits
+        with open(self.records_path, "ab") as f:
+            f.write(records.tobytes())
+        with open(self.index_path, "ab") as f:
+            f.write(records["time"].astype(TIME_DTYPE).tobytes())
+        return len(records)
+
+    def between(self, start: float, end: Optional[float] = None) -> np.ndarray:
+        """
+        Get the records found in a time range.
+
+        :param start: The start of the range in seconds, inclusive.
+        :param end: The end of the range in seconds, exclusive (default: no end).
+        :return: The records, oldest first, as a read-only view into the log.
+        """
+        times = self.times()
+        lower = int(np.searchsorted(times, int(start * 1e6), side="left"))
+        upper = len(times) if end is None else int(np.searchsorted(times, int(end * 1e6), side="left"))
+        return self.records()[lower:upper]
+
+    def last_hours(self, hours: float, now: Optional[float] = None) -> np.ndarray:
+        """
+        Get the records found in the last ``hours`` hours.
+
+        :param hours: The number of hours.
+        :param now: The current time in seconds (default: the wall clock).
+        :return: The records, oldest first.
+        """
+        now = now if now is not None else time.time()
+        return self.between(now - hours * 3600, None)
+
+    def pair_counts(self, hours: float, now: Optional[float] = None) -> pd.DataFrame:
+        """
+        Count how many opportunities used each pair as a leg in the last
+        ``hours`` hours.
+
+        :param hours: The number of hours.
+        :param now: The current time in seconds (default: the wall clock).
+        :return: One row per exchange, base and quote asset with the number of
+            opportunities and their mean profit percentage, most frequent first.
+        """
+        records = self.last_hours(hours, now)
+        columns = ["exchange", "base_asset", "quote_asset", "opportunities", "mean_profit_percentage"]
+        if not len(records):
+            return pd.DataFrame(columns=columns)
+        assets = np.asarray(records["assets"], dtype=np.int64)
+        legs = np.stack(
+            [np.asarray(records["exchanges"], dtype=np.int64), assets, np.roll(assets, -1, axis=1)], axis=-1
+        ).reshape(-1, 3)
+        profits = np.repeat(np.asarray(records["profit_percentage"]), 3)
+        pairs, inverse, counts = np.unique(legs, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        means = np.bincount(inverse, weights=profits) / counts
+        order = np.argsort(-counts, kind="stable")
+        return pd.DataFrame(
+            {
+                "exchange": [self.exchanges.values[i] for i in pairs[order, 0].tolist()],
+                "base_asset": [self.tokens.values[i] for i in pairs[order, 1].tolist()],
+                "quote_asset": [self.tokens.values[i] for i in pairs[order, 2].tolist()],
+                "opportunities": counts[order],
+                "mean_profit_percentage": means[order],
+            },
+            columns=columns,
+        )
+
+    def to_frame(self, records: np.ndarray) -> pd.DataFrame:
+        """
+        Turn log records into the trade records ``describe_triangles`` produces.
+
+        :param records: Records from the log.
+        :return: One row per record, with its time.
+        """
+        assets = np.asarray(records["assets"])
+        exchanges = np.asarray(records["exchanges"])
+        frame = {"time": pd.to_datetime(np.asarray(records["time"]), unit="us")}
+        for column, name in enumerate("abc"):
+            frame[f"asset_{name}"] = [self.tokens.values[i] for i in assets[:, column].tolist()]
+        for column, name in enumerate("abc"):
+            frame[f"exchange_{name}"] = [self.exchanges.values[i] for i in exchanges[:, column].tolist()]
+        frame["quote_asset_amount"] = np.asarray(records["quote_asset_amount"])
+        frame["profit_percentage"] = np.asarray(records["profit_percentage"])
+        return pd.DataFrame(frame)
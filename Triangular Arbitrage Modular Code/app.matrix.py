@@ -0,0 +1,226 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.registry import Registry, registry as default_registry
+
+
+def enumerate_triangles(linked: np.ndarray, starts: np.ndarray, rooted: bool, block_size: int = 32) -> np.ndarray:
+    """
+    Enumerate every triangle a -> b -> c -> a with a in ``starts`` whose three
+    legs are linked. Start assets are broadcast in blocks of ``block_size``
+    rows so memory stays bounded at block_size * n * n.
+
+    :param linked: An (n, n) boolean adjacency matrix.
+    :param starts: The start asset indices.
+    :param rooted: Whether the starts are fixed roots; otherwise each cycle is
+        kept only in the rotation starting at its smallest index.
+    :param block_size: The number of start assets per broadcast.
+    :return: An (m, 3) array of asset indices.
+    """
+    cycles = [np.empty((0, 3), dtype=np.intp)]
+    for offset in range(0, len(starts), block_size):
+        block = starts[offset:offset + block_size]
+        closed = linked[block][:, :, None] & linked[None, :, :] & linked[:, block].T[:, None, :]
+        a, b, c = np.nonzero(closed)
+        a = block[a]
+        if not rooted:
+            # Every rotation of a cycle is found; keep the one rooted at its smallest index.
+            keep = (b > a) & (c > a)
+            a, b, c = a[keep], b[keep], c[keep]
+        cycles.append(np.stack([a, b, c], axis=1))
+    return np.concatenate(cycles)
+
+
+def score_cycles(rates: np.ndarray, cycles: np.ndarray) -> np.ndarray:
+    """
+    Score an (m, k) array of asset index cycles in one vectorized pass.
+
+    :param rates: The rate matrix.
+    :param cycles: The cycles to score.
+    :return: The m profit percentages.
+    """
+    legs = rates[cycles, np.roll(cycles, -1, axis=1)]
+    return legs.prod(axis=1) - 1.0
+
+
+class RateMatrix:
+    """
+    A class that represents a dense exchange rate matrix over all assets seen
+    in a tick and scores every triangle with NumPy broadcasts. Rows, columns
+    and venues are the registry's token and exchange IDs.
+    """
+
+    def __init__(self, capacity: int = 64, registry: Optional[Registry] = None):
+        self.registry: Registry = registry if registry is not None else default_registry
+        self.size: int = 0
+        self.quotes: Dict[Tuple[int, int], Dict[int, float]] = {}
+        self.rates: np.ndarray = np.zeros((capacity, capacity), dtype=np.float64)
+        self.venue_ids: np.ndarray = np.full((capacity, capacity), -1, dtype=np.int16)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def assets(self) -> List[str]:
+        return self.registry.tokens.values
+
+    @property
+    def venues(self) -> List[str]:
+        return self.registry.exchanges.values
+
+    def asset_id(self, asset: str) -> int:
+        """
+        Get the row/column index of an asset, growing the matrix if needed.
+
+        :param asset: The asset ID.
+        :return: The asset index.
+        """
+        asset_id = self.registry.token_id(asset)
+        self._reserve(asset_id)
+        return asset_id
+
+    def venue_id(self, venue: str) -> int:
+        return self.registry.exchange_id(venue)
+
+    def _reserve(self, asset_id: int) -> None:
+        if asset_id >= self.size:
+            self.size = asset_id + 1
+            capacity = self.rates.shape[0]
+            if self.size > capacity:
+                while capacity < self.size:
+                    capacity *= 2
+                self._grow(capacity)
+
+    def _grow(self, capacity: int) -> None:
+        size = self.rates.shape[0]
+        rates = np.zeros((capacity, capacity), dtype=np.float64)
+        venue_ids = np.full((capacity, capacity), -1, dtype=np.int16)
+        rates[:size, :size] = self.rates
+        venue_ids[:size, :size] = self.venue_ids
+        self.rates, self.venue_ids = rates, venue_ids
+
+    def set_rate(self, base_asset: str, quote_asset: str, rate: float, venue: str) -> List[Tuple[int, int, float]]:
+        """
+        Record the rate for converting one base asset into quote assets on a
+        venue.
+
+        :param base_asset: The base asset.
+        :param quote_asset: The quote asset.
+        :param rate: Units of quote asset received per unit of base asset.
+        :param venue: The exchange name.
+        :return: (src, dst, previous rate) for every cell whose best rate changed.
+        """
+        return self.set_rate_ids(self.asset_id(base_asset), self.asset_id(quote_asset), rate, self.venue_id(venue))
+
+    def set_rate_ids(self, base_id: int, quote_id: int, rate: float, venue_id: int) -> List[Tuple[int, int, float]]:
+        """
+        Record the rate for converting one base token into quote tokens on a
+        venue, by registry ID. The inverse direction is filled in as 1 / rate.
+        Each cell holds the best rate per direction across venues.
+
+        :param base_id: The base token ID.
+        :param quote_id: The quote token ID.
+        :param rate: Units of quote token received per unit of base token.
+        :param venue_id: The exchange ID.
+        :return: (src, dst, previous rate) for every cell whose best rate changed.
+        """
+        if rate <= 0:
+            return []
+        self._reserve(max(base_id, quote_id))
+        changed = []
+        for src, dst, value in ((base_id, quote_id, rate), (quote_id, base_id, 1.0 / rate)):
+            venue_quotes = self.quotes.setdefault((src, dst), {})
+            venue_quotes[venue_id] = value
+            best_venue = max(venue_quotes, key=venue_quotes.get)
+            best = venue_quotes[best_venue]
+            previous = self.rates[src, dst]
+            if best != previous or best_venue != self.venue_ids[src, dst]:
+                self.rates[src, dst] = best
+                self.venue_ids[src, dst] = best_venue
+                changed.append((src, dst, float(previous)))
+        return changed
+
+    def remove_rate_ids(self, base_id: int, quote_id: int, venue_id: int) -> List[Tuple[int, int, float]]:
+        """
+        Withdraw a venue's quote for a base/quote pair in both directions. Each
+        cell falls back to the best remaining venue, or to no rate.
+
+        :param base_id: The base token ID.
+        :param quote_id: The quote token ID.
+        :param venue_id: The exchange ID.
+        :return: (src, dst, previous rate) for every cell whose best rate changed.
+        """
+        changed = []
+        for src, dst in ((base_id, quote_id), (quote_id, base_id)):
+            venue_quotes = self.quotes.get((src, dst))
+            if not venue_quotes or venue_quotes.pop(venue_id, None) is None:
+                continue
+            best_venue = max(venue_quotes, key=venue_quotes.get) if venue_quotes else -1
+            best = venue_quotes.get(best_venue, 0.0)
+            previous = self.rates[src, dst]
+            if best != previous or best_venue != self.venue_ids[src, dst]:
+                self.rates[src, dst] = best
+                self.venue_ids[src, dst] = best_venue
+                changed.append((src, dst, float(previous)))
+        return changed
+
+    def venue_pairs(self, venue_id: int) -> List[Tuple[int, int]]:
+        """
+        Get every cell a venue currently quotes, both directions of each pair.
+
+        :param venue_id: The exchange ID.
+        :return: The (src, dst) cells.
+        """
+        return [cell for cell, venue_quotes in self.quotes.items() if venue_id in venue_quotes]
+
+    def triangles(self, roots: Optional[List[str]] = None, block_size: int = 32) -> np.ndarray:
+        """
+        Enumerate every triangle a -> b -> c -> a whose three legs have a rate.
+        Start assets are broadcast in blocks of ``block_size`` rows so memory
+        stays bounded at block_size * n * n.
+
+        :param roots: Optional start assets (e.g. the configured quote assets).
+        :param block_size: The number of start assets per broadcast.
+        :return: An (m, 3) array of asset indices.
+        """
+        size = len(self)
+        linked = self.rates[:size, :size] > 0
+        return enumerate_triangles(linked, self.start_ids(roots), roots is not None, block_size)
+
+    def start_ids(self, roots: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Get the indices of the start assets, or of every asset without roots.
+
+        :param roots: Optional start assets.
+        :return: The start asset indices.
+        """
+        if roots is None:
+            return np.arange(len(self))
+        index = self.registry.tokens.ids
+        return np.array([index[root] for root in roots if index.get(root, self.size) < self.size], dtype=np.intp)
+
+    def triangle_profits(
+        self, profit_threshold: float, roots: Optional[List[str]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every triangle at once as R[a, b] * R[b, c] * R[c, a] and keep
+        those above the threshold.
+
+        :param profit_threshold: The minimum profit percentage.
+        :param roots: Optional start assets (e.g. the configured quote assets).
+        :return: An (m, 3) array of asset indices and the m profit percentages.
+        """
+        cycles = self.triangles(roots)
+        profits = self.cycle_profits(cycles)
+        keep = profits > profit_threshold
+        return cycles[keep], profits[keep]
+
+    def cycle_profits(self, cycles: np.ndarray) -> np.ndarray:
+        """
+        Score an (m, k) array of asset index cycles in one vectorized pass.
+
+        :param cycles: The cycles to score.
+        :return: The m profit percentages.
+        """
+        return score_cycles(self.rates, cycles)
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+# Log-linear buckets as in HdrHistogram: 16 sub-buckets per power of two
+# keeps every recorded value within ~6% of its true value.
+SUB_BUCKET_BITS = 5
+SUB_BUCKET_HALF = 1 << (SUB_BUCKET_BITS - 1)
+BUCKET_COUNT = 64 * SUB_BUCKET_HALF
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    A class that records latencies in microseconds into fixed log-linear
+    buckets, so recording is O(1) with no allocation and quantiles are read
+    without keeping samples.
+    """
+
+    def __init__(self):
+        self.counts: List[int] = [0] * BUCKET_COUNT
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    @staticmethod
+    def _index(micros: int) -> int:
+        if micros < 2 * SUB_BUCKET_HALF:
+            return micros
+        shift = micros.bit_length() - SUB_BUCKET_BITS
+        return (shift << (SUB_BUCKET_BITS - 1)) + (micros >> shift)
+
+    @staticmethod
+    def _lower_bound(index: int) -> int:
+        if index < 2 * SUB_BUCKET_HALF:
+            return index
+        shift = index // SUB_BUCKET_HALF - 1
+        return (index % SUB_BUCKET_HALF + SUB_BUCKET_HALF) << shift
+
+    def record(self, seconds: float) -> None:
+        """
+        Record one observation.
+
+        :param seconds: The latency in seconds.
+        """
+        self.counts[min(self._index(max(0, int(seconds * 1e6))), BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile from the buckets.
+
+        :param q: The quantile, between 0 and 1.
+        :return: The quantile in seconds (the midpoint of its bucket).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                lower = self._lower_bound(index)
+                upper = self._lower_bound(index + 1)
+                return min(self.max, (lower + upper) / 2e6)
+        return self.max
+
+
+class Counter:
+    """
+    A class that holds a monotonically increasing count.
+    """
+
+    def __init__(self):
+        self.value: float = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Metrics:
+    """
+    A class that holds every counter and latency histogram of the process,
+    keyed by metric name and labels, and renders them in the Prometheus text
+    format or as a log summary.
+    """
+
+    def __init__(self, prefix: str = "arbitrage"):
+        self.prefix: str = prefix
+        self.counters: Dict[Tuple[str, Labels], Counter] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        """
+        Get a counter, creating it on first use. Hot paths should keep the
+        returned object instead of looking it up per event.
+
+        :param name: The metric name.
+        :param labels: The metric labels.
+        :return: The counter.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = Counter()
+        return counter
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        """
+        Get a latency histogram, creating it on first use.
+
+        :param name: The metric name.
+        :param labels: The metric labels.
+        :return: The histogram.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """
+        Record the time spent in a block into a histogram.
+
+        :param name: The metric name.
+        :param labels: The metric labels.
+        """
+        histogram = self.histogram(name, **labels)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.record(time.perf_counter() - started)
+
+    def hit_ratio(self, name: str, **labels: str) -> Optional[float]:
+        """
+        Get the share of ``result="hit"`` among a counter's hit and miss series.
+
+        :param name: The counter name.
+        :param labels: The other labels of the series.
+        :return: The hit ratio, or None before the first lookup.
+        """
+        hits = self.counter(name, result="hit", **labels).value
+        misses = self.counter(name, result="miss", **labels).value
+        return hits / (hits + misses) if hits + misses else None
+
+    @staticmethod
+    def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+        Histograms are exposed as summaries with fixed quantiles.
+
+        :return: The exposition text.
+        """
+        lines = []
+        typed = set()
+        for (name, labels), counter in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{self._format_labels(labels)} {counter.value}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} summary")
+                typed.add(metric)
+            for q in QUANTILES:
+                lines.append(f"{metric}{self._format_labels(labels, (('quantile', str(q)),))} {histogram.quantile(q)}")
+            lines.append(f"{metric}_sum{self._format_labels(labels)} {histogram.total}")
+            lines.append(f"{metric}_count{self._format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """
+        Summarize the latency histograms in one line each.
+
+        :return: The summary text.
+        """
+        lines = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if not histogram.count:
+                continue
+            lines.append(
+                f"{name}{self._format_labels(labels)} n={histogram.count} "
+                f"p50={histogram.quantile(0.5) * 1e3:.1f}ms p99={histogram.quantile(0.99) * 1e3:.1f}ms "
+                f"max={histogram.max * 1e3:.1f}ms"
+            )
+        return "\n".join(lines)
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 9100) -> web.AppRunner:
+        """
+        Serve the Prometheus text format at ``/metrics``.
+
+        :param host: The interface to listen on.
+        :param port: The port to listen on.
+        :return: The running app runner; clean it up to stop serving.
+        """
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    async def log_periodically(self, interval: float) -> None:
+        """
+        Log the latency summary every ``interval`` seconds until cancelled.
+
+        :param interval: The interval in seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            summary = self.summary()
+            if summary:
+                log.info(f"Latency summary:\n{summary}")
+
+
+metrics = Metrics()
@@ -0,0 +1,129 @@
+from typing import Dict, Generic, Hashable, List, Tuple, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+
+class Interner(Generic[T]):
+    """
+    A class that maps values to dense integer IDs in first-seen order.
+    """
+
+    def __init__(self):
+        self.ids: Dict[T, int] = {}
+        self.values: List[T] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __contains__(self, value: T) -> bool:
+        return value in self.ids
+
+    def intern(self, value: T) -> int:
+        """
+        Get the ID of a value, assigning the next one if it is new.
+
+        :param value: The value.
+        :return: The integer ID.
+        """
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.ids[value] = value_id
+            self.values.append(value)
+        return value_id
+
+
+class Registry:
+    """
+    A class that interns exchanges, tokens and pairs to dense integer IDs so
+    the hot path keys dictionaries and arrays on ints instead of rebuilding
+    and hashing strings. Tokens are interned by the asset ID the exchange
+    API lists them under (e.g. "BTC"); the API provides no contract
+    addresses, so every venue's "BTC" is the same token. Each pair's cache
+    key is built once, when the pair is first seen.
+    """
+
+    def __init__(self):
+        self.exchanges: Interner[str] = Interner()
+        self.tokens: Interner[str] = Interner()
+        self.pairs: Interner[Tuple[int, int, int]] = Interner()
+        self.cache_keys: List[str] = []
+        self._keys: Dict[Tuple, str] = {}
+
+    def exchange_id(self, name: str) -> int:
+        """
+        Get the ID of an exchange.
+
+        :param name: The exchange name.
+        :return: The exchange ID.
+        """
+        return self.exchanges.intern(name)
+
+    def token_id(self, token: str) -> int:
+        """
+        Get the ID of a token.
+
+        :param token: The token's asset ID.
+        :return: The token ID.
+        """
+        return self.tokens.intern(token)
+
+    def pair_id(self, exchange_id: int, base_id: int, quote_id: int) -> int:
+        """
+        Get the ID of a base/quote pair on an exchange.
+
+        :param exchange_id: The exchange ID.
+        :param base_id: The base token ID.
+        :param quote_id: The quote token ID.
+        :return: The pair ID.
+        """
+        key = (exchange_id, base_id, quote_id)
+        pair_id = self.pairs.ids.get(key)
+        if pair_id is None:
+            pair_id = self.pairs.intern(key)
+            # Same layout as the keys written before the registry, so entries
+            # already in Redis stay valid.
+            self.cache_keys.append(
+                f"{self.exchanges.values[exchange_id]}_{self.tokens.values[base_id]}_{self.tokens.values[quote_id]}"
+            )
+        return pair_id
+
+    def pair(self, pair_id: int) -> Tuple[int, int, int]:
+        """
+        Get the exchange, base token and quote token IDs of a pair.
+
+        :param pair_id: The pair ID.
+        :return: The (exchange ID, base token ID, quote token ID) tuple.
+        """
+        return self.pairs.values[pair_id]
+
+    def cache_key(self, pair_id: int) -> str:
+        """
+        Get the cache key of a pair's exchange rate.
+
+        :param pair_id: The pair ID.
+        :return: The cache key.
+        """
+        return self.cache_keys[pair_id]
+
+    def key(self, *parts: Hashable) -> str:
+        """
+        Get the cache key joining ``parts`` with underscores, built once per
+        distinct tuple of parts.
+
+        :param parts: The key parts.
+        :return: The cache key.
+        """
+        key = self._keys.get(parts)
+        if key is None:
+            key = self._keys[parts] = "_".join(map(str, parts))
+        return key
+
+    def exchange(self, exchange_id: int) -> str:
+        return self.exchanges.values[exchange_id]
+
+    def token(self, token_id: int) -> str:
+        return self.tokens.values[token_id]
+
+
+registry = Registry()
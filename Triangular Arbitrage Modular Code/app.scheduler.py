@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+from app.exceptions import RateLimitError
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    A class that allows ``rate`` requests per second on average with bursts
+    of up to ``burst`` requests.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate: float = rate
+        self.burst: int = burst
+        self.tokens: float = float(burst)
+        self.updated: float = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def pause(self, delay: float) -> None:
+        """
+        Hold back every request for at least ``delay`` seconds.
+
+        :param delay: The delay in seconds.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - delay * self.rate
+
+
+class AdaptiveLimiter:
+    """
+    A class that bounds the number of requests in flight and adapts the bound
+    with additive increase / multiplicative decrease: a fast success grows it
+    by about one slot per round of requests, a rate-limited request halves it
+    and a slow request trims it by 10%.
+    """
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64, target_latency: float = 2.0):
+        self.limit: float = float(initial)
+        self.min_limit: int = min_limit
+        self.max_limit: int = max_limit
+        self.target_latency: float = target_latency
+        self.in_flight: int = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """Wait until a concurrency slot is free and take it."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float, throttled: bool = False) -> None:
+        """
+        Give back a concurrency slot and adapt the limit.
+
+        :param latency: The request latency in seconds.
+        :param throttled: Whether the request was rate limited.
+        """
+        if throttled:
+            self.limit = max(self.min_limit, self.limit / 2)
+        elif latency > self.target_latency:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+
+class RequestScheduler:
+    """
+    A class that schedules the requests to one exchange through a token
+    bucket and an adaptive concurrency limit, and retries rate-limited
+    requests with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 20,
+        initial_concurrency: int = 8,
+        max_concurrency: int = 64,
+        target_latency: float = 2.0,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(initial_concurrency, 1, max_concurrency, target_latency)
+        self.max_retries: int = max_retries
+        self.backoff: float = backoff
+
+    async def run(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run a request once a rate token and a concurrency slot are free.
+
+        :param request: A callable returning the request coroutine.
+        :return: The request result.
+        :raises RateLimitError: If the request is still rate limited after every retry.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            await self.limiter.acquire()
+            started = time.monotonic()
+            throttled = False
+            try:
+                return await request()
+            except RateLimitError as e:
+                throttled = True
+                if attempt == self.max_retries:
+                    raise
+                delay = e.retry_after or self.backoff * 2 ** attempt * (1 + random.random())
+            finally:
+                await self.limiter.release(time.monotonic() - started, throttled)
+            self.bucket.pause(delay)
+            log.warning(f"Rate limited, retrying in {delay:.2f}s (concurrency limit {self.limiter.limit:.1f})")
+            await asyncio.sleep(delay)
@@ -0,0 +1,143 @@
+import logging
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.cycles import CycleCache
+from app.matrix import RateMatrix
+
+log = logging.getLogger(__name__)
+
+
+class IncrementalScorer:
+    """
+    A class that keeps every triangle's profit up to date across ticks and
+    re-evaluates only the triangles that use a rate which changed. The
+    triangles come from a cycle cache, so a restart with the same asset
+    universe does not enumerate them again.
+    """
+
+    def __init__(
+        self,
+        matrix: Optional[RateMatrix] = None,
+        roots: Optional[List[str]] = None,
+        cycle_cache: Optional[CycleCache] = None,
+    ):
+        self.matrix: RateMatrix = matrix if matrix is not None else RateMatrix()
+        self.roots: Optional[List[str]] = roots
+        self.cycle_cache: CycleCache = cycle_cache if cycle_cache is not None else CycleCache()
+        self.cycles: np.ndarray = np.empty((0, 3), dtype=np.int32)
+        self.profits: np.ndarray = np.empty(0, dtype=np.float64)
+        self._stride: int = 0
+        self._edge_keys: np.ndarray = np.empty(0, dtype=np.int64)
+        self._edge_cycles: np.ndarray = np.empty(0, dtype=np.intp)
+        self._changed: Set[Tuple[int, int]] = set()
+        self._topology_changed: bool = True
+
+    def update(self, base_asset: str, quote_asset: str, rate: float, venue: str) -> None:
+        """
+        Apply one rate observation and remember which matrix cells it changed.
+
+        :param base_asset: The base asset.
+        :param quote_asset: The quote asset.
+        :param rate: Units of quote asset received per unit of base asset.
+        :param venue: The exchange name.
+        """
+        self._record(self.matrix.set_rate(base_asset, quote_asset, rate, venue))
+
+    def update_ids(self, base_id: int, quote_id: int, rate: float, venue_id: int) -> None:
+        """
+        Apply one rate observation by registry ID.
+
+        :param base_id: The base token ID.
+        :param quote_id: The quote token ID.
+        :param rate: Units of quote token received per unit of base token.
+        :param venue_id: The exchange ID.
+        """
+        self._record(self.matrix.set_rate_ids(base_id, quote_id, rate, venue_id))
+
+    def remove_ids(self, base_id: int, quote_id: int, venue_id: int) -> None:
+        """
+        Withdraw a venue's quote for a pair by registry ID. Triangles left
+        without a leg score -100% until the pair is quoted again.
+
+        :param base_id: The base token ID.
+        :param quote_id: The quote token ID.
+        :param venue_id: The exchange ID.
+        """
+        self._record(self.matrix.remove_rate_ids(base_id, quote_id, venue_id))
+
+    def _record(self, changes: List[Tuple[int, int, float]]) -> None:
+        for src, dst, previous in changes:
+            if previous == 0.0:
+                # A new asset or a new leg can close triangles that do not exist yet.
+                self._topology_changed = True
+            else:
+                self._changed.add((src, dst))
+
+    def _rebuild(self) -> None:
+        self.cycles = self.cycle_cache.triangles(self.matrix, self.roots)
+        self.profits = self.matrix.cycle_profits(self.cycles)
+        self._stride = len(self.matrix)
+        legs = np.concatenate([self.cycles, self.cycles[:, :1]], axis=1)
+        keys = (legs[:, :-1].astype(np.int64) * self._stride + legs[:, 1:]).ravel()
+        owners = np.repeat(np.arange(len(self.cycles)), 3)
+        order = np.argsort(keys, kind="stable")
+        self._edge_keys = keys[order]
+        self._edge_cycles = owners[order]
+
+    def cycles_using(self, cells: List[Tuple[int, int]]) -> np.ndarray:
+        """
+        Look up the triangles that use any of the given matrix cells.
+
+        :param cells: The (src, dst) cells.
+        :return: The sorted, unique triangle ids.
+        """
+        if not cells:
+            return np.empty(0, dtype=np.intp)
+        keys = np.array([src * self._stride + dst for src, dst in cells], dtype=np.int64)
+        starts = np.searchsorted(self._edge_keys, keys, side="left")
+        stops = np.searchsorted(self._edge_keys, keys, side="right")
+        if not (stops > starts).any():
+            return np.empty(0, dtype=np.intp)
+        ids = np.concatenate([self._edge_cycles[start:stop] for start, stop in zip(starts, stops)])
+        return np.unique(ids)
+
+    def rescore(self) -> int:
+        """
+        Re-evaluate the triangles touched since the last call. A change in
+        topology (new asset or new leg) re-enumerates every triangle instead.
+
+        :return: The number of triangles evaluated.
+        """
+        if self._topology_changed:
+            self._rebuild()
+            self._topology_changed = False
+            self._changed.clear()
+            return len(self.cycles)
+        touched = self.cycles_using(list(self._changed))
+        self._changed.clear()
+        if len(touched):
+            self.profits[touched] = self.matrix.cycle_profits(self.cycles[touched])
+        return len(touched)
+
+    def profitable(self, profit_threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the triangles currently above the profit threshold.
+
+        :param profit_threshold: The minimum profit percentage.
+        :return: An (m, 3) array of asset indices and the m profit percentages.
+        """
+        keep = self.profits > profit_threshold
+        return self.cycles[keep], self.profits[keep]
+
+    async def evaluate(self, profit_threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Re-score the touched triangles and get those above the profit threshold.
+
+        :param profit_threshold: The minimum profit percentage.
+        :return: An (m, 3) array of asset indices and the m profit percentages.
+        """
+        rescored = self.rescore()
+        log.debug(f"Re-scored {rescored} of {len(self.cycles)} triangles")
+        return self.profitable(profit_threshold)
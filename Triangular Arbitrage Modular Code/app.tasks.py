@@ -0,0 +1,230 @@
+import logging
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from app.cache import AsyncCache, TieredCache
+from app.candles import CandleStore, percentage_change_stats
+from app.decoders import Symbol
+from app.exchange import Exchange
+from app.history import OpportunityLog
+from app.metrics import metrics
+from app.registry import registry
+from app.scoring import IncrementalScorer
+from app.trade import TriangularTrade
+from app.workers import ShardedScorer
+
+log = logging.getLogger(__name__)
+
+
+async def get_symbols(exchange: Exchange) -> List[Symbol]:
+    """
+    Retrieve the spot symbols listed on an exchange.
+
+    :param exchange: The exchange.
+    :return: The spot symbols.
+    """
+    return [symbol for symbol in await exchange.get_symbols() if symbol.symbol_type == "SPOT"]
+
+
+async def get_exchange_rate(
+    exchange: Exchange,
+    base_asset: str,
+    quote_asset: str,
+    exchange_rate_cache: Union[AsyncCache, TieredCache],
+) -> float:
+    """
+    Retrieve the exchange rate for a base and quote asset on an exchange.
+
+    :param exchange: The exchange.
+    :param base_asset: The base asset.
+    :param quote_asset: The quote asset.
+    :param exchange_rate_cache: The cache for exchange rates.
+    :return: The exchange rate as a float.
+    """
+    return float(await exchange.get_exchange_rate(base_asset, quote_asset, exchange_rate_cache))
+
+
+def calculate_average_percentage_change(price_data: List[float]) -> float:
+    """
+    Calculate the average percentage change of a series of closing prices.
+
+    :param price_data: The closing prices, oldest first.
+    :return: The average percentage change as a float.
+    """
+    return float(percentage_change_stats(np.asarray(price_data, dtype=np.float64)[None, :])[0][0])
+
+
+def stable_symbols(
+    average_percentage_changes: np.ndarray,
+    volatilities: np.ndarray,
+    max_average_percentage_change: Optional[float] = None,
+    max_volatility: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Mask the symbols calm enough to trade through: with a strong trend or a
+    high volatility the rate is likely to move before all three legs fill.
+    Symbols without stats (no candles yet, or a failed fetch) are kept.
+
+    :param average_percentage_changes: The average percentage change per symbol.
+    :param volatilities: The standard deviation of the percentage changes per symbol.
+    :param max_average_percentage_change: The largest absolute average change kept (default: no limit).
+    :param max_volatility: The largest volatility kept (default: no limit).
+    :return: A boolean mask of the symbols to keep.
+    """
+    keep = np.ones(len(average_percentage_changes), dtype=bool)
+    with np.errstate(invalid="ignore"):
+        if max_average_percentage_change is not None:
+            keep &= ~(np.abs(average_percentage_changes) > max_average_percentage_change)
+        if max_volatility is not None:
+            keep &= ~(volatilities > max_volatility)
+    return keep
+
+
+def withdraw_stale(
+    scorer: Union[IncrementalScorer, ShardedScorer], venue_id: int, written: Set[Tuple[int, int]]
+) -> int:
+    """
+    Withdraw every quote of a venue that was not written this tick.
+
+    :param scorer: The scorer holding the rate matrix.
+    :param venue_id: The exchange ID.
+    :param written: The (src, dst) cells written this tick, in both directions.
+    :return: The number of pairs withdrawn.
+    """
+    # Withdrawing a pair withdraws both directions, so each pair is listed once.
+    stale = {(min(cell), max(cell)) for cell in scorer.matrix.venue_pairs(venue_id) if cell not in written}
+    for src, dst in stale:
+        scorer.remove_ids(src, dst, venue_id)
+    if stale:
+        log.debug(f"Withdrew {len(stale)} stale quotes of {registry.exchange(venue_id)}")
+    return len(stale)
+
+
+async def load_rates(
+    exchanges: List[Exchange],
+    chunk_size: int,
+    exchange_rate_cache: Union[AsyncCache, TieredCache],
+    scorer: Union[IncrementalScorer, ShardedScorer],
+    trade: TriangularTrade = None,
+    max_average_percentage_change: Optional[float] = None,
+    max_volatility: Optional[float] = None,
+    period_id: str = "1DAY",
+    limit: int = 30,
+) -> None:
+    """
+    Fetch the rate of every spot symbol on every exchange into the scorer's
+    rate matrix. With a trade and a limit on the average change or the
+    volatility, the stats of every symbol that has a rate are computed in
+    one call per exchange, and symbols over a limit are left out. The
+    scorer's matrix outlives the tick, so every quote an exchange did not
+    provide this tick (a failed fetch, a delisted or filtered symbol, or
+    the whole exchange down) is withdrawn from it.
+
+    :param exchanges: The exchanges to scan.
+    :param chunk_size: The number of rates read from the cache and requested together.
+    :param exchange_rate_cache: The cache for exchange rates.
+    :param scorer: The scorer holding the rate matrix.
+    :param trade: The trade computing the percentage change stats.
+    :param max_average_percentage_change: The largest absolute average change kept (default: no limit).
+    :param max_volatility: The largest volatility kept (default: no limit).
+    :param period_id: The candle period of the stats (default: "1DAY").
+    :param limit: The number of candles of the stats (default: 30).
+    """
+    filtered = trade is not None and (max_average_percentage_change is not None or max_volatility is not None)
+    for exchange in exchanges:
+        try:
+            with metrics.timer("stage_latency_seconds", stage="symbol_fetch"):
+                symbols = await get_symbols(exchange)
+        except Exception as e:
+            log.error(f"Error getting symbols for {exchange.name}: {e}")
+            withdraw_stale(scorer, exchange.id, set())
+            continue
+        symbol_ids = {exchange.pair_id(symbol.base_asset, symbol.quote_asset): symbol.symbol_id for symbol in symbols}
+        pair_ids = list(symbol_ids)
+        quoted: Dict[int, float] = {}
+        for start in range(0, len(pair_ids), chunk_size):
+            chunk = pair_ids[start:start + chunk_size]
+            with metrics.timer("stage_latency_seconds", stage="rate_fetch"):
+                rates = await exchange.get_exchange_rates(chunk, exchange_rate_cache)
+            for pair_id, rate in zip(chunk, rates):
+                if isinstance(rate, Exception):
+                    log.debug(f"Skipping {registry.cache_key(pair_id)}: {rate}")
+                    continue
+                quoted[pair_id] = rate
+        kept = set(quoted)
+        if filtered:
+            # Symbols listed without an ID have no candles and are kept.
+            listed = [pair_id for pair_id in quoted if symbol_ids[pair_id]]
+            average_percentage_changes, volatilities = await trade.get_percentage_change_stats(
+                exchange, [symbol_ids[pair_id] for pair_id in listed], period_id, limit
+            )
+            keep = stable_symbols(
+                average_percentage_changes, volatilities, max_average_percentage_change, max_volatility
+            )
+            kept.difference_update(pair_id for pair_id, stable in zip(listed, keep.tolist()) if not stable)
+            metrics.counter("filtered_pairs_total", exchange=exchange.name).inc(len(quoted) - len(kept))
+        written: Set[Tuple[int, int]] = set()
+        for pair_id in kept:
+            _, base_id, quote_id = registry.pair(pair_id)
+            scorer.update_ids(base_id, quote_id, quoted[pair_id], exchange.id)
+            written.update(((base_id, quote_id), (quote_id, base_id)))
+        withdraw_stale(scorer, exchange.id, written)
+
+
+async def check_for_profitable_trades(
+    exchanges: List[Exchange],
+    quote_assets: List[str],
+    quote_asset_amount: int,
+    chunk_size: int,
+    profit_threshold: float,
+    exchange_rate_cache: Union[AsyncCache, TieredCache],
+    average_percentage_change_cache: Union[AsyncCache, TieredCache],
+    scorer: Union[IncrementalScorer, ShardedScorer] = None,
+    candle_store: CandleStore = None,
+    opportunity_log: OpportunityLog = None,
+    max_average_percentage_change: Optional[float] = None,
+    max_volatility: Optional[float] = None,
+    period_id: str = "1DAY",
+    limit: int = 30,
+) -> pd.DataFrame:
+    """
+    Load this tick's rates and score the triangles starting in a quote asset.
+    Passing the same IncrementalScorer every tick re-evaluates only the
+    triangles whose rates changed since the previous tick; a ShardedScorer
+    scores every triangle across its worker processes instead. Symbols over
+    the average change or volatility limit are left out of the triangles;
+    with a candle store, each tick fetches only the candles that closed since
+    the previous one. With an opportunity log, every profitable triangle is
+    appended to it.
+
+    :return: The profitable trades as a DataFrame.
+    """
+    if scorer is None:
+        scorer = IncrementalScorer(roots=quote_assets)
+    trade = TriangularTrade(
+        {exchange.name: exchange for exchange in exchanges},
+        quote_asset_amount,
+        profit_threshold,
+        average_percentage_change_cache,
+        candle_store,
+    )
+    await load_rates(
+        exchanges,
+        chunk_size,
+        exchange_rate_cache,
+        scorer,
+        trade,
+        max_average_percentage_change,
+        max_volatility,
+        period_id,
+        limit,
+    )
+    with metrics.timer("stage_latency_seconds", stage="scoring"):
+        cycles, profits = await scorer.evaluate(profit_threshold)
+    if opportunity_log is not None:
+        with metrics.timer("stage_latency_seconds", stage="history"):
+            opportunity_log.append(scorer.matrix, cycles, profits, quote_asset_amount)
+    with metrics.timer("stage_latency_seconds", stage="output"):
+        return pd.DataFrame(trade.describe_triangles(scorer.matrix, cycles, profits))
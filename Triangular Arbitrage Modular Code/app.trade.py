@@ -1,76 +1,183 @@
+from functools import partial
 from typing import Dict, List, Tuple, Union 
 
+import numpy as np
+
 from app.exchange import Exchange
 from app.exceptions import ApiRequestError
-from app.cache import RedisCache
+from app.cache import AsyncCache, TieredCache
+from app.candles import CandleStore, percentage_change_stats
+from app.matrix import RateMatrix
+from app.metrics import metrics
+from app.registry import registry
 
 
 class TriangularTrade:
-    """
-    A class that represents a triangular trade and provides methods for calculating
-    triangular profits and average percentage changes.
-    """ 
+    """
+    A class that represents a triangular trade and provides methods for calculating
+    triangular profits and average percentage changes.
+    """ 
+
+    def __init__(
+        self,
+        exchanges: Dict[str, Exchange],
+        quote_asset_amount: int,
+        profit_threshold: float,
+        cache: Union[AsyncCache, TieredCache],
+        candle_store: CandleStore = None,
+    ):
+        self.exchanges: Dict[str, Exchange] = exchanges
+        self.quote_asset_amount: int = quote_asset_amount
+        self.profit_threshold: float = profit_threshold
+        self.cache: Union[AsyncCache, TieredCache] = cache
+        self.candle_store: CandleStore = candle_store 
+
+    def describe_triangles(
+        self, matrix: RateMatrix, cycles: np.ndarray, profits: np.ndarray
+    ) -> List[Dict[str, Union[str, float]]]:
+        """
+        Turn scored triangles into trade records. 
+
+        :param matrix: The rate matrix the triangles were scored on.
+        :param cycles: An (m, 3) array of asset indices.
+        :param profits: The m profit percentages.
+        :return: The trades, most profitable first.
+        """
+        metrics.counter("opportunities_total").inc(len(profits))
+        order = profits.argsort()[::-1]
+        trades = []
+        for (a, b, c), profit_percentage in zip(cycles[order].tolist(), profits[order].tolist()):
+            trades.append(
+                {
+                    "asset_a": matrix.assets[a],
+                    "asset_b": matrix.assets[b],
+                    "asset_c": matrix.assets[c],
+                    "exchange_a": matrix.venues[matrix.venue_ids[a, b]],
+                    "exchange_b": matrix.venues[matrix.venue_ids[b, c]],
+                    "exchange_c": matrix.venues[matrix.venue_ids[c, a]],
+                    "quote_asset_amount": self.quote_asset_amount,
+                    "profit_percentage": profit_percentage,
+                }
+            )
+        return trades
+
+    async def get_average_percentage_change(
+        self,
+        exchange: Exchange,
+        symbol_id: str,
+        period_id: str = "1DAY",
+        limit: int = 30,
+    ) -> float:
+        """
+        Calculate the average percentage change for a given symbol and period. 
+
+        :param exchange: The exchange.
+        :param symbol_id: The symbol ID.
+        :param period_id: The period ID (default: "1DAY").
+        :param limit: The limit on the number of data points (default: 30).
+        :return: The average percentage change as a float.
+        """
+        if self.candle_store is not None:
+            average_percentage_change = (
+                await self.get_average_percentage_changes(exchange, [symbol_id], period_id, limit)
+            )[0]
+            if isinstance(average_percentage_change, Exception):
+                raise average_percentage_change
+            return average_percentage_change
+        cache_key = registry.key(exchange.name, symbol_id, period_id, limit)
+        return await self.cache.get_or_load(
+            cache_key, lambda: self._fetch_average_percentage_change(exchange, symbol_id, period_id, limit)
+        )
+
+    async def get_average_percentage_changes(
+        self,
+        exchange: Exchange,
+        symbol_ids: List[str],
+        period_id: str = "1DAY",
+        limit: int = 30,
+    ) -> List[Union[float, ApiRequestError]]:
+        """
+        Calculate the average percentage changes for many symbols. With a
+        candle store, only candles that closed since the last call are fetched
+        and every symbol is scored in one vectorized pass; otherwise the cache
+        is read and written in one round-trip each. 
+
+        :param exchange: The exchange.
+        :param symbol_ids: The symbol IDs.
+        :param period_id: The period ID (default: "1DAY").
+        :param limit: The limit on the number of data points (default: 30).
+        :return: The average percentage changes in symbol order, or the error raised for a symbol.
+        """
+        if self.candle_store is not None:
+            appended, average_percentage_changes, _ = await self._candle_stats(exchange, symbol_ids, period_id, limit)
+            return [
+                error if isinstance(error, Exception) and np.isnan(average_percentage_change)
+                else float(average_percentage_change)
+                for error, average_percentage_change in zip(appended, average_percentage_changes.tolist())
+            ]
+        loaders = {
+            registry.key(exchange.name, symbol_id, period_id, limit): partial(
+                self._fetch_average_percentage_change, exchange, symbol_id, period_id, limit
+            )
+            for symbol_id in symbol_ids
+        }
+        return await self.cache.get_or_load_many(loaders)
 
-    def __init__(
-        self,
-        exchanges: Dict[str, Exchange],
-        quote_asset_amount: int,
-        profit_threshold: float,
-        cache: RedisCache,
-    ):
-        self.exchanges: Dict[str, Exchange] = exchanges
-        self.quote_asset_amount: int = quote_asset_amount
-        self.profit_threshold: float = profit_threshold
-        self.cache: RedisCache = cache 
+    async def get_percentage_change_stats(
+        self,
+        exchange: Exchange,
+        symbol_ids: List[str],
+        period_id: str = "1DAY",
+        limit: int = 30,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the average percentage change and volatility of many
+        symbols. Volatilities need the candle store; without one the average
+        changes come from the cache and every volatility is NaN. 
 
-    async def calculate_triangular_profit(
-        self, exchange_a: Exchange, exchange_b: Exchange, common_asset: str
-    ) -> float:
-        """
-        Calculate the triangular profit between two exchanges and a common asset. 
+        :param exchange: The exchange.
+        :param symbol_ids: The symbol IDs.
+        :param period_id: The period ID (default: "1DAY").
+        :param limit: The limit on the number of data points (default: 30).
+        :return: The average percentage changes and the volatilities in symbol order, NaN where unavailable.
+        """
+        if self.candle_store is not None:
+            _, average_percentage_changes, volatilities = await self._candle_stats(
+                exchange, symbol_ids, period_id, limit
+            )
+            return average_percentage_changes, volatilities
+        average_percentage_changes = await self.get_average_percentage_changes(exchange, symbol_ids, period_id, limit)
+        return (
+            np.array(
+                [np.nan if isinstance(change, Exception) else change for change in average_percentage_changes],
+                dtype=np.float64,
+            ),
+            np.full(len(symbol_ids), np.nan),
+        )
 
-        :param exchange_a: The first exchange.
-        :param exchange_b: The second exchange.
-        :param common_asset: The common asset.
-        :return: The triangular profit as a float.
-        """
-        quote_asset = common_asset + exchange_a.name.split("exchange")[1].lower()
-        base_asset_a = self.quote_asset_amount / await exchange_a.get_exchange_rate(quote_asset, "USD")
-        base_asset_b = base_asset_a * await exchange_a.get_exchange_rate(quote_asset, common_asset)
-        base_asset_c = base_asset_b * await exchange_b.get_exchange_rate(common_asset, "USD")
-        profit_percentage = (base_asset_c - self.quote_asset_amount) / self.quote_asset_amount
-        return profit_percentage
-    async def get_average_percentage_change(
-        self,
-        exchange: Exchange,
-        symbol_id: str,
-        period_id: str = "1DAY",
-        limit: int = 30,
-    ) -> float:
-        """
-        Calculate the average percentage change for a given symbol and period. 
+    async def _candle_stats(
+        self, exchange: Exchange, symbol_ids: List[str], period_id: str, limit: int
+    ) -> Tuple[List[Union[int, Exception]], np.ndarray, np.ndarray]:
+        with metrics.timer("stage_latency_seconds", stage="candle_fetch"):
+            appended = await self.candle_store.update_many(exchange, symbol_ids, period_id, limit)
+        with metrics.timer("stage_latency_seconds", stage="average_change"):
+            closes = self.candle_store.closes(exchange.name, symbol_ids, period_id, limit)
+            average_percentage_changes, volatilities = percentage_change_stats(closes)
+        return appended, average_percentage_changes, volatilities
 
-        :param exchange: The exchange.
-        :param symbol_id: The symbol ID.
-        :param period_id: The period ID (default: "1DAY").
-        :param limit: The limit on the number of data points (default: 30).
-        :return: The average percentage change as a float.
-        """
-        cache_key = f"{exchange.name}_{symbol_id}_{period_id}_{limit}"
-        average_percentage_change = await self.cache.get(cache_key)
-        if average_percentage_change is None:
-            try:
-                ohlcv_data = await exchange.get_ohlcv_data(symbol_id, period_id, limit)
-                price_data = [c for _, _, _, c, _ in ohlcv_data["data"]]
-                percentage_changes = [
-                    (price_data[i] - price_data[i - 1]) / price_data[i - 1] for i in range(1, len(price_data))
-                ]
-                average_percentage_change = sum(percentage_changes) / len(percentage_changes)
-                await self.cache.set(cache_key, average_percentage_change)
-            except ApiRequestError as e:
-                raise e
-            except Exception as e:
-                raise ApiRequestError(
-                    f"Error calculating average percentage change for symbol {symbol_id} on {exchange.name}: {e}"
-                )
-        return average_percentage_change
+    async def _fetch_average_percentage_change(
+        self, exchange: Exchange, symbol_id: str, period_id: str, limit: int
+    ) -> float:
+        try:
+            rows = await exchange.get_ohlcv_data(symbol_id, period_id, limit)
+            closes = rows[None, :, -2]
+            average_percentage_change = percentage_change_stats(closes)[0][0]
+            if np.isnan(average_percentage_change):
+                raise ValueError("not enough candles")
+            return float(average_percentage_change)
+        except ApiRequestError as e:
+            raise e
+        except Exception as e:
+            raise ApiRequestError(
+                f"Error calculating average percentage change for symbol {symbol_id} on {exchange.name}: {e}"
+            )
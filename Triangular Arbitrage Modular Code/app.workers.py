@@ -0,0 +1,203 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.cycles import CycleCache
+from app.matrix import RateMatrix, score_cycles
+
+# Shared memory segments attached by this worker process, by role.
+_attached: Dict[str, SharedMemory] = {}
+
+
+def _attach(role: str, name: str) -> SharedMemory:
+    segment = _attached.get(role)
+    if segment is None or segment.name != name:
+        # Pool workers share the I/O process's resource tracker, which unlinks
+        # the segment only when the I/O process releases it.
+        if segment is not None:
+            segment.close()
+        segment = _attached[role] = SharedMemory(name=name)
+    return segment
+
+
+def score_shard(
+    rates_name: str,
+    capacity: int,
+    cycles_name: str,
+    cycle_count: int,
+    start: int,
+    stop: int,
+    profit_threshold: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score one slice of the prebuilt triangles, reading the rates and the
+    triangles from shared memory. Runs in a worker process.
+
+    :param rates_name: The shared memory segment holding the rate snapshot.
+    :param capacity: The row/column capacity of the snapshot.
+    :param cycles_name: The shared memory segment holding the triangles.
+    :param cycle_count: The number of triangles in the segment.
+    :param start: The first triangle of this shard.
+    :param stop: The end of this shard.
+    :param profit_threshold: The minimum profit percentage.
+    :return: An (m, 3) array of asset indices and the m profit percentages.
+    """
+    rates = np.ndarray((capacity, capacity), dtype=np.float64, buffer=_attach("rates", rates_name).buf)
+    cycles = np.ndarray((cycle_count, 3), dtype=np.int32, buffer=_attach("cycles", cycles_name).buf)[start:stop]
+    profits = score_cycles(rates, cycles)
+    keep = profits > profit_threshold
+    return cycles[keep], profits[keep]
+
+
+class ShardedScorer:
+    """
+    A class that scores every triangle each tick across a pool of worker
+    processes. The I/O process keeps the rate matrix and publishes it into
+    shared memory once per tick. The triangles are taken from a cycle cache
+    and published only when the asset universe changes; each worker scores
+    one slice of them, so workers read rates and triangles without copying.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        matrix: Optional[RateMatrix] = None,
+        roots: Optional[List[str]] = None,
+        cycle_cache: Optional[CycleCache] = None,
+    ):
+        self.matrix: RateMatrix = matrix if matrix is not None else RateMatrix()
+        self.roots: Optional[List[str]] = roots
+        self.workers: int = workers
+        self.cycle_cache: CycleCache = cycle_cache if cycle_cache is not None else CycleCache()
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.cycles: np.ndarray = np.empty((0, 3), dtype=np.int32)
+        self._segment: Optional[SharedMemory] = None
+        self._capacity: int = 0
+        self._cycles_segment: Optional[SharedMemory] = None
+        self._topology_changed: bool = True
+
+    def update(self, base_asset: str, quote_asset: str, rate: float, venue: str) -> None:
+        """
+        Apply one rate observation.
+
+        :param base_asset: The base asset.
+        :param quote_asset: The quote asset.
+        :param rate: Units of quote asset received per unit of base asset.
+        :param venue: The exchange name.
+        """
+        self._record(self.matrix.set_rate(base_asset, quote_asset, rate, venue))
+
+    def update_ids(self, base_id: int, quote_id: int, rate: float, venue_id: int) -> None:
+        """
+        Apply one rate observation by registry ID.
+
+        :param base_id: The base token ID.
+        :param quote_id: The quote token ID.
+        :param rate: Units of quote token received per unit of base token.
+        :param venue_id: The exchange ID.
+        """
+        self._record(self.matrix.set_rate_ids(base_id, quote_id, rate, venue_id))
+
+    def remove_ids(self, base_id: int, quote_id: int, venue_id: int) -> None:
+        """
+        Withdraw a venue's quote for a pair by registry ID.
+
+        :param base_id: The base token ID.
+        :param quote_id: The quote token ID.
+        :param venue_id: The exchange ID.
+        """
+        self._record(self.matrix.remove_rate_ids(base_id, quote_id, venue_id))
+
+    def _record(self, changes: List[Tuple[int, int, float]]) -> None:
+        # A new asset or a new leg can close triangles that do not exist yet.
+        if any(previous == 0.0 for _, _, previous in changes):
+            self._topology_changed = True
+
+    def publish(self) -> str:
+        """
+        Copy the current rates into shared memory, reallocating the segment
+        when the matrix has grown.
+
+        :return: The name of the shared memory segment.
+        """
+        capacity = self.matrix.rates.shape[0]
+        if self._segment is None or capacity != self._capacity:
+            self._release()
+            self._segment = SharedMemory(create=True, size=capacity * capacity * 8)
+            self._capacity = capacity
+        snapshot = np.ndarray((capacity, capacity), dtype=np.float64, buffer=self._segment.buf)
+        snapshot[:] = self.matrix.rates
+        return self._segment.name
+
+    def publish_cycles(self) -> None:
+        """
+        Take the triangles of the current universe from the cycle cache and
+        copy them into a new shared memory segment.
+        """
+        self.cycles = self.cycle_cache.triangles(self.matrix, self.roots)
+        self._release_cycles()
+        if len(self.cycles):
+            self._cycles_segment = SharedMemory(create=True, size=self.cycles.nbytes)
+            np.ndarray(self.cycles.shape, dtype=np.int32, buffer=self._cycles_segment.buf)[:] = self.cycles
+
+    def shards(self) -> List[Tuple[int, int]]:
+        """
+        Split the triangles into one contiguous slice per worker.
+
+        :return: The (start, stop) bounds per shard.
+        """
+        bounds = np.linspace(0, len(self.cycles), self.workers + 1).astype(int).tolist()
+        return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+    async def evaluate(self, profit_threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every triangle on the current rates across the worker pool.
+
+        :param profit_threshold: The minimum profit percentage.
+        :return: An (m, 3) array of asset indices and the m profit percentages.
+        """
+        if self._topology_changed:
+            self.publish_cycles()
+            self._topology_changed = False
+        if not len(self.cycles):
+            return np.empty((0, 3), dtype=np.int32), np.empty(0, dtype=np.float64)
+        name = self.publish()
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self.executor,
+                    score_shard,
+                    name,
+                    self._capacity,
+                    self._cycles_segment.name,
+                    len(self.cycles),
+                    start,
+                    stop,
+                    profit_threshold,
+                )
+                for start, stop in self.shards()
+            )
+        )
+        return np.concatenate([cycles for cycles, _ in results]), np.concatenate([profits for _, profits in results])
+
+    def _release(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+
+    def _release_cycles(self) -> None:
+        if self._cycles_segment is not None:
+            self._cycles_segment.close()
+            self._cycles_segment.unlink()
+            self._cycles_segment = None
+
+    def close(self) -> None:
+        """Stop the worker processes and free the shared memory."""
+        self.executor.shutdown()
+        self._release()
+        self._release_cycles()
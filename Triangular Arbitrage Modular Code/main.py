@@ -2,94 +2,150 @@ import asyncio
 import json
 import logging
 import os
+import time
 from contextlib import suppress
 from typing import Dict, List, Union 
 
 import aiohttp
 from aiohttp import TCPConnector 
 
-from app.cache import AsyncCache
+from app.cache import AsyncCache, TieredCache
+from app.candles import CandleStore
+from app.cycles import CycleCache
 from app.exceptions import ApiRequestError
 from app.exchange import Exchange
+from app.history import OpportunityLog
 from app.logging import configure_logging
+from app.metrics import metrics
+from app.scheduler import RequestScheduler
+from app.scoring import IncrementalScorer
+from app.workers import ShardedScorer
 from app.tasks import (
-    calculate_average_percentage_change,
-    check_for_profitable_trades,
-    get_exchange_rate,
-    get_symbols,
+    calculate_average_percentage_change,
+    check_for_profitable_trades,
+    get_exchange_rate,
+    get_symbols,
 ) 
 
 log = logging.getLogger(__name__) 
 
 async def main() -> None:
-    """
-    Main asynchronous function that runs the event loop.
-    """
-    try:
-        config = load_config()
-    except Exception as e:
-        log.error(f"Error loading config: {e}")
-        return
-    configure_logging(config["logging"])
-    async with aiohttp.ClientSession(
-        connector=TCPConnector(ssl=False)
-    ) as session:
-        exchanges = [
-            Exchange(
-                name,
-                os.environ.get(f"{name.upper()}_API_KEY"),
-                config["base_urls"][name],
-                config["endpoints"][name],
-                session,
-            )
-            for name in config["api_keys"]
-        ]
-        exchange_rate_cache = AsyncCache(
-            config["cache"]["exchange_rate"]
-        )
-        average_percentage_change_cache = AsyncCache(
-            config["cache"]["average_percentage_change"]
-        )
-        while True:
-            log.info("Checking for profitable trades...")
-            trade_check_tasks = [
-                check_for_profitable_trades(
-                    exchanges=exchanges,
-                    quote_assets=config["quote_assets"],
-                    quote_asset_amount=config["quote_asset_amount"],
-                    chunk_size=config["chunk_size"],
-                    profit_threshold=config["profit_threshold"],
-                    exchange_rate_cache=exchange_rate_cache,
-                    average_percentage_change_cache=(
-                        average_percentage_change_cache
-                    ),
-                )
-            ]
-            results = await asyncio.gather(
-                *trade_check_tasks, return_exceptions=True
-            )
-            for result in results:
-                if isinstance(result, Exception):
-                    log.error(f"An exception occurred: {result}")
-                elif not result.empty:
-                    log.info(
-                        f"Found {len(result)} profitable trades!"
-                    )
-                    log.info(result.to_string())
-                else:
-                    log.info("No profitable trades found.")
-            await asyncio.sleep(config["time_interval"]) 
+    """
+    Main asynchronous function that runs the event loop.
+    """
+    try:
+        config = load_config()
+    except Exception as e:
+        log.error(f"Error loading config: {e}")
+        return
+    configure_logging(config["logging"])
+    async with aiohttp.ClientSession(
+        connector=TCPConnector(ssl=False)
+    ) as session:
+        exchanges = [
+            Exchange(
+                name,
+                os.environ.get(f"{name.upper()}_API_KEY"),
+                config["base_urls"][name],
+                config["endpoints"][name],
+                session,
+                RequestScheduler(**config.get("rate_limits", {}).get(name, {})),
+            )
+            for name in config["api_keys"]
+        ]
+        # In-process LRU in front of Redis; Redis is shared between workers.
+        exchange_rate_cache = TieredCache(
+            AsyncCache(
+                config["cache"]["exchange_rate"],
+                config["cache_expire_time"],
+                name="exchange_rate",
+            )
+        )
+        average_percentage_change_cache = TieredCache(
+            AsyncCache(
+                config["cache"]["average_percentage_change"],
+                config["cache_expire_time"],
+                name="average_percentage_change",
+            )
+        )
+        metrics_config = config.get("metrics", {})
+        metrics_runner = await metrics.serve(port=metrics_config.get("port", 9100))
+        metrics_logger = asyncio.create_task(
+            metrics.log_periodically(metrics_config.get("log_interval", 60))
+        )
+        # Kept across ticks so only triangles with changed rates are re-scored,
+        # or, with "workers" set, scored across that many processes.
+        # Triangles are enumerated once per asset universe and reloaded at startup.
+        cycle_cache = CycleCache(config.get("cycle_cache", "cycles.npz"))
+        if config.get("workers"):
+            scorer = ShardedScorer(
+                config["workers"], roots=config["quote_assets"], cycle_cache=cycle_cache
+            )
+        else:
+            scorer = IncrementalScorer(
+                roots=config["quote_assets"], cycle_cache=cycle_cache
+            )
+        candle_store = CandleStore(config.get("candle_dir", "candles"))
+        opportunity_log = OpportunityLog(config.get("history_dir", "history"))
+        try:
+            while True:
+                log.info("Checking for profitable trades...")
+                tick_started = time.perf_counter()
+                trade_check_tasks = [
+                    check_for_profitable_trades(
+                        exchanges=exchanges,
+                        quote_assets=config["quote_assets"],
+                        quote_asset_amount=config["quote_asset_amount"],
+                        chunk_size=config["chunk_size"],
+                        profit_threshold=config["profit_threshold"],
+                        exchange_rate_cache=exchange_rate_cache,
+                        average_percentage_change_cache=(
+                            average_percentage_change_cache
+                        ),
+                        scorer=scorer,
+                        candle_store=candle_store,
+                        opportunity_log=opportunity_log,
+                        max_average_percentage_change=config.get(
+                            "max_average_percentage_change"
+                        ),
+                        max_volatility=config.get("max_volatility"),
+                        period_id=config.get("change_period", "1DAY"),
+                        limit=config.get("change_limit", 30),
+                    )
+                ]
+                results = await asyncio.gather(
+                    *trade_check_tasks, return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        log.error(f"An exception occurred: {result}")
+                    elif not result.empty:
+                        log.info(
+                            f"Found {len(result)} profitable trades!"
+                        )
+                        log.info(result.to_string())
+                    else:
+                        log.info("No profitable trades found.")
+                metrics.histogram("tick_latency_seconds").record(
+                    time.perf_counter() - tick_started
+                )
+                await asyncio.sleep(config["time_interval"]) 
+        finally:
+            metrics_logger.cancel()
+            await metrics_runner.cleanup()
+            if isinstance(scorer, ShardedScorer):
+                scorer.close()
 
 def load_config() -> Dict[str, Union[Dict, List, str, int]]:
-    """
-    Load configuration from the JSON file.
-    """
-    try:
-        with open("config.json") as f:
-            return json.load(f)
-    except Exception as e:
-        log.error(f"Error loading config file: {e}")
-        raise e
+    """
+    Load configuration from the JSON file.
+    """
+    try:
+        with open("config.json") as f:
+            return json.load(f)
+    except Exception as e:
+        log.error(f"Error loading config file: {e}")
+        raise e
 if __name__ == "__main__":
-    with suppress(KeyboardInterrupt):
-        asyncio.run(main())
+    with suppress(KeyboardInterrupt):
+        asyncio.run(main())
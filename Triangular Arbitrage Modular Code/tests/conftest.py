@@ -0,0 +1,45 @@
+import importlib.machinery
+import importlib.util
+import os
+import sys
+import types
+
+import fakeredis
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FlatAppFinder:
+    """
+    Import ``app.<name>`` from the flat ``app.<name>.py`` files next to
+    main.py, the way the deployed image lays them out as a package.
+    """
+
+    @staticmethod
+    def find_spec(fullname, path=None, target=None):
+        if fullname == "app":
+            spec = importlib.machinery.ModuleSpec("app", None, is_package=True)
+            spec.submodule_search_locations = []
+            return spec
+        if fullname.startswith("app."):
+            location = os.path.join(APP_DIR, f"{fullname}.py")
+            if os.path.exists(location):
+                return importlib.util.spec_from_file_location(fullname, location)
+        return None
+
+
+sys.meta_path.insert(0, FlatAppFinder)
+
+# Every connection the cache opens goes to an in-process fake Redis server,
+# replaced before each test.
+aioredis = types.ModuleType("aioredis")
+aioredis.server = fakeredis.FakeServer()
+aioredis.from_url = lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=aioredis.server)
+sys.modules["aioredis"] = aioredis
+
+
+@pytest.fixture(autouse=True)
+def redis_server():
+    aioredis.server = fakeredis.FakeServer()
+    return aioredis.server
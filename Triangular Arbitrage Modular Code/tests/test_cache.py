@@ -0,0 +1,100 @@
+import asyncio
+import struct
+
+from app.cache import AsyncCache, TieredCache, decode_value, encode_value
+
+
+def test_floats_are_packed_into_nine_bytes():
+    for value in [0.0, -1.5, 1 / 3, 1e-300, float("inf")]:
+        raw = encode_value(value)
+        assert len(raw) == 9
+        assert decode_value(raw) == value
+    assert encode_value("abc") == "abc"
+    assert decode_value(b"abc") == b"abc"
+    assert decode_value(None) is None
+    # Nine bytes without the float tag are not a float.
+    assert decode_value(b"x" + struct.pack("<d", 1.0)) == b"x" + struct.pack("<d", 1.0)
+
+
+def test_get_many_set_many_round_trip():
+    async def run():
+        cache = AsyncCache("redis://localhost", expire_time=60)
+        items = {"binance_BTC_USDT": 27123.45, "binance_ETH_BTC": 0.0641, "label": "spot"}
+        await cache.set_many(items)
+        values = await cache.get_many(["binance_ETH_BTC", "missing", "binance_BTC_USDT", "label"])
+        redis = await cache._get_connection()
+        raw = await redis.get("binance_BTC_USDT")
+        ttl = await redis.ttl("label")
+        await cache.close()
+        return values, raw, ttl
+
+    values, raw, ttl = asyncio.run(run())
+    assert values == [0.0641, None, 27123.45, b"spot"]
+    assert raw == b"d" + struct.pack("<d", 27123.45)
+    assert 0 < ttl <= 60
+
+
+def test_get_or_load_many_loads_only_misses():
+    calls = []
+
+    def loader(key, value):
+        async def load():
+            calls.append(key)
+            return value
+
+        return load
+
+    async def run():
+        cache = AsyncCache("redis://localhost", expire_time=60)
+        await cache.set("a", 1.0)
+        values = await cache.get_or_load_many({"a": loader("a", 10.0), "b": loader("b", 2.0)})
+        stored = await cache.get("b")
+        await cache.close()
+        return values, stored
+
+    values, stored = asyncio.run(run())
+    assert values == [1.0, 2.0]
+    assert stored == 2.0
+    assert calls == ["b"]
+
+
+def test_concurrent_get_or_load_calls_loader_once():
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 42.0
+
+    async def run():
+        cache = TieredCache(AsyncCache("redis://localhost", expire_time=60))
+        values = await asyncio.gather(*(cache.get_or_load("key", load) for _ in range(10)))
+        again = await cache.get_or_load("key", load)
+        await cache.close()
+        return values, again
+
+    values, again = asyncio.run(run())
+    assert values == [42.0] * 10
+    assert again == 42.0
+    assert calls == 1
+
+
+def test_concurrent_get_or_load_shares_the_error():
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("down")
+
+    async def run():
+        cache = TieredCache(AsyncCache("redis://localhost", expire_time=60))
+        results = await asyncio.gather(*(cache.get_or_load("key", load) for _ in range(3)), return_exceptions=True)
+        await cache.close()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert calls == 1
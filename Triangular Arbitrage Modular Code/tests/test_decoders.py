@@ -0,0 +1,51 @@
+import numpy as np
+
+from app.decoders import decode_exchange_rate, decode_json, decode_ohlcv, decode_symbols
+
+SYMBOLS = b"""{
+    "status": "ok",
+    "data": [
+        {"symbol_id": "BINANCE_SPOT_ETH_BTC", "exchange_id": "BINANCE", "symbol_type": "SPOT",
+         "base_asset": "ETH", "quote_asset": "BTC", "price_precision": 1e-6},
+        {"base_asset": "BTC", "quote_asset": "USDT"},
+        {"symbol_id": "BINANCE_PERP_BTC_USDT", "symbol_type": "PERPETUAL",
+         "base_asset": "BTC", "quote_asset": "USDT"}
+    ]
+}"""
+
+EXCHANGE_RATE = b"""{
+    "data": {"time": "2023-05-01T12:00:00.0000000Z", "asset_id_base": "ETH",
+             "asset_id_quote": "BTC", "rate": "0.0641"}
+}"""
+
+OHLCV = b"""{
+    "data": [
+        [1682942400000, 1900.5, 1910.0, 1895.25, 1905.0, 1234.5],
+        [1682946000000, "1905.0", "1920.0", "1901.0", "1918.75", "987.0"]
+    ]
+}"""
+
+
+def test_decode_symbols():
+    symbols = decode_symbols(SYMBOLS)
+    assert [(s.base_asset, s.quote_asset, s.symbol_id, s.symbol_type) for s in symbols] == [
+        ("ETH", "BTC", "BINANCE_SPOT_ETH_BTC", "SPOT"),
+        ("BTC", "USDT", "", "SPOT"),
+        ("BTC", "USDT", "BINANCE_PERP_BTC_USDT", "PERPETUAL"),
+    ]
+
+
+def test_decode_exchange_rate_accepts_numeric_strings():
+    assert decode_exchange_rate(EXCHANGE_RATE) == 0.0641
+    assert decode_exchange_rate(b'{"data": {"rate": 27123.5}}') == 27123.5
+
+
+def test_decode_ohlcv():
+    rows = decode_ohlcv(OHLCV)
+    assert rows.dtype == np.float64
+    assert rows.shape == (2, 6)
+    np.testing.assert_array_equal(rows[:, 4], [1905.0, 1918.75])
+
+
+def test_decode_json():
+    assert decode_json(b'{"data": [1, "a"]}') == {"data": [1, "a"]}
@@ -0,0 +1,55 @@
+import numpy as np
+
+from app.history import OpportunityLog
+from app.matrix import RateMatrix
+from app.registry import Registry
+
+
+def matrix():
+    rates = RateMatrix(registry=Registry())
+    rates.set_rate("USDT", "BTC", 1 / 30000, "binance")
+    rates.set_rate("BTC", "ETH", 16.0, "kraken")
+    rates.set_rate("ETH", "USDT", 1900.0, "binance")
+    return rates
+
+
+def triangle(rates):
+    return np.array([[rates.asset_id(asset) for asset in ["USDT", "BTC", "ETH"]]])
+
+
+def test_between_returns_records_in_time_range(tmp_path):
+    rates = matrix()
+    log = OpportunityLog(str(tmp_path))
+    for second in [100, 200, 200, 300, 400]:
+        log.append(rates, triangle(rates), np.array([second / 1e4]), 1000.0, now=second)
+
+    assert len(log) == 5
+    assert log.between(200, 400)["time"].tolist() == [200_000_000, 200_000_000, 300_000_000]
+    assert log.between(150)["profit_percentage"].tolist() == [0.02, 0.02, 0.03, 0.04]
+    assert len(log.between(401)) == 0
+    assert log.last_hours(200 / 3600, now=450)["time"].tolist() == [300_000_000, 400_000_000]
+
+
+def test_times_never_decrease(tmp_path):
+    rates = matrix()
+    log = OpportunityLog(str(tmp_path))
+    log.append(rates, triangle(rates), np.array([0.01]), 1000.0, now=200)
+    log.append(rates, triangle(rates), np.array([0.02]), 1000.0, now=100)
+    assert log.times().tolist() == [200_000_000, 200_000_000]
+
+
+def test_log_is_reopened_with_names_and_repaired(tmp_path):
+    rates = matrix()
+    log = OpportunityLog(str(tmp_path))
+    log.append(rates, triangle(rates), np.array([0.01]), 1000.0, now=100)
+    log.append(rates, triangle(rates), np.array([0.03]), 1000.0, now=200)
+    # A crash between the record and index writes leaves a record without an index entry.
+    with open(log.records_path, "ab") as f:
+        f.write(log.records()[:1].tobytes())
+
+    reopened = OpportunityLog(str(tmp_path))
+    assert len(reopened) == 2
+    frame = reopened.to_frame(reopened.between(0))
+    assert frame[["asset_a", "asset_b", "asset_c"]].values.tolist() == [["USDT", "BTC", "ETH"]] * 2
+    assert frame[["exchange_a", "exchange_b", "exchange_c"]].values.tolist() == [["binance", "kraken", "binance"]] * 2
+    assert frame["profit_percentage"].tolist() == [0.01, 0.03]
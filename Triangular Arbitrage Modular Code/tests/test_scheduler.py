@@ -0,0 +1,64 @@
+import asyncio
+import types
+
+import pytest
+
+import app.scheduler
+from app.exceptions import RateLimitError
+from app.scheduler import RequestScheduler
+
+
+class FakeClock:
+    """Monotonic time that only moves when the scheduler sleeps."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(app.scheduler, "time", clock)
+    monkeypatch.setattr(
+        app.scheduler,
+        "asyncio",
+        types.SimpleNamespace(sleep=clock.sleep, Lock=asyncio.Lock, Condition=asyncio.Condition),
+    )
+    monkeypatch.setattr(app.scheduler, "random", types.SimpleNamespace(random=lambda: 0.0))
+    return clock
+
+
+def test_retry_waits_retry_after_and_pauses_the_bucket(clock):
+    scheduler = RequestScheduler(rate=10, burst=10, initial_concurrency=8)
+    responses = iter([RateLimitError("429", 3.0)])
+
+    async def request():
+        error = next(responses, None)
+        if error is not None:
+            raise error
+        return 1.5
+
+    assert asyncio.run(scheduler.run(request)) == 1.5
+    assert clock.sleeps[0] == 3.0
+    assert scheduler.limiter.limit == pytest.approx(4 + 1 / 4)
+
+
+def test_last_rate_limited_attempt_halves_the_limit(clock):
+    scheduler = RequestScheduler(rate=4, burst=4, initial_concurrency=8, max_retries=2, backoff=0.5)
+
+    async def request():
+        raise RateLimitError("429")
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(scheduler.run(request))
+    # Halved on each of the three attempts, the last one included.
+    assert scheduler.limiter.limit == 1
+    assert clock.sleeps == [0.5, 0.25, 1.0, 0.25]
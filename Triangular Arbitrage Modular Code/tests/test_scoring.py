@@ -0,0 +1,94 @@
+import asyncio
+
+import numpy as np
+
+from app.cycles import CycleCache
+from app.matrix import RateMatrix
+from app.registry import Registry
+from app.scoring import IncrementalScorer
+from app.workers import ShardedScorer
+
+ASSETS = ["USDT", "BTC", "ETH", "BNB", "SOL", "XRP", "ADA"]
+VENUES = ["binance", "kraken"]
+
+
+def quotes(rng, links=14):
+    pairs = [(base, quote) for i, base in enumerate(ASSETS) for quote in ASSETS[i + 1:]]
+    chosen = rng.choice(len(pairs), size=links, replace=False)
+    return [(pairs[i][0], pairs[i][1], venue) for i in chosen.tolist() for venue in VENUES]
+
+
+def scorer(cls, *args, **kwargs):
+    return cls(*args, matrix=RateMatrix(capacity=4, registry=Registry()), cycle_cache=CycleCache(), **kwargs)
+
+
+def sort_triangles(cycles, profits):
+    order = np.lexsort(cycles.T[::-1])
+    return cycles[order], profits[order]
+
+
+def test_rescore_matches_full_recompute_after_random_rate_changes():
+    rng = np.random.default_rng(7)
+    legs = quotes(rng)
+    incremental = scorer(IncrementalScorer)
+    for base, quote, venue in legs:
+        incremental.update(base, quote, rng.uniform(0.5, 2.0), venue)
+    assert incremental.rescore() == len(incremental.cycles) > 0
+
+    for _ in range(50):
+        for i in rng.choice(len(legs), size=3, replace=False).tolist():
+            base, quote, venue = legs[i]
+            incremental.update(base, quote, rng.uniform(0.5, 2.0), venue)
+        rescored = incremental.rescore()
+        assert rescored <= len(incremental.cycles)
+        expected = incremental.matrix.cycle_profits(incremental.cycles)
+        np.testing.assert_allclose(incremental.profits, expected, rtol=0, atol=1e-12)
+
+
+def test_rescore_touches_only_triangles_using_a_changed_rate():
+    incremental = scorer(IncrementalScorer)
+    for base, quote in [("USDT", "BTC"), ("BTC", "ETH"), ("ETH", "USDT"), ("BTC", "BNB"), ("BNB", "USDT")]:
+        incremental.update(base, quote, 1.0, "binance")
+    incremental.rescore()
+    incremental.update("ETH", "USDT", 1.1, "binance")
+    # Only the USDT/BTC/ETH triangle, in both directions.
+    assert incremental.rescore() == 2
+    assert incremental.rescore() == 0
+
+
+def test_new_leg_re_enumerates_triangles():
+    incremental = scorer(IncrementalScorer)
+    incremental.update("USDT", "BTC", 1.0, "binance")
+    incremental.update("BTC", "ETH", 1.0, "binance")
+    incremental.rescore()
+    assert len(incremental.cycles) == 0
+    incremental.update("ETH", "USDT", 1.05, "binance")
+    incremental.rescore()
+    cycles, profits = incremental.profitable(0.0)
+    assert len(cycles) == 1
+    np.testing.assert_allclose(profits, [0.05])
+
+
+def test_sharded_scorer_matches_incremental_scorer():
+    rng = np.random.default_rng(11)
+    legs = quotes(rng)
+    incremental = scorer(IncrementalScorer, roots=["USDT", "BTC"])
+    sharded = scorer(ShardedScorer, 2, roots=["USDT", "BTC"])
+
+    async def tick(rates):
+        for (base, quote, venue), rate in zip(legs, rates):
+            incremental.update(base, quote, rate, venue)
+            sharded.update(base, quote, rate, venue)
+        return await incremental.evaluate(0.0), await sharded.evaluate(0.0)
+
+    try:
+        for _ in range(3):
+            (cycles, profits), (sharded_cycles, sharded_profits) = asyncio.run(
+                tick(rng.uniform(0.8, 1.25, size=len(legs)))
+            )
+            cycles, profits = sort_triangles(cycles, profits)
+            sharded_cycles, sharded_profits = sort_triangles(sharded_cycles, sharded_profits)
+            np.testing.assert_array_equal(sharded_cycles, cycles)
+            np.testing.assert_allclose(sharded_profits, profits, rtol=0, atol=1e-12)
+    finally:
+        sharded.close()
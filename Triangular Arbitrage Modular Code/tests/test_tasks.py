@@ -0,0 +1,151 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import app.candles
+from app.cache import AsyncCache
+from app.candles import CandleStore
+from app.decoders import Symbol
+from app.exceptions import ApiRequestError
+from app.matrix import RateMatrix
+from app.registry import registry
+from app.scoring import IncrementalScorer
+from app.tasks import check_for_profitable_trades, stable_symbols
+from app.workers import ShardedScorer
+
+DAY = 86400
+
+
+class FakeExchange:
+    """An exchange quoting USDT -> BTC -> ETH -> USDT at a 5% premium."""
+
+    def __init__(self, name, closes):
+        self.name = name
+        self.id = registry.exchange_id(name)
+        self.closes = closes
+        self.ohlcv_requests = []
+        self.failing = set()
+        self.down = False
+
+    def pair_id(self, base_asset, quote_asset):
+        return registry.pair_id(self.id, registry.token_id(base_asset), registry.token_id(quote_asset))
+
+    async def get_symbols(self):
+        if self.down:
+            raise ApiRequestError(f"{self.name} is down")
+        return [
+            Symbol("BTC", "USDT", f"{self.name}_BTC_USDT"),
+            Symbol("ETH", "BTC", f"{self.name}_ETH_BTC"),
+            Symbol("ETH", "USDT", f"{self.name}_ETH_USDT"),
+        ]
+
+    async def get_exchange_rates(self, pair_ids, exchange_rate_cache):
+        rates = {("BTC", "USDT"): 30000.0, ("ETH", "BTC"): 0.07, ("ETH", "USDT"): 2000.0}
+        pairs = [(registry.token(base_id), registry.token(quote_id)) for _, base_id, quote_id in map(registry.pair, pair_ids)]
+        return [ApiRequestError(f"{pair} failed") if pair in self.failing else rates[pair] for pair in pairs]
+
+    async def get_ohlcv_data(self, symbol_id, period_id, limit):
+        self.ohlcv_requests.append((symbol_id, limit))
+        closes = self.closes[symbol_id][-limit:]
+        return np.column_stack([closes, closes, closes, closes, np.ones(len(closes))])
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def tick(exchange, scorer, candle_store, **limits):
+    async def run():
+        cache = AsyncCache("redis://localhost", expire_time=60)
+        trades = await check_for_profitable_trades(
+            [exchange], ["USDT"], 1000, 10, 0.0, cache, cache, scorer, candle_store, **limits
+        )
+        await cache.close()
+        return trades
+
+    return asyncio.run(run())
+
+
+def closes(volatile_symbol=None):
+    flat = np.linspace(100.0, 101.0, 60)
+    series = {f"{name}_{symbol}": flat for name in ["calm", "jumpy"] for symbol in ["BTC_USDT", "ETH_BTC", "ETH_USDT"]}
+    if volatile_symbol is not None:
+        series[volatile_symbol] = 100.0 * (1 + 0.2 * (-1.0) ** np.arange(60))
+    return series
+
+
+def test_stable_symbols_keeps_symbols_without_stats():
+    means = np.array([0.001, -0.05, np.nan, 0.0])
+    volatilities = np.array([0.01, 0.01, np.nan, 0.3])
+    np.testing.assert_array_equal(stable_symbols(means, volatilities, 0.02, 0.1), [True, False, True, False])
+    np.testing.assert_array_equal(stable_symbols(means, volatilities), [True, True, True, True])
+
+
+def test_second_tick_fetches_only_new_candles(tmp_path, monkeypatch):
+    clock = Clock(1_700_000_000)
+    monkeypatch.setattr(app.candles, "time", clock)
+    exchange = FakeExchange("calm", closes())
+    scorer = IncrementalScorer(RateMatrix(), roots=["USDT"])
+    store = CandleStore(str(tmp_path))
+
+    trades = tick(exchange, scorer, store, max_volatility=0.05, limit=30)
+    assert len(trades) == 1
+    assert sorted(exchange.ohlcv_requests) == [("calm_BTC_USDT", 30), ("calm_ETH_BTC", 30), ("calm_ETH_USDT", 30)]
+
+    exchange.ohlcv_requests.clear()
+    tick(exchange, scorer, store, max_volatility=0.05, limit=30)
+    assert exchange.ohlcv_requests == []
+
+    clock.now += 2 * DAY
+    tick(exchange, scorer, store, max_volatility=0.05, limit=30)
+    assert sorted(exchange.ohlcv_requests) == [("calm_BTC_USDT", 2), ("calm_ETH_BTC", 2), ("calm_ETH_USDT", 2)]
+    assert len(store.load("calm", "calm_ETH_BTC", "1DAY")) == 32
+
+
+def test_volatile_symbol_is_masked_out_of_triangles(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.candles, "time", Clock(1_700_000_000))
+    exchange = FakeExchange("jumpy", closes(volatile_symbol="jumpy_ETH_BTC"))
+    scorer = IncrementalScorer(RateMatrix(), roots=["USDT"])
+    store = CandleStore(str(tmp_path))
+
+    assert len(tick(exchange, scorer, store)) == 1
+    assert exchange.ohlcv_requests == []
+    assert len(tick(exchange, scorer, store, max_volatility=0.05)) == 0
+    eth, btc = registry.token_id("ETH"), registry.token_id("BTC")
+    assert scorer.matrix.rates[eth, btc] == scorer.matrix.rates[btc, eth] == 0.0
+    assert len(tick(exchange, scorer, store, max_average_percentage_change=0.1)) == 1
+
+
+@pytest.fixture(params=["incremental", "sharded"])
+def scorer(request):
+    if request.param == "incremental":
+        yield IncrementalScorer(RateMatrix(), roots=["USDT"])
+        return
+    scorer = ShardedScorer(2, RateMatrix(), roots=["USDT"])
+    yield scorer
+    scorer.close()
+
+
+def test_failed_fetches_withdraw_quotes_from_earlier_ticks(scorer):
+    exchange = FakeExchange("flaky", {})
+    assert len(tick(exchange, scorer, None)) == 1
+
+    exchange.failing = {("ETH", "BTC")}
+    assert len(tick(exchange, scorer, None)) == 0
+    eth, btc = registry.token_id("ETH"), registry.token_id("BTC")
+    assert scorer.matrix.rates[eth, btc] == scorer.matrix.rates[btc, eth] == 0.0
+
+    exchange.failing = set()
+    assert len(tick(exchange, scorer, None)) == 1
+
+    exchange.down = True
+    assert len(tick(exchange, scorer, None)) == 0
+    assert scorer.matrix.venue_pairs(exchange.id) == []
+
+    exchange.down = False
+    assert len(tick(exchange, scorer, None)) == 1